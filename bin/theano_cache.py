@@ -31,6 +31,10 @@ def print_help(exit_status):
     print('Type "theano-cache cleanup" to delete keys in the old '
           'format/code version')
     print('Type "theano-cache purge" to force deletion of the cache directory')
+    print('Type "theano-cache export <file>" to pack the versioned '
+          'modules of the cache in an archive')
+    print('Type "theano-cache import <file>" to add the compatible '
+          'modules of an archive to the cache')
     print('Type "theano-cache basecompiledir" '
           'to print the parent of the cache directory')
     print('Type "theano-cache basecompiledir list" '
@@ -84,6 +88,10 @@ def main():
             print(theano.config.base_compiledir)
         else:
             print_help(exit_status=1)
+    elif len(sys.argv) == 3 and sys.argv[1] == 'export':
+        theano.gof.compiledir.export_cache(sys.argv[2])
+    elif len(sys.argv) == 3 and sys.argv[1] == 'import':
+        theano.gof.compiledir.import_cache(sys.argv[2])
     elif len(sys.argv) == 3 and sys.argv[1] == 'basecompiledir':
         if sys.argv[2] == 'list':
             theano.gof.compiledir.basecompiledir_ls()
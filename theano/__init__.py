@@ -112,7 +112,7 @@ from theano.compile import (
     SymbolicOutput, Out,
     Mode,
     predefined_modes, predefined_linkers, predefined_optimizers,
-    FunctionMaker, function, function_dump,
+    FunctionMaker, function, function_dump, function_entries,
     OpFromGraph,
     ProfileStats,
     Param, shared, as_op)
@@ -121,8 +121,43 @@ from theano.misc.safe_asarray import _asarray
 
 from theano.printing import pprint, pp
 
-from theano.scan_module import (scan, map, reduce, foldl, foldr, clone,
-                                scan_checkpoints)
+# With the Theano flag lazy_import, these attributes are only imported when
+# they are first accessed (see __getattr__ below). They map to the module
+# to import, and the name to get from it, if any.
+_lazy_attributes = {
+    'scan': ('theano.scan_module', 'scan'),
+    'map': ('theano.scan_module', 'map'),
+    'reduce': ('theano.scan_module', 'reduce'),
+    'foldl': ('theano.scan_module', 'foldl'),
+    'foldr': ('theano.scan_module', 'foldr'),
+    'clone': ('theano.scan_module', 'clone'),
+    'scan_checkpoints': ('theano.scan_module', 'scan_checkpoints'),
+    'scan_module': ('theano.scan_module', None),
+    'sparse': ('theano.sparse', None),
+    'd3viz': ('theano.d3viz', None),
+    'tests': ('theano.tests', None),
+}
+# Module __getattr__ needs Python 3.7 (PEP 562).
+_lazy_import = config.lazy_import and sys.version_info >= (3, 7)
+
+if _lazy_import:
+    import importlib
+
+    import theano.tensor
+
+    def __getattr__(name):
+        if name not in _lazy_attributes:
+            raise AttributeError("module 'theano' has no attribute %r" %
+                                 name)
+        module, attr = _lazy_attributes[name]
+        value = importlib.import_module(module)
+        if attr is not None:
+            value = getattr(value, attr)
+        globals()[name] = value
+        return value
+else:
+    from theano.scan_module import (scan, map, reduce, foldl, foldr, clone,
+                                    scan_checkpoints)
 
 from theano.updates import OrderedUpdates
 
@@ -138,15 +173,23 @@ from theano.updates import OrderedUpdates
 
 from theano.gradient import Rop, Lop, grad, subgraph_grad
 
-# This need to be before the init of GPU, as it add config variable
-# needed during that phase.
-import theano.tests
-if hasattr(theano.tests, "TheanoNoseTester"):
-    test = theano.tests.TheanoNoseTester().test
+if _lazy_import:
+    def test(*args, **kwargs):
+        import theano.tests
+        if not hasattr(theano.tests, "TheanoNoseTester"):
+            raise ImportError("The nose module is not installed."
+                              " It is needed for Theano tests.")
+        return theano.tests.TheanoNoseTester().test(*args, **kwargs)
 else:
-    def test():
-        raise ImportError("The nose module is not installed."
-                          " It is needed for Theano tests.")
+    # This need to be before the init of GPU, as it add config variable
+    # needed during that phase.
+    import theano.tests
+    if hasattr(theano.tests, "TheanoNoseTester"):
+        test = theano.tests.TheanoNoseTester().test
+    else:
+        def test():
+            raise ImportError("The nose module is not installed."
+                              " It is needed for Theano tests.")
 
 if (config.device.startswith('cuda') or
         config.device.startswith('opencl') or
@@ -48,6 +48,12 @@ if PY3:
 
     def decode_with(x, encoding):
         return x.decode(encoding)
+
+    def module_exists(name):
+        """Return True if the top-level module `name` can be imported,
+        without importing it."""
+        import importlib.util
+        return importlib.util.find_spec(name) is not None
 else:
     from six import get_unbound_function
     from operator import div as operator_div
@@ -69,8 +75,19 @@ else:
     def decode_with(x, encoding):
         return x
 
+    def module_exists(name):
+        import imp
+        try:
+            f = imp.find_module(name)[0]
+        except ImportError:
+            return False
+        if f is not None:
+            f.close()
+        return True
+
 __all__ += ['cmp', 'operator_div', 'DictMixin', 'OrderedDict', 'decode',
-            'decode_iter', 'get_unbound_function', 'imap', 'izip', 'ifilter']
+            'decode_iter', 'get_unbound_function', 'imap', 'izip', 'ifilter',
+            'module_exists']
 
 
 class DefaultOrderedDict(OrderedDict):
@@ -9,9 +9,12 @@ import logging
 import traceback as tb
 import re
 
-from six import string_types
+import copy
+from six import iteritems, string_types
 from theano.compile.function_module import orig_function
-from theano.compile.pfunc import pfunc
+from theano.compile.mode import Mode, get_mode
+from theano.compile.pfunc import iter_over_pairs, pfunc
+from theano.gof.vm import VM_Linker
 import warnings
 from theano import compat
 
@@ -316,3 +319,148 @@ def function(inputs, outputs=None, mode=None, updates=None, givens=None,
                    profile=profile,
                    output_keys=output_keys)
     return fn
+
+
+class EntryFunction(object):
+    """
+    One entry point of the functions compiled by `function_entries`.
+
+    Calling it runs the part of the shared function needed by the outputs
+    and updates of this entry.
+
+    Attributes
+    ----------
+    name : str
+        The name of the entry.
+    fn : Function
+        The function shared by all the entries.
+
+    """
+
+    def __init__(self, name, fn, input_idx, output_idx, updates,
+                 unpack_single, return_none):
+        self.name = name
+        self.fn = fn
+        self.n_all_inputs = len([i for i in fn.maker.inputs
+                                 if not i.implicit])
+        self.input_idx = input_idx
+        self.output_idx = output_idx
+        self.updates = updates
+        self.unpack_single = unpack_single
+        self.return_none = return_none
+
+    def __call__(self, *args):
+        if len(args) != len(self.input_idx):
+            raise TypeError("Entry %s expects %i inputs, got %i" % (
+                self.name, len(self.input_idx), len(args)))
+        # The inputs of the other entries are not needed by this one.
+        all_args = [None] * self.n_all_inputs
+        for i, arg in zip(self.input_idx, args):
+            c = self.fn.input_storage[i]
+            try:
+                all_args[i] = c.type.filter(arg, strict=c.strict,
+                                            allow_downcast=c.allow_downcast)
+            except Exception as e:
+                e.args = ("Bad input at index %i of entry %s. " % (
+                    self.input_idx.index(i), self.name),) + e.args
+                raise
+        n_outputs = len(self.output_idx)
+        rval = self.fn(*all_args,
+                       output_subset=self.output_idx +
+                       [idx for _, idx in self.updates])
+        for (container, _), value in zip(self.updates, rval[n_outputs:]):
+            container.data = value
+        if self.return_none:
+            return None
+        if self.unpack_single:
+            return rval[0]
+        return rval[:n_outputs]
+
+
+def function_entries(entries, mode=None, name=None, allow_input_downcast=None,
+                     profile=None, on_unused_input=None):
+    """
+    Compile several functions of the same graph at once.
+
+    The outputs and updates of all the entries are optimized together, in
+    one FunctionGraph, and compiled into one function. Each entry only
+    computes, with the lazy evaluation of the VM, the part of the graph
+    needed by its outputs and updates. This costs one optimization and one
+    compilation instead of one per entry, and the computations common to
+    several entries are merged.
+
+    Parameters
+    ----------
+    entries : dict
+        Map the name of each entry to a dict with the keys ``inputs``,
+        ``outputs`` and ``updates``, all optional, that have the same meaning
+        as the parameters of `function`. The inputs must be Variables.
+    mode, name, allow_input_downcast, profile, on_unused_input
+        As the parameters of `function`, for the function of all the
+        entries. The linker of the mode must be a VM linker.
+
+    Returns
+    -------
+    dict
+        Map the name of each entry to an `EntryFunction` that takes the
+        inputs of this entry, in order, and returns its outputs like a
+        function made by `function`.
+
+    Notes
+    -----
+    The default updates of the shared variables are not done. The updates
+    of an entry are computed as outputs, so they are never done inplace on
+    the value of the shared variable.
+
+    """
+    mode = get_mode(mode)
+    linker = mode.linker
+    if not isinstance(linker, VM_Linker):
+        raise ValueError("function_entries needs a VM linker, not %s" %
+                         linker)
+    if not linker.use_cloop or linker.tiered:
+        # The Stack VM evaluates lazily only the outputs requested.
+        linker = copy.copy(linker)
+        linker.allow_partial_eval = True
+        mode = Mode(linker=linker, optimizer=mode.provided_optimizer)
+
+    inputs = []
+    outputs = []
+    entry_info = []
+    for entry_name, entry in sorted(iteritems(entries)):
+        input_idx = []
+        for var in entry.get('inputs', []):
+            if var not in inputs:
+                inputs.append(var)
+            input_idx.append(inputs.index(var))
+        entry_outputs = entry.get('outputs')
+        unpack_single = False
+        return_none = entry_outputs is None
+        if entry_outputs is None:
+            entry_outputs = []
+        elif not isinstance(entry_outputs, (list, tuple)):
+            entry_outputs = [entry_outputs]
+            unpack_single = True
+        output_idx = list(range(len(outputs), len(outputs) +
+                                len(entry_outputs)))
+        outputs.extend(entry_outputs)
+        updates = []
+        for shared_var, update in iter_over_pairs(
+                entry.get('updates') or []):
+            if not hasattr(shared_var, 'container'):
+                raise TypeError("Entry %s updates %s, which is not a "
+                                "shared variable" % (entry_name, shared_var))
+            update = shared_var.type.filter_variable(update)
+            updates.append((shared_var.container, len(outputs)))
+            outputs.append(update)
+        entry_info.append((entry_name, input_idx, output_idx, updates,
+                           unpack_single, return_none))
+
+    fn = pfunc(params=inputs, outputs=outputs, mode=mode,
+               no_default_updates=True, name=name,
+               allow_input_downcast=allow_input_downcast,
+               on_unused_input=on_unused_input, profile=profile)
+    # The entries filter their inputs, and give None for the others.
+    fn.trust_input = True
+    return dict((info[0], EntryFunction(info[0], fn, *info[1:]))
+                for info in entry_info)
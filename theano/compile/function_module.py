@@ -4,12 +4,14 @@ Driver of graph construction, optimization, and linking.
 """
 from __future__ import absolute_import, print_function, division
 
+from collections import OrderedDict
 import copy
 from six import string_types, iteritems, iterkeys
 from six.moves import xrange
 import six.moves.copyreg as copyreg
 import six.moves.cPickle as pickle
 from itertools import chain
+import threading
 import time
 import warnings
 import numpy as np
@@ -19,10 +21,12 @@ from theano import config, gof
 from theano.compat import izip
 from theano.gof import graph
 import theano.compile.profiling
+from theano.compile import optcache
 from theano.compile.io import (
     In, SymbolicInput, SymbolicOutput)
 from theano.compile.ops import deep_copy_op, view_op
-from theano.gof.graph import is_same_graph
+from theano.gof import compiletrace
+from theano.gof.utils import hash_from_code
 from theano.gof.op import ops_with_inner_function
 
 import logging
@@ -377,6 +381,8 @@ class Function(object):
         self.maker = maker
         self.profile = None  # reassigned in FunctionMaker.create
         self.trust_input = False  # If True, we don't check the input parameter
+        self._fast_call = False  # See set_fast_call
+        self._executor = None  # See submit
         self.name = name
         self.nodes_with_inner_function = []
         self.output_keys = output_keys
@@ -768,6 +774,26 @@ class Function(object):
             List of outputs on indices/keys from ``output_subset`` or all of them,
             if ``output_subset`` is not passed.
         """
+        if self._executor is not None:
+            # Once calls were submitted, the direct calls also go through the
+            # worker, so that they do not run at the same time as them.
+            return self.submit(*args, **kwargs).result()
+        return self._call(*args, **kwargs)
+
+    def _call(self, *args, **kwargs):
+        """
+        Implementation of `__call__`, run by the worker of `submit`.
+
+        """
+        if self._fast_call and not kwargs:
+            try:
+                return self.fn.call_inputs(args)
+            except Exception:
+                if self.fn.position_of_error < 0:
+                    # The arguments were not accepted.
+                    raise
+                self._reraise_fn_error()
+
         def restore_defaults():
             for i, (required, refeed, value) in enumerate(self.defaults):
                 if refeed:
@@ -842,38 +868,7 @@ class Function(object):
         if (not self.trust_input and
             # The getattr is only needed for old pickle
                 getattr(self, '_check_for_aliased_inputs', True)):
-            # Collect aliased inputs among the storage space
-            args_share_memory = []
-            for i in xrange(len(self.input_storage)):
-                i_var = self.maker.inputs[i].variable
-                i_val = self.input_storage[i].storage[0]
-                if hasattr(i_var.type, 'may_share_memory'):
-                    is_aliased = False
-                    for j in xrange(len(args_share_memory)):
-
-                        group_j = izip(
-                            [self.maker.inputs[k].variable for k
-                             in args_share_memory[j]],
-                            [self.input_storage[k].storage[0] for k
-                             in args_share_memory[j]])
-                        if any([(var.type is i_var.type and
-                                 var.type.may_share_memory(val, i_val))
-                                for (var, val) in group_j]):
-
-                            is_aliased = True
-                            args_share_memory[j].append(i)
-                            break
-
-                    if not is_aliased:
-                        args_share_memory.append([i])
-
-            # Check for groups of more than one argument that share memory
-            for group in args_share_memory:
-                if len(group) > 1:
-                    # copy all but the first
-                    for j in group[1:]:
-                        self.input_storage[j].storage[0] = copy.copy(
-                            self.input_storage[j].storage[0])
+            self._copy_aliased_inputs()
 
         # Check if inputs are missing, or if inputs were set more than once, or
         # if we tried to provide inputs that are supposed to be implicit.
@@ -896,6 +891,12 @@ class Function(object):
                         % getattr(self.inv_finder[c], 'variable',
                                   self.inv_finder[c]))
 
+        # Time the thunks of the sampled calls only
+        sampled = True
+        if profile and profile.sample_every > 1:
+            sampled = profile.fct_callcount % profile.sample_every == 0
+            self.fn.time_thunks = sampled and profile.flag_time_thunks
+
         # Do the actual work
         t0_fn = time.time()
         try:
@@ -904,20 +905,7 @@ class Function(object):
                 self.fn(output_subset=output_subset)
         except Exception:
             restore_defaults()
-            if hasattr(self.fn, 'position_of_error'):
-                # this is a new vm-provided function or c linker
-                # they need this because the exception manipulation
-                # done by raise_with_op is not implemented in C.
-                thunk = None
-                if hasattr(self.fn, 'thunks'):
-                    thunk = self.fn.thunks[self.fn.position_of_error]
-                gof.link.raise_with_op(
-                    node=self.fn.nodes[self.fn.position_of_error],
-                    thunk=thunk,
-                    storage_map=getattr(self.fn, 'storage_map', None))
-            else:
-                # old-style linkers raise their own exceptions
-                raise
+            self._reraise_fn_error()
 
         dt_fn = time.time() - t0_fn
         self.maker.mode.fn_time += dt_fn
@@ -969,8 +957,10 @@ class Function(object):
         if profile:
             profile.fct_callcount += 1
             profile.fct_call_time += dt_call
-            if hasattr(self.fn, 'update_profile'):
-                self.fn.update_profile(profile)
+            if sampled:
+                profile.sampled_callcount += 1
+                if hasattr(self.fn, 'update_profile'):
+                    self.fn.update_profile(profile)
             if profile.ignore_first_call:
                 profile.reset()
                 profile.ignore_first_call = False
@@ -996,6 +986,307 @@ class Function(object):
             else:
                 return [outputs[i] for i in output_subset]
 
+    def set_fast_call(self, fast_call=True):
+        """
+        Select the fast path of `__call__` implemented in C.
+
+        When it is used, a call with only positional arguments puts them in
+        the input storage, runs the VM and returns the outputs in a single
+        C call. As with `trust_input`, the arguments are not checked nor
+        filtered, so they must already be of the right type. All the inputs
+        must be given and the time spent in the calls is not added to the
+        profile. It is not kept by `copy` or by pickling.
+
+        The fast path needs the CVM linker (the default), a function without
+        profile, output keys or inputs with a default value that is
+        restored after each call.
+
+        Parameters
+        ----------
+        fast_call : bool
+            Use the fast path if possible, or stop using it.
+
+        Returns
+        -------
+        bool
+            True if the fast path is now used.
+
+        """
+        self._fast_call = False
+        if not fast_call:
+            return False
+        fn = self.fn
+        if (not hasattr(fn, 'call_inputs') or fn.need_update_inputs or
+                self.profile or self.output_keys is not None or
+                self.return_none or
+                any(refeed for _, refeed, _ in self.defaults)):
+            return False
+        n_inputs = len([c for c in self.input_storage if not c.implicit])
+        if not all(c.required for c in self.input_storage[:n_inputs]):
+            return False
+        post_call_clear = [c.storage for c in self.input_storage
+                           if c.required]
+        if fn.allow_gc:
+            post_call_clear += [c.storage for c, v in zip(
+                self.output_storage, self.maker.fgraph.outputs)
+                if v.owner is not None]
+        fn.input_storage = [c.storage for c in self.input_storage[:n_inputs]]
+        fn.post_call_clear = post_call_clear
+        fn.unpack_single = bool(self.unpack_single)
+        self._fast_call = True
+        return True
+
+    def iter_many(self, args_list):
+        """
+        Evaluate the function on each tuple of positional arguments in
+        `args_list`, and yield the results one by one.
+
+        The first call goes through `__call__`, which checks the
+        arguments. The next ones that provide the same inputs only filter
+        the values and run the VM, reusing the same storage, so the Python
+        overhead of each call is much smaller.
+
+        Parameters
+        ----------
+        args_list : iterable of tuples
+            The positional arguments of each call. It can be a generator.
+
+        Yields
+        ------
+        The result of each call, as returned by `__call__`.
+
+        """
+        args_list = iter(args_list)
+        for args in args_list:
+            yield self(*args)
+            break
+        else:
+            return
+        if self.profile:
+            # The profile needs the statistics of every call.
+            for args in args_list:
+                yield self(*args)
+            return
+
+        n_args = len(args)
+        fn = self.fn
+        mode = self.maker.mode
+        input_storage = self.input_storage[:n_args]
+        trust_input = self.trust_input
+        check_aliased = (not trust_input and
+                         getattr(self, '_check_for_aliased_inputs', True))
+        required = [c for c in self.input_storage if c.required]
+        refeed = []
+        for i, (_, rf, value) in enumerate(self.defaults):
+            if rf:
+                refeed.append((i, value))
+        if getattr(fn, 'allow_gc', False):
+            computed = [c for c, v in zip(self.output_storage,
+                                          self.maker.fgraph.outputs)
+                        if v.owner is not None]
+        else:
+            computed = []
+        if getattr(fn, 'need_update_inputs', True):
+            updated = [s for i, s in reversed(list(zip(
+                self.maker.expanded_inputs, self.input_storage)))
+                if i.update is not None]
+        else:
+            updated = None
+        n_returned = self.n_returned_outputs
+
+        def restore_defaults():
+            for i, value in refeed:
+                if isinstance(value, gof.Container):
+                    value = value.storage[0]
+                self[i] = value
+
+        for args in args_list:
+            if len(args) != n_args:
+                # Other inputs use their default value.
+                yield self(*args)
+                continue
+            t0 = time.time()
+            try:
+                for s, arg in zip(input_storage, args):
+                    if trust_input or arg is None:
+                        s.storage[0] = arg
+                    else:
+                        s.storage[0] = s.type.filter(
+                            arg, strict=s.strict,
+                            allow_downcast=s.allow_downcast)
+            except Exception:
+                # Give the error message of __call__.
+                yield self(*args)
+                continue
+            if check_aliased:
+                self._copy_aliased_inputs()
+
+            try:
+                outputs = fn()
+            except Exception:
+                restore_defaults()
+                self._reraise_fn_error()
+            if outputs is None:
+                outputs = [x.data for x in self.output_storage]
+            for c in required:
+                c.storage[0] = None
+            for c in computed:
+                c.storage[0] = None
+            if updated is not None:
+                for storage in updated:
+                    storage.data = outputs.pop()
+            else:
+                outputs = outputs[:n_returned]
+            restore_defaults()
+
+            dt_call = time.time() - t0
+            theano.compile.profiling.total_fct_exec_time += dt_call
+            mode.call_time += dt_call
+            mode.fn_time += dt_call
+            if self.return_none:
+                yield None
+            elif self.unpack_single and len(outputs) == 1:
+                yield outputs[0]
+            elif self.output_keys is not None:
+                yield dict(izip(self.output_keys, outputs))
+            else:
+                yield outputs
+
+    def call_many(self, args_list, stack=False):
+        """
+        Evaluate the function on each tuple of positional arguments in
+        `args_list`.
+
+        See `iter_many`.
+
+        Parameters
+        ----------
+        args_list : iterable of tuples
+            The positional arguments of each call.
+        stack : bool
+            If True, each output is returned as one array stacking its
+            values for all the calls, along a new first axis. The values of
+            an output must all have the same shape.
+
+        Returns
+        -------
+        list
+            The result of each call, or the stacked outputs, structured as
+            the result of `__call__`.
+
+        """
+        results = list(self.iter_many(args_list))
+        if not stack or self.return_none:
+            return results
+        if not results:
+            raise ValueError("Cannot stack the outputs of 0 calls")
+        if isinstance(results[0], dict):
+            return dict((k, _stack([r[k] for r in results]))
+                        for k in results[0])
+        if isinstance(results[0], list):
+            return [_stack(values) for values in izip(*results)]
+        return _stack(results)
+
+    def submit(self, *args, **kwargs):
+        """
+        Evaluate the function in a worker thread.
+
+        The caller can prepare the inputs of the next call while the
+        function runs. The C code of many ops (e.g. the matrix products)
+        releases the GIL, so both really run at the same time.
+
+        The calls submitted to a function run one after the other, in the
+        order of submission, so each one sees the updates of the shared
+        variables done by the previous ones. Once a call was submitted, the
+        direct calls of the function also run in the worker after the
+        submitted ones. Before using the shared variables the function
+        updates, wait for the results of the submitted calls. The arguments
+        must not be modified before the end of the call. To run several calls at the same time,
+        submit them to copies of the function (see `copy`).
+
+        Parameters
+        ----------
+        args, kwargs
+            The arguments of `__call__`.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            The future of the result of `__call__`.
+
+        """
+        if self._executor is None:
+            try:
+                from concurrent.futures import ThreadPoolExecutor
+            except ImportError:
+                raise ImportError(
+                    "Function.submit needs the module concurrent.futures. "
+                    "On Python 2, install the package futures.")
+            with _executor_lock:
+                if self._executor is None:
+                    # A single worker runs the calls in order.
+                    self._executor = ThreadPoolExecutor(max_workers=1)
+        return self._executor.submit(self._call, *args, **kwargs)
+
+    def _copy_aliased_inputs(self):
+        """
+        Copy the inputs that share memory with a previous input.
+
+        """
+        # Collect aliased inputs among the storage space
+        args_share_memory = []
+        for i in xrange(len(self.input_storage)):
+            i_var = self.maker.inputs[i].variable
+            i_val = self.input_storage[i].storage[0]
+            if hasattr(i_var.type, 'may_share_memory'):
+                is_aliased = False
+                for j in xrange(len(args_share_memory)):
+
+                    group_j = izip(
+                        [self.maker.inputs[k].variable for k
+                         in args_share_memory[j]],
+                        [self.input_storage[k].storage[0] for k
+                         in args_share_memory[j]])
+                    if any([(var.type is i_var.type and
+                             var.type.may_share_memory(val, i_val))
+                            for (var, val) in group_j]):
+
+                        is_aliased = True
+                        args_share_memory[j].append(i)
+                        break
+
+                if not is_aliased:
+                    args_share_memory.append([i])
+
+        # Check for groups of more than one argument that share memory
+        for group in args_share_memory:
+            if len(group) > 1:
+                # copy all but the first
+                for j in group[1:]:
+                    self.input_storage[j].storage[0] = copy.copy(
+                        self.input_storage[j].storage[0])
+
+    def _reraise_fn_error(self):
+        """
+        Reraise the exception raised by self.fn, with information on the
+        node that failed.
+
+        """
+        if hasattr(self.fn, 'position_of_error'):
+            # this is a new vm-provided function or c linker
+            # they need this because the exception manipulation
+            # done by raise_with_op is not implemented in C.
+            thunk = None
+            if hasattr(self.fn, 'thunks'):
+                thunk = self.fn.thunks[self.fn.position_of_error]
+            gof.link.raise_with_op(
+                node=self.fn.nodes[self.fn.position_of_error],
+                thunk=thunk,
+                storage_map=getattr(self.fn, 'storage_map', None))
+        else:
+            # old-style linkers raise their own exceptions
+            raise
+
     value = property(
         lambda self: self._value,
         None,  # this property itself is not settable
@@ -1036,6 +1327,18 @@ class Function(object):
                     inp.data.sync()
 
 
+def _stack(values):
+    """
+    Stack the values of an output for several calls along a new axis.
+
+    """
+    shapes = set(np.shape(v) for v in values)
+    if len(shapes) > 1:
+        raise ValueError("Cannot stack the values of an output with "
+                         "different shapes %s" % sorted(shapes))
+    return np.array(values)
+
+
 # pickling/deepcopy support for Function
 def _pickle_Function(f):
     # copy of the input storage list
@@ -1067,19 +1370,54 @@ def _pickle_Function(f):
                                             (str(d_i), str(d_j)))
                         else:
                             raise AliasedMemoryError(d_i, d_j)
+    # Save the keys of the C modules of the nodes, so that the unpickled
+    # function can load them from the cache without computing them again.
+    link_info = {'version': theano.__version__,
+                 'config_hash': theano.configparser.get_config_hash(),
+                 'cmodule_keys': _cmodule_keys(f.fn)}
     # The user can override trust_input. Our doc tell that.  We should
     # not do that anymore and make sure the Maker have all the
     # information needed.
     rval = (_constructor_Function,
-            (f.maker, input_storage, inputs_data, f.trust_input))
+            (f.maker, input_storage, inputs_data, f.trust_input, link_info))
     return rval
 
 
-def _constructor_Function(maker, input_storage, inputs_data, trust_input=False):
+def _cmodule_keys(fn):
+    """
+    Return a dict mapping the nodes of the VM `fn` to the key of the module
+    of their C thunk.
+
+    """
+    keys = {}
+    for node, thunk in izip(getattr(fn, 'nodes', ()),
+                            getattr(fn, 'thunks', ())):
+        key = getattr(thunk, 'cmodule_key', None)
+        if key is not None:
+            keys[node] = key
+    return keys
+
+
+def _constructor_Function(maker, input_storage, inputs_data, trust_input=False,
+                          link_info=None):
     if not theano.config.unpickle_function:
         return None
 
-    f = maker.create(input_storage, trustme=True)
+    # The graph of the maker is already optimized, it only has to be linked.
+    # The keys of its C modules are reused if they were computed with the
+    # same version of Theano and the same config hash.
+    cmodule_keys = {}
+    if link_info is not None:
+        if (link_info['version'] == theano.__version__ and
+                link_info['config_hash'] ==
+                theano.configparser.get_config_hash()):
+            cmodule_keys = link_info['cmodule_keys']
+        else:
+            _logger.info('The function was pickled with another version or '
+                         'configuration of Theano, the keys of its C '
+                         'modules will be computed again.')
+    with theano.gof.cc.cmodule_key_hints(cmodule_keys):
+        f = maker.create(input_storage, trustme=True)
     assert len(f.input_storage) == len(inputs_data)
     for container, x in zip(f.input_storage, inputs_data):
         assert (container.data is x) or \
@@ -1259,170 +1597,37 @@ class FunctionMaker(object):
             raise TypeError("Unknown output type: %s (%s)", type(output),
                             output)
 
-    def optimize_graph_with_cache(self, optimizer, inputs, outputs):
-        # This function is not finished
-        from theano.gof.compilelock import get_lock, release_lock
-        import os.path
-
-        graph_db_file = os.path.join(theano.config.compiledir,
-                                     'optimized_graphs.pkl')
-
-        # the inputs, outputs, and size of the graph to be optimized
-        inputs_new = [inp.variable for inp in inputs]
-        outputs_new = [out.variable for out in outputs]
-        size_new = len(self.fgraph.apply_nodes)
-        get_lock()
-        # Beginning of cache optimizations.
-        # Could be refactored in different functions.
-
-        def load_graph_db():
-            if os.path.isfile(graph_db_file):
-                print('graph_db already exists')
-            else:
-                # create graph_db
-                with open(graph_db_file, 'wb') as f:
-                    print('create new graph_db in %s' % graph_db_file)
-            # load the graph_db dictionary
-            try:
-                with open(graph_db_file, 'rb') as f:
-                    # Temporary hack to allow
-                    # theano.scan_module.tests.test_scan.T_Scan to
-                    # finish. Should be changed in definitive version.
-                    tmp = theano.config.unpickle_function
-                    theano.config.unpickle_function = False
-                    graph_db = pickle.load(f)
-                print('graph_db loaded and it is not empty')
-            except EOFError as e:
-                # the file has nothing in it
-                print(e)
-                print('graph_db loaded and it is empty')
-                graph_db = {}
-            finally:
-                theano.config.unpickle_function = tmp
-
-            return graph_db
-
-        def find_same_graph_in_db(graph_db):
-            # If found_graph_in_db is None, then need to optimize.
-            # Otherwise, return the graph found.
-            found_graph_in_db = None
-            # The sole purpose of this loop is to set 'need_optimize' by
-            # going through graph_db, looking for graph that has the same
-            # computation performed.
-            for graph_old, graph_optimized in iteritems(graph_db):
-                inputs_old = graph_old.inputs
-                outputs_old = graph_old.outputs
-                size_old = len(graph_old.apply_nodes)
-                # Some heuristics to check is the same graphs have
-                # already been optimized before.
-                if len(inputs_new) != len(inputs_old):
-                    # If the inputs are of different size,
-                    # two graphs are for sure different
-                    print('need to optimize, because input size is different')
-                    continue
-                elif len(outputs_new) != len(outputs_old):
-                    # If the inputs are of different size,
-                    # two graphs are for sure different
-                    print('need to optimize, because output size is different')
-                    continue
-                elif not all(input_new.type == input_old.type
-                             for input_new, input_old in
-                             zip(inputs_new, inputs_old)):
-                    print('need to optimize, because inputs are of different '
-                          'types')
-                    continue
-                elif not all(output_new.type == output_old.type
-                             for output_new, output_old in
-                             zip(outputs_new, outputs_old)):
-                    print('need to optimize, because outputs are of different '
-                          'types')
-                    continue
-                elif not size_old == size_new:
-                    print('need to optimize, because numbers of nodes in graph'
-                          ' are different')
-                    continue
-                else:
-                    flags = []
-                    for i, (output_new, output_old) in enumerate(
-                            zip(outputs_new, outputs_old)):
-                        print('loop through outputs node for both graphs')
-                        graph_old.variables = set(gof.graph.variables(
-                            graph_old.inputs, graph_old.outputs))
-
-                        # using clone allowed to avoid a lot of errors
-                        # deep copy seemed to had.
-                        f2 = graph_old.clone(check_integrity=False)
-                        t1 = output_new
-                        t2 = f2.outputs[i]
-
-                        # Used to remove "already used by another graph error
-                        def removeAllFgraph(remove):
-                            if hasattr(remove, 'fgraph'):
-                                del remove.fgraph
-                            if hasattr(remove, 'owner'):
-                                if remove.owner is None:
-                                    pass
-                                else:
-                                    if hasattr(remove.owner, 'fgraph'):
-                                        del remove.owner.fgraph
-                                    if hasattr(remove.owner, 'inputs'):
-                                        remove.owner.inputs = [removeAllFgraph(
-                                            i) for i in remove.owner.inputs]
-                                        for o in remove.owner.outputs:
-                                            if hasattr(o, 'fgraph'):
-                                                del o.fgraph
-                            return remove
-
-                        t2 = removeAllFgraph(t2)
-
-                        givens = dict(izip(gof.graph.inputs([t1]),
-                                           gof.graph.inputs([t2])))
-
-                        temp = dict(izip(gof.graph.inputs([t1]),
-                                         gof.graph.inputs([t2])))
-
-                        # hack to remove inconstent entry in givens
-                        # seems to work that but source of inconsistency
-                        # could be worth investigating.
-                        for key, value in iteritems(temp):
-                            if key.type != value.type:
-                                del givens[key]
-
-                        flag = is_same_graph(t1, t2, givens=givens)
-
-                        flags.append(flag)
-
-                    is_same = all(flags)
-                    if is_same:
-                        # found the match
-                        print('found a match, no need to optimize')
-                        found_graph_in_db = graph_optimized
-                        break
-            return found_graph_in_db
-
-        graph_db = load_graph_db()
-        print('loaded graph_db from %s, size=%d' % (graph_db_file,
-                                                    len(graph_db)))
-        found_graph = find_same_graph_in_db(graph_db)
-        if found_graph:
-            self.fgraph = found_graph
-            optimizer_profile = None
-        else:
-            # this is a brand new graph, optimize it, save it to graph_db
-            print('graph not found in graph_db, optimizing the graph')
-            self.fgraph.variables = set(gof.graph.variables(
-                self.fgraph.inputs, self.fgraph.outputs))
-            # check_integrity parameters was added to ignore
-            # "excess cached variables" errors. Works that way
-            # but once again the error couldbe worth
-            # investigating.
-            before_opt = self.fgraph.clone(check_integrity=False)
-            optimizer_profile = optimizer(self.fgraph)
-            graph_db.update({before_opt: self.fgraph})
-            with open(graph_db_file, 'wb') as f:
-                pickle.dump(graph_db, f, -1)
-            print('new graph saved into graph_db')
-        release_lock()
+    def optimize_graph_with_cache(self, optimizer, inputs, mode):
+        """
+        Optimize `self.fgraph`, using the persistent cache of optimized graphs.
+
+        If the same graph was already optimized with the same optimizer
+        and Theano flags, `self.fgraph` is replaced by the saved optimized
+        graph and the optimizer is not run. Otherwise, the optimized graph
+        is saved in the cache.
+
+        Returns
+        -------
+        The profile of the optimizer, or None if it was not run.
+
+        """
+        opt_key = optcache.optimizer_key(mode)
+        if opt_key is None:
+            return optimizer(self.fgraph)
+        key = optcache.graph_key(self.fgraph, inputs)
+        if key is None:
+            return optimizer(self.fgraph)
+        key = hash_from_code(key + opt_key)
+
+        cache = optcache.get_optimized_graph_cache()
+        fgraph = cache.load(key, self.fgraph)
+        if fgraph is not None:
+            compiletrace.annotate(optimized_graph_cache='hit')
+            self.fgraph = fgraph
+            return None
+        compiletrace.annotate(optimized_graph_cache='miss')
+        optimizer_profile = optimizer(self.fgraph)
+        cache.save(key, self.fgraph)
         return optimizer_profile
 
     def __init__(self, inputs, outputs,
@@ -1483,8 +1688,9 @@ class FunctionMaker(object):
             need_opt = True
             # make the fgraph (copies the graph, creates NEW INPUT AND
             # OUTPUT VARIABLES)
-            fgraph, additional_outputs = std_fgraph(inputs, outputs,
-                                                    accept_inplace)
+            with compiletrace.span('clone graph', 'graph'):
+                fgraph, additional_outputs = std_fgraph(inputs, outputs,
+                                                        accept_inplace)
             fgraph.profile = profile
         else:
             # fgraph is already an optimized one
@@ -1512,11 +1718,13 @@ class FunctionMaker(object):
                 opt_time = None
 
                 # now optimize the graph
-                if theano.config.cache_optimizations:
-                    optimizer_profile = self.optimize_graph_with_cache(
-                        optimizer, inputs, outputs)
-                else:
-                    optimizer_profile = optimizer(fgraph)
+                with compiletrace.span('optimize', 'optimizer'):
+                    if theano.config.cache_optimizations:
+                        optimizer_profile = self.optimize_graph_with_cache(
+                            optimizer, inputs, mode)
+                        fgraph = self.fgraph
+                    else:
+                        optimizer_profile = optimizer(fgraph)
 
                 end_optimizer = time.time()
                 opt_time = end_optimizer - start_optimizer
@@ -1711,8 +1919,11 @@ class FunctionMaker(object):
         limit_orig = theano.config.traceback.limit
         try:
             theano.config.traceback.limit = theano.config.traceback.compile_limit
-            _fn, _i, _o = self.linker.make_thunk(
-                input_storage=input_storage_lists, storage_map=storage_map)
+            with compiletrace.span('link', 'linker',
+                                   linker=type(self.linker).__name__):
+                _fn, _i, _o = self.linker.make_thunk(
+                    input_storage=input_storage_lists,
+                    storage_map=storage_map)
         finally:
             theano.config.traceback.limit = limit_orig
 
@@ -1762,6 +1973,68 @@ def register_checker(checker):
     __checkers.insert(0, checker)
 
 
+# Optimized graphs of the functions compiled in this process, used with the
+# Theano flag memoize_functions. They are indexed by `_memoize_key`, in
+# least recently used order.
+_memoized_fgraphs = OrderedDict()
+_memoized_fgraphs_lock = threading.Lock()
+# Protects the creation of the executor of Function.submit
+_executor_lock = threading.Lock()
+_memoized_fgraphs_size = 128
+
+
+def _memoize_key(inputs, outputs, mode, accept_inplace):
+    """
+    Return the key of the function compiled from these arguments of
+    `orig_function` in `_memoized_fgraphs`, or None if it can not be
+    memoized.
+
+    """
+    opt_key = optcache.optimizer_key(mode)
+    if opt_key is None:
+        return None
+    try:
+        fgraph, _ = std_fgraph(inputs, outputs, accept_inplace)
+    except Exception:
+        # The FunctionMaker will report the error.
+        return None
+    graph_key = optcache.graph_key(fgraph, inputs)
+    if graph_key is None:
+        return None
+    # The borrow flags change where insert_deepcopy adds copies.
+    return (graph_key, opt_key, bool(accept_inplace),
+            tuple(bool(i.borrow) for i in inputs),
+            tuple(bool(o.borrow) for o in outputs))
+
+
+def _clone_memoized_fgraph(fgraph, inputs):
+    """
+    Return a copy of the optimized graph `fgraph`, whose inputs are clones of
+    the variables of `inputs`, as std_fgraph would make them.
+
+    The copy has its own DestroyHandler and Supervisor, like `fgraph`.
+
+    """
+    memo = dict((old, spec.variable.clone())
+                for old, spec in izip(fgraph.inputs, inputs))
+    memo = graph.clone_get_equiv(fgraph.inputs, fgraph.outputs, memo=memo)
+    fgraph_cpy = gof.fg.FunctionGraph([memo[i] for i in fgraph.inputs],
+                                      [memo[o] for o in fgraph.outputs],
+                                      clone=False,
+                                      update_mapping=fgraph.update_mapping)
+    # The features can only serve one graph, so new ones are attached. The
+    # DestroyHandler gives the orderings of the inplace ops to the linker.
+    for feature in fgraph._features:
+        if isinstance(feature, gof.DestroyHandler):
+            fgraph_cpy.attach_feature(gof.DestroyHandler(algo=feature.algo))
+        elif isinstance(feature, Supervisor):
+            fgraph_cpy.attach_feature(Supervisor(
+                memo[r] for r in feature.protected if r in memo))
+        elif type(feature) in std_fgraph.features:
+            fgraph_cpy.attach_feature(type(feature)())
+    return fgraph_cpy
+
+
 def orig_function(inputs, outputs, mode=None, accept_inplace=False,
                   name=None, profile=None, on_unused_input=None,
                   output_keys=None):
@@ -1827,24 +2100,51 @@ def orig_function(inputs, outputs, mode=None, accept_inplace=False,
     if isinstance(mode, (list, tuple)):  # "mode comparison" semantics
         raise Exception("We do not support the passing of multiple modes")
     fn = None
-    try:
-        Maker = getattr(mode, 'function_maker', FunctionMaker)
-        m = Maker(inputs,
-                  outputs,
-                  mode,
-                  accept_inplace=accept_inplace,
-                  profile=profile,
-                  on_unused_input=on_unused_input,
-                  output_keys=output_keys,
-                  name=name)
-        with theano.change_flags(compute_test_value="off"):
-            fn = m.create(defaults)
-    finally:
-        t2 = time.time()
-        if fn and profile:
-            profile.compile_time += t2 - t1
-            # TODO: append
-            profile.nb_nodes = len(fn.maker.fgraph.apply_nodes)
+    with compiletrace.function_span(name):
+        try:
+            Maker = getattr(mode, 'function_maker', FunctionMaker)
+            # With memoize_functions, reuse the optimized graph of an identical
+            # function compiled before, as Function.copy does.
+            memo_key = None
+            fgraph = None
+            if config.memoize_functions and Maker is FunctionMaker:
+                if outputs is None:
+                    output_list = []
+                elif isinstance(outputs, list):
+                    output_list = outputs
+                else:
+                    output_list = [outputs]
+                memo_key = _memoize_key(inputs, output_list, mode,
+                                        accept_inplace)
+                if memo_key is not None:
+                    with _memoized_fgraphs_lock:
+                        fgraph = _memoized_fgraphs.pop(memo_key, None)
+                        if fgraph is not None:
+                            _memoized_fgraphs[memo_key] = fgraph
+                    if fgraph is not None:
+                        fgraph = _clone_memoized_fgraph(fgraph, inputs)
+            m = Maker(inputs,
+                      outputs,
+                      mode,
+                      accept_inplace=accept_inplace,
+                      profile=profile,
+                      on_unused_input=on_unused_input,
+                      fgraph=fgraph,
+                      output_keys=output_keys,
+                      name=name)
+            with theano.change_flags(compute_test_value="off"):
+                fn = m.create(defaults)
+            if memo_key is not None and fgraph is None:
+                with _memoized_fgraphs_lock:
+                    _memoized_fgraphs[memo_key] = m.fgraph
+                    while len(_memoized_fgraphs) > _memoized_fgraphs_size:
+                        _memoized_fgraphs.popitem(last=False)
+        finally:
+            t2 = time.time()
+            if fn and profile:
+                profile.compile_time += t2 - t1
+                # TODO: append
+                profile.nb_nodes = len(fn.maker.fgraph.apply_nodes)
 
     return fn
 
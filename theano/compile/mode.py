@@ -28,7 +28,13 @@ predefined_linkers = {
     'vm': gof.vm.VM_Linker(use_cloop=False),  # Use allow_gc Theano flag
     'cvm': gof.vm.VM_Linker(use_cloop=True),  # Use allow_gc Theano flag
     'vm_nogc': gof.vm.VM_Linker(allow_gc=False, use_cloop=False),
-    'cvm_nogc': gof.vm.VM_Linker(allow_gc=False, use_cloop=True)}
+    'cvm_nogc': gof.vm.VM_Linker(allow_gc=False, use_cloop=True),
+    # Use allow_gc Theano flag. Compile the C code in the background.
+    'vm_tiered': gof.vm.VM_Linker(use_cloop=False, tiered=True),
+    # Use allow_gc Theano flag. Run independent nodes concurrently.
+    'vm_parallel': gof.vm.VM_Linker(use_cloop=False, parallel=True),
+    # Use allow_gc Theano flag. Preallocate the intermediate results.
+    'vm_arena': gof.vm.VM_Linker(use_cloop=False, arena=True)}
 
 
 def register_linker(name, linker):
@@ -74,6 +80,11 @@ OPT_O2.name = 'OPT_O2'
 OPT_O3.name = 'OPT_O3'
 OPT_UNSAFE.name = 'OPT_UNSAFE'
 
+# fast_run, until the time budget is spent, then only fast_compile.
+OPT_TIME_BUDGET = OPT_FAST_RUN.budgeted(theano.config.optdb.time_budget,
+                                        OPT_FAST_COMPILE)
+OPT_TIME_BUDGET.name = 'OPT_TIME_BUDGET'
+
 predefined_optimizers = {
     None: OPT_NONE,
     'None': OPT_NONE,
@@ -86,6 +97,7 @@ predefined_optimizers = {
     'fast_compile': OPT_FAST_COMPILE,
     'fast_run': OPT_FAST_RUN,
     'fast_run_stable': OPT_FAST_RUN_STABLE,
+    'time_budget': OPT_TIME_BUDGET,
     'stabilize': OPT_STABILIZE}
 
 
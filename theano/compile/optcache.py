@@ -0,0 +1,327 @@
+"""
+Persistent cache of optimized graphs.
+
+When the Theano flag ``cache_optimizations`` is True, the FunctionGraph
+produced by the optimizer is saved in the compilation directory, so that
+compiling the same graph again, possibly in another process, does not run
+the optimizer. Entries are keyed by a structural hash of the graph to
+optimize and by a hash of the optimizer and of the Theano flags.
+
+"""
+from __future__ import absolute_import, print_function, division
+
+import logging
+import os
+
+import six.moves.cPickle as pickle
+
+import theano
+from theano import config, gof
+from theano.compat import izip
+from theano.configparser import _config_var_list
+from theano.gof.utils import hash_from_code
+
+_logger = logging.getLogger('theano.compile.optcache')
+
+
+def graph_key(fgraph, input_specs):
+    """
+    Return a hash of the structure of an unoptimized FunctionGraph.
+
+    Two graphs get the same key when they apply the same ops, in the
+    same order, on inputs and constants of the same types. Names and
+    shared variable values are not taken into account.
+
+    Parameters
+    ----------
+    fgraph : FunctionGraph
+        The graph before optimization.
+    input_specs : list of SymbolicInput
+        The specifications of `fgraph.inputs`.
+
+    Returns
+    -------
+    str or None
+        None if the graph can not be hashed (e.g. if an op can not be
+        pickled).
+
+    """
+    position = {}
+    signature = []
+    for i, (var, spec) in enumerate(izip(fgraph.inputs, input_specs)):
+        position[var] = ('input', i)
+        signature.append((type(var), var.type, bool(spec.mutable)))
+
+    def ref(var):
+        if var in position:
+            return position[var]
+        if isinstance(var, gof.Constant):
+            return ('constant', var.type, var.data)
+        raise ValueError(var)
+
+    try:
+        for n_idx, node in enumerate(fgraph.toposort()):
+            signature.append((node.op,
+                              tuple(ref(v) for v in node.inputs),
+                              tuple(v.type for v in node.outputs)))
+            for o_idx, out in enumerate(node.outputs):
+                position[out] = ('node', n_idx, o_idx)
+        signature.append(tuple(ref(v) for v in fgraph.outputs))
+        signature.append(sorted(fgraph.update_mapping.items()))
+        return hash_from_code(pickle.dumps(signature, -1))
+    except Exception as e:
+        _logger.debug('Could not hash graph %s: %s', fgraph, e)
+        return None
+
+
+def _db_names(db, seen):
+    names = []
+    for name in sorted(db._names):
+        names.append(name)
+        for obj in db.__db__[name]:
+            if isinstance(obj, gof.optdb.DB) and id(obj) not in seen:
+                seen.add(id(obj))
+                names.append('(%s)' % ' '.join(_db_names(obj, seen)))
+    return names
+
+
+def optimizer_key(mode):
+    """
+    Return a hash of the optimizer of `mode` and of the Theano flags.
+
+    Only modes whose optimizer is a Query on `optdb` without a time
+    budget can be cached, as the result of other optimizers can not be
+    identified across processes. None is returned for the other modes.
+
+    """
+    query = getattr(mode, '_optimizer', None)
+    if not isinstance(query, gof.Query):
+        return None
+    if getattr(query, 'time_budget', None) is not None:
+        # The result depends on the speed of the machine.
+        return None
+    from theano.compile.mode import optdb
+    all_opts = sorted(_config_var_list, key=lambda cv: cv.fullname)
+    return hash_from_code('\n'.join(
+        [theano.__version__, str(query),
+         ' '.join(_db_names(optdb, set()))] +
+        ['%s = %s' % (cv.fullname, cv.__get__(True, None))
+         for cv in all_opts]))
+
+
+class OptimizedGraphCache(object):
+    """
+    Directory of pickled optimized FunctionGraphs.
+
+    Each graph is saved in ``<dirname>/<key[:2]>/<key>.pkl``. The values
+    of the shared variables that are inputs of the graph are not saved:
+    when a graph is loaded, its inputs use the storage of the graph it
+    replaces.
+
+    When the total size of the files exceeds the Theano flag
+    ``cache_optimizations_max_size``, the least recently used graphs are
+    deleted. To not walk the whole directory on each save, the cache keeps
+    an estimate of its size, that is only measured again when the saves of
+    this process push it past the limit, or every `evict_period` saves to
+    take into account the graphs saved by other processes.
+
+    Parameters
+    ----------
+    dirname : str
+        The directory of the cache. It is created if needed.
+
+    """
+
+    evict_period = 100
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+        # Estimate of the total size of the files, None if unknown.
+        self._size = None
+        self._nb_saves = 0
+
+    def path(self, key):
+        return os.path.join(self.dirname, key[:2], key + '.pkl')
+
+    def load(self, key, fgraph):
+        """
+        Return the optimized graph saved for `key`, or None.
+
+        Parameters
+        ----------
+        key : str
+        fgraph : FunctionGraph
+            The unoptimized graph. Its inputs provide the containers of the
+            shared variables, and its profile is given to the loaded graph.
+
+        """
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+
+        def persistent_load(pid):
+            if pid[0] == 'container':
+                return fgraph.inputs[pid[1]].container
+            elif pid[0] == 'profile':
+                return fgraph.profile
+            raise pickle.UnpicklingError(pid)
+
+        # The graph can contain the compiled inner function of ops like
+        # Scan. They are recompiled when needed.
+        unpickle_function = config.unpickle_function
+        config.unpickle_function = False
+        try:
+            with open(path, 'rb') as f:
+                p = pickle.Unpickler(f)
+                p.persistent_load = persistent_load
+                opt_fgraph = p.load()
+        except Exception as e:
+            _logger.warning('Removing corrupted optimized graph %s: %s',
+                            path, e)
+            self._remove(path)
+            return None
+        finally:
+            config.unpickle_function = unpickle_function
+
+        if (len(opt_fgraph.inputs) != len(fgraph.inputs) or
+                len(opt_fgraph.outputs) != len(fgraph.outputs) or
+                not all(a.type == b.type for a, b in
+                        izip(opt_fgraph.inputs + opt_fgraph.outputs,
+                             fgraph.inputs + fgraph.outputs))):
+            _logger.warning('Removing optimized graph %s, it does not match '
+                            'the graph to optimize', path)
+            self._remove(path)
+            return None
+        # Update the modification time, that is used for the eviction.
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        _logger.debug('Loaded optimized graph from %s', path)
+        return opt_fgraph
+
+    def save(self, key, fgraph):
+        """
+        Save the optimized graph `fgraph` under `key`.
+
+        Graphs that can not be pickled are not saved.
+
+        """
+        path = self.path(key)
+        containers = dict((id(getattr(var, 'container', None)), i)
+                          for i, var in enumerate(fgraph.inputs)
+                          if getattr(var, 'container', None) is not None)
+        profile = getattr(fgraph, 'profile', None)
+
+        def persistent_id(obj):
+            if id(obj) in containers:
+                return ('container', containers[id(obj)])
+            elif profile is not None and obj is profile:
+                return ('profile',)
+            return None
+
+        if not os.path.isdir(os.path.dirname(path)):
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError:
+                # Another process may have created it.
+                if not os.path.isdir(os.path.dirname(path)):
+                    raise
+        # Write to a temporary file that is then renamed, so that the
+        # other processes never read a partially written graph.
+        tmp_path = '%s.%s.tmp' % (path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as f:
+                p = pickle.Pickler(f, -1)
+                p.persistent_id = persistent_id
+                p.dump(fgraph)
+        except Exception as e:
+            _logger.debug('Could not save optimized graph %s: %s', path, e)
+            self._remove(tmp_path)
+            return
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Windows does not allow renaming over an existing file.
+            self._remove(path)
+            os.rename(tmp_path, path)
+        _logger.debug('Saved optimized graph to %s', path)
+        self._nb_saves += 1
+        max_size = config.cache_optimizations_max_size * 2 ** 20
+        if not max_size:
+            return
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            # Evicted by another process.
+            size = 0
+        if (self._size is None or self._nb_saves >= self.evict_period or
+                self._size + size > max_size):
+            self.evict(max_size)
+        else:
+            self._size += size
+
+    def evict(self, max_size=None):
+        """
+        Delete the least recently used graphs until the cache fits.
+
+        Parameters
+        ----------
+        max_size : int
+            Maximum size of the cache, in bytes. Defaults to the Theano
+            flag ``cache_optimizations_max_size`` (in MB). 0 means no limit.
+
+        """
+        if max_size is None:
+            max_size = config.cache_optimizations_max_size * 2 ** 20
+        if not max_size or not os.path.isdir(self.dirname):
+            return
+        entries = []
+        total = 0
+        for shard in os.listdir(self.dirname):
+            shard = os.path.join(self.dirname, shard)
+            if not os.path.isdir(shard):
+                continue
+            for name in os.listdir(shard):
+                if not name.endswith('.pkl'):
+                    continue
+                path = os.path.join(shard, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    # Deleted by another process.
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= max_size:
+                break
+            _logger.debug('Evicting optimized graph %s', path)
+            self._remove(path)
+            total -= size
+        self._size = total
+        self._nb_saves = 0
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_optimized_graph_cache = None
+
+
+def get_optimized_graph_cache():
+    """
+    Return the OptimizedGraphCache of the current compilation directory.
+
+    """
+    global _optimized_graph_cache
+    dirname = os.path.join(config.compiledir, 'optimized_graphs')
+    if (_optimized_graph_cache is None or
+            _optimized_graph_cache.dirname != dirname):
+        _optimized_graph_cache = OptimizedGraphCache(dirname)
+    return _optimized_graph_cache
@@ -23,7 +23,7 @@ import warnings
 import numpy as np
 
 import theano
-from theano.gof import graph
+from theano.gof import graph, sched
 
 __authors__ = "James Bergstra"
 __reviewer__ = "Razvan Pascanu"
@@ -81,7 +81,7 @@ def _atexit_print_fn():
             cum.message = msg
             for ps in to_sum[1:]:
                 for attr in ["compile_time", "fct_call_time", "fct_callcount",
-                             "vm_call_time", "optimizer_time", "linker_time",
+                             "sampled_callcount", "vm_call_time", "optimizer_time", "linker_time",
                              "validate_time", "import_time",
                              "linker_node_make_thunks"]:
                     setattr(cum, attr, getattr(cum, attr) + getattr(ps, attr))
@@ -89,8 +89,8 @@ def _atexit_print_fn():
                 # merge dictonary
                 for attr in ["apply_time", "apply_callcount",
                              "apply_cimpl", "variable_shape", "variable_strides",
-                             "variable_offset",
-                             "linker_make_thunk_time"]:
+                             "variable_offset", "node_alloc_bytes",
+                             "node_alloc_peak", "linker_make_thunk_time"]:
                     cum_attr = getattr(cum, attr)
                     for key, val in iteritems(getattr(ps, attr)):
                         assert key not in cum_attr, (key, cum_attr)
@@ -156,6 +156,23 @@ def register_profiler_printer(fct):
     return fct
 
 
+def _max_rss():
+    """
+    Return the high-water mark of the resident memory of the process in
+    bytes, or None when it is not available.
+
+    """
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return max_rss
+    return max_rss * 1024
+
+
 class ProfileStats(object):
 
     """
@@ -177,6 +194,7 @@ class ProfileStats(object):
         # self.compile_time = 0.
         self.fct_call_time = 0.
         self.fct_callcount = 0
+        self.sampled_callcount = 0
         self.vm_call_time = 0.
         self.apply_time = {}
         self.apply_callcount = {}
@@ -202,6 +220,14 @@ class ProfileStats(object):
     # Number of calls to Function.__call__
     #
 
+    sample_every = 1
+    # Time the thunks of one call to Function.__call__ out of sample_every
+    #
+
+    sampled_callcount = 0
+    # Number of calls to Function.__call__ that timed the thunks
+    #
+
     vm_call_time = 0.0
     # Total time spent in Function.fn.__call__
     #
@@ -234,6 +260,20 @@ class ProfileStats(object):
     # Variable -> offset
     #
 
+    node_alloc_bytes = {}
+    # Apply -> bytes allocated by the node and still used after it,
+    # measured when profiling.track_allocations is set
+    #
+
+    node_alloc_peak = {}
+    # Apply -> peak of the bytes allocated while the node runs, including
+    # its temporaries, measured when profiling.track_allocations is set
+    #
+
+    traced_peak_memory = 0
+    # Peak of the memory traced by tracemalloc while the nodes run
+    #
+
     optimizer_time = 0.0
     # time spent optimizing graph (FunctionMaker.__init__)
 
@@ -265,7 +305,7 @@ class ProfileStats(object):
     # param is called flag_time_thunks because most other attributes with time
     # in the name are times *of* something, rather than configuration flags.
     def __init__(self, atexit_print=True, flag_time_thunks=None,
-                 gpu_checks=True, **kwargs):
+                 gpu_checks=True, sample_every=None, **kwargs):
         if (gpu_checks and
             (hasattr(theano, 'gpuarray') and
              theano.gpuarray.pygpu_activated) and
@@ -298,10 +338,16 @@ class ProfileStats(object):
         self.variable_shape = {}
         self.variable_strides = {}
         self.variable_offset = {}
+        self.node_alloc_bytes = {}
+        self.node_alloc_peak = {}
         if flag_time_thunks is None:
             self.flag_time_thunks = config.profiling.time_thunks
         else:
             self.flag_time_thunks = flag_time_thunks
+        if sample_every is None:
+            self.sample_every = config.profiling.sample_every
+        else:
+            self.sample_every = sample_every
         self.__dict__.update(kwargs)
         if atexit_print:
             global _atexit_print_list
@@ -735,6 +781,11 @@ class ProfileStats(object):
                 self.vm_call_time,
                 100 * self.vm_call_time / self.fct_call_time), file=file)
             local_time = sum(self.apply_time.values())
+            if 0 < self.sampled_callcount < self.fct_callcount:
+                print('  Thunks timed in %i sampled calls, the time in '
+                      'thunks is estimated from them' %
+                      self.sampled_callcount, file=file)
+                local_time *= self.fct_callcount / self.sampled_callcount
             if local_time > 0:
                 print('  Time in thunks: %es (%.3f%%)' %
                       (local_time, 100 * local_time / self.fct_call_time),
@@ -803,7 +854,8 @@ class ProfileStats(object):
         stats = [[[0, 0, 0], [0, 0, 0], 0, 0],  # old, with dmap
                  [[0, 0, 0], [0, 0, 0], 0, 0],  # old, without dmap
                  [[0, 0, 0], [0, 0, 0], 0, 0],  # new, with dmap
-                 [[0, 0, 0], [0, 0, 0], 0, 0]]  # new, without dmap
+                 [[0, 0, 0], [0, 0, 0], 0, 0],  # new, without dmap
+                 [[0, 0, 0], [0, 0, 0], 0, 0]]  # memory_schedule_fn, with dmap
 
         # track min peak memory usage
         min_max_peak = 0
@@ -1188,10 +1240,13 @@ class ProfileStats(object):
 
             new_order = fgraph.profile.node_executed_order
             # A list of new executed node order
+            min_order = sched.min_memory_order(
+                fgraph, lambda var: var_mem.get(var, 0))
             for i, (ord, ignore_dmap) in enumerate([(order, False),
                                                     (order, True),
                                                     (new_order, False),
-                                                    (new_order, True)]):
+                                                    (new_order, True),
+                                                    (min_order, False)]):
                 running_memory = count_running_memory(
                     ord, fgraph, nodes_mem, ignore_dmap=ignore_dmap)
 
@@ -1235,6 +1290,15 @@ class ProfileStats(object):
         print_stats(stats[0], stats[2])
         print("    Max peak memory with current setting and Theano flag optimizer_excluding=inplace", file=file)
         print_stats(stats[1], stats[3])
+        (_, min_order_running_max_memory_size, _, _) = stats[4]
+        print("    Max peak memory with the order of "
+              "theano.gof.sched.memory_schedule_fn", file=file)
+        print("        CPU: %dKB" % int(round(
+            min_order_running_max_memory_size[1] / 1024.)), file=file)
+        print("        GPU: %dKB" % int(round(
+            min_order_running_max_memory_size[2] / 1024.)), file=file)
+        print("        CPU + GPU: %dKB" % int(round(
+            min_order_running_max_memory_size[0] / 1024.)), file=file)
 
         (max_node_memory_size, _, _, _) = stats[0]
         (new_max_node_memory_size, _, _, _) = stats[2]
@@ -1245,8 +1309,37 @@ class ProfileStats(object):
             new_max_node_memory_size[2] / 1024.)), file=file)
         print("        CPU + GPU: %dKB" % int(round(
             new_max_node_memory_size[0] / 1024.)), file=file)
+        if self.traced_peak_memory:
+            print("    Max peak memory measured by tracemalloc (all the "
+                  "memory traced, not only the nodes)", file=file)
+            print("        CPU: %dKB" % int(round(
+                self.traced_peak_memory / 1024.)), file=file)
+        max_rss = _max_rss()
+        if max_rss:
+            print("    High-water mark of the process (max resident memory)",
+                  file=file)
+            print("        CPU: %dKB" % int(round(max_rss / 1024.)),
+                  file=file)
         print("---", file=file)
 
+        if self.node_alloc_peak:
+            print("", file=file)
+            print("    Memory allocated by the Apply nodes, measured by "
+                  "tracemalloc", file=file)
+            print("    <Peak allocated while running (bytes)>"
+                  " <Allocated and kept (bytes)>"
+                  " <Apply node>", file=file)
+            print("", file=file)
+            items = sorted(self.node_alloc_peak.items(),
+                           key=operator.itemgetter(1), reverse=True)
+            for node, peak in items[:N]:
+                print("     %9dB %9dB %s" % (
+                    peak, self.node_alloc_bytes.get(node, 0), node),
+                    file=file)
+            print("    The peak includes the temporaries allocated by the "
+                  "node, like the buffers of the C code.", file=file)
+            print("---", file=file)
+
         if min_max_peak:
             print("    Minimum peak from all valid apply node order is "
                   "%dKB(took %.3fs to compute)" %
@@ -1333,6 +1426,19 @@ class ProfileStats(object):
         self.print_extra(file)
         self.print_tips(file)
 
+    def flush(self, file=sys.stderr, n_ops_to_print=20,
+              n_apply_to_print=20):
+        """
+        Print the summary of the calls done since the last flush, and
+        reset the statistics of the calls.
+
+        This allows to print, at any time, the profile of a function that
+        keeps running, e.g. in a server.
+
+        """
+        self.summary(file, n_ops_to_print, n_apply_to_print)
+        self.reset()
+
     def print_tips(self, file):
         print("""Here are tips to potentially make your code run faster
                  (if you think of new ones, suggest them on the mailing list).
@@ -30,6 +30,37 @@ def test_function_dump():
     assert np.allclose(fct1(x), fct2(x))
 
 
+def test_function_entries():
+    x = theano.tensor.dmatrix('x')
+    y = theano.tensor.dvector('y')
+    w = theano.shared(np.ones(3), 'w')
+    pred = theano.tensor.dot(x, w)
+    cost = ((pred - y) ** 2).sum()
+    fns = theano.function_entries({
+        'train': dict(inputs=[x, y], outputs=cost,
+                      updates=[(w, w - 0.01 * theano.grad(cost, w))]),
+        'eval': dict(inputs=[x, y], outputs=[cost, pred]),
+        'predict': dict(inputs=[x], outputs=pred),
+        'reset': dict(inputs=[], updates=[(w, w * 0)])})
+    assert fns['train'].fn is fns['predict'].fn
+    xv = np.arange(6.).reshape(2, 3)
+    yv = np.ones(2)
+    assert np.allclose(fns['predict'](xv), [3., 12.])
+    c, p = fns['eval'](xv, yv)
+    assert np.allclose(c, 125.) and np.allclose(p, [3., 12.])
+    assert np.allclose(w.get_value(), 1.)
+    assert np.allclose(fns['train'](xv, yv), 125.)
+    g = 2 * np.dot(xv.T, np.dot(xv, np.ones(3)) - yv)
+    assert np.allclose(w.get_value(), 1. - 0.01 * g)
+    assert fns['reset']() is None
+    assert np.allclose(w.get_value(), 0.)
+    try:
+        fns['predict'](xv, yv)
+        assert False
+    except TypeError:
+        pass
+
+
 class TestFunctionIn(unittest.TestCase):
 
     def test_in_strict(self):
@@ -14,6 +14,7 @@ from theano.compile import UnusedInputError
 from theano.gof import MissingInputError
 from theano.compat import exc_message
 from theano.tests.unittest_tools import SkipTest
+from theano.tests import unittest_tools as utt
 
 from theano import tensor
 from theano import tensor as T
@@ -616,6 +617,88 @@ class T_function(unittest.TestCase):
 
             assert f._check_for_aliased_inputs, d
 
+    def test_call_many(self):
+        x = T.dvector('x')
+        a = T.dscalar('a')
+        s = theano.shared(0.)
+        f = function([x, In(a, value=2.)], [x * a, x.sum()],
+                     updates=[(s, s + 1)])
+        args = [(np.arange(3.) + i,) for i in range(4)] + [([1, 2, 3], 3.)]
+        expected = []
+        for arg in args:
+            v = np.asarray(arg[0], dtype='float64')
+            expected.append([v * (arg[1] if len(arg) > 1 else 2.), v.sum()])
+        results = f.call_many(args)
+        assert len(results) == len(args)
+        for r, e in zip(results, expected):
+            assert np.allclose(r[0], e[0]) and np.allclose(r[1], e[1])
+        assert s.get_value() == len(args)
+        # The default value is used again after a call that provided it.
+        assert np.allclose(f(np.ones(3)), [2., 2., 2.])
+
+        stacked = f.call_many(iter(args[:4]), stack=True)
+        assert stacked[0].shape == (4, 3)
+        assert np.allclose(stacked[1], [e[1] for e in expected[:4]])
+        assert s.get_value() == len(args) + 5
+
+        g = function([x], x * 2)
+        assert np.allclose(g.call_many([([1.],), ([2.],)], stack=True),
+                           [[2.], [4.]])
+        self.assertRaises(TypeError, g.call_many, [([1.],), ([[1.]],)])
+        h = function([x], {'y': x + 1})
+        assert np.allclose(h.call_many([([1.],), ([2.],)], stack=True)['y'],
+                           [[2.], [3.]])
+        assert f.call_many([]) == []
+
+    def test_set_fast_call(self):
+        if not theano.config.cxx:
+            raise SkipTest("Need cxx for the CVM linker")
+        mode = theano.compile.Mode(linker='cvm', optimizer='fast_run')
+        x = T.dvector('x')
+        y = T.dvector('y')
+        s = theano.shared(0.)
+        f = function([x, y], x * y + s, updates=[(s, s + 1)], mode=mode)
+        assert f.set_fast_call()
+        v = np.arange(3.)
+        assert np.allclose(f(v, v), v * v)
+        assert np.allclose(f(v, v), v * v + 1)
+        assert s.get_value() == 2
+        self.assertRaises(TypeError, f, v)
+        # A wrong input is not filtered, the error comes from the C code.
+        self.assertRaises(Exception, f, v, [[1.]])
+        assert not f.set_fast_call(False)
+        assert np.allclose(f(v, [0., 0., 0.]), [3., 3., 3.])
+
+        g = function([x, In(y, value=np.ones(3))], [x + y, x], mode=mode)
+        assert not g.set_fast_call()
+        g = function([x], [x + 1, x - 1], mode=mode)
+        assert g.set_fast_call()
+        r = g(v)
+        assert isinstance(r, list)
+        assert np.allclose(r[0], v + 1) and np.allclose(r[1], v - 1)
+        assert not function([x], x, mode='FAST_COMPILE').set_fast_call()
+
+    def test_submit(self):
+        try:
+            import concurrent.futures  # noqa
+        except ImportError:
+            raise SkipTest("Need the module concurrent.futures")
+        x = T.dvector('x')
+        s = theano.shared(0.)
+        f = function([x], x * 2 + s, updates=[(s, s + 1)])
+        futures = [f.submit(np.arange(3.) + i) for i in range(5)]
+        # The calls run in order, each one sees the previous update.
+        for i, fut in enumerate(futures):
+            assert np.allclose(fut.result(), (np.arange(3.) + i) * 2 + i)
+        assert s.get_value() == 5
+        self.assertRaises(TypeError, f.submit([[1.]]).result)
+        assert np.allclose(f.submit(x=[1.]).result(), [7.])
+        # The direct calls run after the submitted ones.
+        futures = [f.submit(np.zeros(3)) for i in range(5)]
+        assert np.allclose(f(np.zeros(3)), [11.] * 3)
+        assert [fut.result()[0] for fut in futures] == [6., 7., 8., 9., 10.]
+        assert s.get_value() == 12
+
 
 class T_picklefunction(unittest.TestCase):
 
@@ -968,6 +1051,56 @@ def test_empty_givens_updates():
     function([theano.In(x)], y, updates={})
 
 
+def test_memoize_functions():
+    # Structurally identical graphs reuse the optimized graph of the first
+    # function, with their own inputs and shared variables.
+    mode = theano.compile.get_mode('FAST_RUN')
+
+    def build(value):
+        x = T.dvector('x')
+        s = theano.shared(np.float64(value))
+        return s, function([x], T.exp(x).sum() * s, mode=mode,
+                           updates=[(s, s + 1)])
+
+    with theano.change_flags(memoize_functions=True):
+        s1, f1 = build(1)
+        opt_time = theano.compile.profiling.total_graph_opt_time
+        s2, f2 = build(10)
+        assert theano.compile.profiling.total_graph_opt_time == opt_time
+    assert f1.maker.fgraph is not f2.maker.fgraph
+    assert (len(f1.maker.fgraph.apply_nodes) ==
+            len(f2.maker.fgraph.apply_nodes))
+    x = np.zeros(2)
+    assert f1(x) == 2
+    assert f2(x) == 20
+    assert s1.get_value() == 2
+    assert s2.get_value() == 11
+
+
+def test_memoize_functions_inplace():
+    # The reused graph keeps its DestroyHandler, so the inplace add still
+    # runs after the dot that reads its input.
+    mode = theano.compile.get_mode('FAST_RUN')
+
+    def build():
+        x = T.dmatrix('x')
+        y = T.dmatrix('y')
+        a = x + y
+        return function([x, y], [T.dot(a, y), T.exp(a) + a], mode=mode)
+
+    f_ref = build()
+    with theano.change_flags(memoize_functions=True):
+        build()
+        f = build()
+    assert f.maker.fgraph is not f_ref.maker.fgraph
+    assert (hasattr(f.maker.fgraph, 'destroy_handler') ==
+            hasattr(f_ref.maker.fgraph, 'destroy_handler'))
+    x = np.random.rand(3, 3)
+    y = np.random.rand(3, 3)
+    for out, expected in zip(f(x, y), f_ref(x, y)):
+        utt.assert_allclose(expected, out)
+
+
 def test_sync_update():
     # This test if sync_update work. This can only be tested when
     # there is a GPU.  To test if we really sync, we compare a case we
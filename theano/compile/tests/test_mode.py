@@ -1,11 +1,13 @@
 from __future__ import absolute_import, print_function, division
 
 from nose.plugins.skip import SkipTest
+import numpy as np
 
 import theano
 from theano.compile.mode import Mode, AddFeatureOptimizer
 from theano.gof.toolbox import NoOutputFromInplace
 import theano.tensor as T
+from theano.tests import unittest_tools as utt
 
 
 def test_no_output_from_implace():
@@ -36,3 +38,17 @@ def test_no_output_from_implace():
 def test_including():
     mode = theano.Mode(optimizer='merge')
     mode.including('fast_compile')
+
+
+def test_time_budget():
+    x = T.vector()
+    out = T.exp(T.log(x * 1 + 0)) + T.tanh(x)
+    x_val = np.asarray([1, 2, 3], dtype=theano.config.floatX)
+    expected = theano.function([x], out, mode='FAST_RUN')(x_val)
+    for budget in [0, 10]:
+        query = theano.compile.mode.OPT_FAST_RUN.budgeted(
+            budget, theano.compile.mode.OPT_FAST_COMPILE)
+        f = theano.function([x], out, mode=Mode(optimizer=query))
+        utt.assert_allclose(expected, f(x_val))
+    f = theano.function([x], out, mode=Mode(optimizer='time_budget'))
+    utt.assert_allclose(expected, f(x_val))
@@ -9,6 +9,7 @@ import theano
 from six.moves import StringIO
 import theano.tensor as T
 from theano.ifelse import ifelse
+from theano.tests.unittest_tools import SkipTest
 
 
 class Test_profiling(unittest.TestCase):
@@ -103,6 +104,53 @@ class Test_profiling(unittest.TestCase):
             theano.config.profile = config1
             theano.config.profile_memory = config2
 
+    def test_sampling(self):
+        x = T.dvector('x')
+        p = theano.ProfileStats(False, gpu_checks=False, sample_every=4)
+        p.ignore_first_call = False
+        f = theano.function([x], T.exp(x).sum(), profile=p, mode='FAST_RUN')
+        for i in range(10):
+            f(np.ones(3))
+        assert p.fct_callcount == 10
+        # The calls 0, 4 and 8 are sampled.
+        assert p.sampled_callcount == 3
+        assert all(c == 3 for c in p.apply_callcount.values())
+        buf = StringIO()
+        p.flush(buf)
+        assert "Thunks timed in 3 sampled calls" in buf.getvalue()
+        assert p.fct_callcount == 0 and p.sampled_callcount == 0
+        assert not p.apply_time
+
+    def test_track_allocations(self):
+        try:
+            import tracemalloc
+            tracemalloc.reset_peak
+        except (ImportError, AttributeError):
+            raise SkipTest("Need tracemalloc of Python 3.9")
+        config1 = theano.config.profile
+        config2 = theano.config.profile_memory
+        config3 = theano.config.profiling.track_allocations
+        try:
+            theano.config.profile = True
+            theano.config.profile_memory = True
+            theano.config.profiling.track_allocations = True
+
+            x = T.dvector('x')
+            p = theano.ProfileStats(False, gpu_checks=False)
+            f = theano.function([x], T.outer(x, x).sum(), profile=p,
+                                mode='FAST_RUN')
+            f(np.ones(100))
+            # The 100x100 matrix of float64 is allocated by a node.
+            assert max(p.node_alloc_peak.values()) >= 80000
+            assert p.traced_peak_memory >= 80000
+            buf = StringIO()
+            p.summary(buf)
+            assert "measured by tracemalloc" in buf.getvalue()
+        finally:
+            theano.config.profile = config1
+            theano.config.profile_memory = config2
+            theano.config.profiling.track_allocations = config3
+
 
 if __name__ == '__main__':
     unittest.main()
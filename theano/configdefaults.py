@@ -165,6 +165,14 @@ AddConfigVar(
     BoolParam(False),
     in_c_key=False)
 
+AddConfigVar(
+    'lazy_import',
+    "If True, 'import theano' does not import scan, sparse, d3viz, the "
+    "test tools and SciPy. They are imported when they are first used. "
+    "Except for SciPy, this needs Python 3.7 or later.",
+    BoolParam(False, allow_override=False),
+    in_c_key=False)
+
 
 class ContextsParam(ConfigParam):
     def __init__(self):
@@ -565,14 +573,15 @@ if rc == 0 and config.cxx != "":
     AddConfigVar('linker',
                  "Default linker used if the theano flags mode is Mode",
                  EnumStr('cvm', 'c|py', 'py', 'c', 'c|py_nogc',
-                         'vm', 'vm_nogc', 'cvm_nogc'),
+                         'vm', 'vm_nogc', 'cvm_nogc', 'vm_tiered',
+                         'vm_parallel', 'vm_arena'),
                  in_c_key=False)
 else:
     # g++ is not present or the user disabled it,
     # linker should default to python only.
     AddConfigVar('linker',
                  "Default linker used if the theano flags mode is Mode",
-                 EnumStr('vm', 'py', 'vm_nogc'),
+                 EnumStr('vm', 'py', 'vm_nogc', 'vm_parallel', 'vm_arena'),
                  in_c_key=False)
     if type(config).cxx.is_default:
         # If the user provided an empty value for cxx, do not warn.
@@ -598,7 +607,8 @@ AddConfigVar('allow_gc',
 AddConfigVar(
     'optimizer',
     "Default optimizer. If not None, will use this optimizer with the Mode",
-    EnumStr('o4', 'o3', 'o2', 'o1', 'unsafe', 'fast_run', 'fast_compile', 'merge', 'None'),
+    EnumStr('o4', 'o3', 'o2', 'o1', 'unsafe', 'fast_run', 'fast_compile', 'merge',
+            'time_budget', 'None'),
     in_c_key=False)
 
 AddConfigVar('optimizer_verbose',
@@ -999,14 +1009,28 @@ AddConfigVar(
 
 AddConfigVar(
     'cache_optimizations',
-    "WARNING: work in progress, does not work yet. "
-    "Specify if the optimization cache should be used. This cache will "
-    "any optimized graph and its optimization. Actually slow downs a lot "
-    "the first optimization, and could possibly still contains some bugs. "
-    "Use at your own risks.",
+    "If True, the optimized graphs are saved in the compilation "
+    "directory, and the optimizer is skipped when the same graph is "
+    "compiled again with the same optimizer and Theano flags.",
     BoolParam(False),
     in_c_key=False)
 
+AddConfigVar(
+    'memoize_functions',
+    "If True, theano.function reuses the optimized graph of the functions "
+    "already compiled in this process from an identical graph, with the "
+    "same mode and Theano flags, instead of optimizing it again.",
+    BoolParam(False),
+    in_c_key=False)
+
+AddConfigVar(
+    'cache_optimizations_max_size',
+    "Maximum size, in MB, of the cache of optimized graphs. When it is "
+    "exceeded, the least recently used graphs are deleted. 0 means no "
+    "limit.",
+    IntParam(1024, lambda i: i >= 0),
+    in_c_key=False)
+
 
 def good_seed_param(seed):
     if seed == "random":
@@ -1133,6 +1157,12 @@ AddConfigVar('profiling.time_thunks',
              BoolParam(True),
              in_c_key=False)
 
+AddConfigVar('profiling.sample_every',
+             """When profiling, time the thunks of only one call out of
+             this number, to lower the overhead of the profiler""",
+             IntParam(1, lambda i: i > 0),
+             in_c_key=False)
+
 AddConfigVar('profiling.n_apply',
              "Number of Apply instances to print by default",
              IntParam(20, lambda i: i > 0),
@@ -1154,6 +1184,12 @@ AddConfigVar('profiling.min_memory_size',
              IntParam(1024, lambda i: i >= 0),
              in_c_key=False)
 
+AddConfigVar('profiling.track_allocations',
+             """For the memory profile, measure the memory allocated by
+             each Apply node with tracemalloc""",
+             BoolParam(False),
+             in_c_key=False)
+
 AddConfigVar('profiling.min_peak_memory',
              """The min peak memory usage of the order""",
              BoolParam(False),
@@ -1180,6 +1216,14 @@ AddConfigVar('profiling.ignore_first_call',
              BoolParam(False),
              in_c_key=False)
 
+AddConfigVar('profiling.compile_trace',
+             """
+             If not empty, write a trace of the compilation of the Theano
+             functions in this file, in the Chrome trace event format.
+             """,
+             StrParam(''),
+             in_c_key=False)
+
 AddConfigVar('optdb.position_cutoff',
              'Where to stop eariler during optimization. It represent the'
              ' position of the optimizer where to stop.',
@@ -1191,6 +1235,20 @@ AddConfigVar('optdb.max_use_ratio',
              FloatParam(8),
              in_c_key=False)
 
+AddConfigVar('optdb.worklist',
+             "If True, the EquilibriumOptimizers of the optimizer database "
+             "only visit again the nodes that changed after their first pass, "
+             "and check the fixed point with a last full pass.",
+             BoolParam(False),
+             in_c_key=False)
+
+AddConfigVar('optdb.time_budget',
+             "Time in seconds spent on the optimization of a graph by the "
+             "time_budget optimizer, after which only the fast_compile "
+             "optimizations are applied.",
+             FloatParam(1.0, lambda x: x >= 0, allow_override=False),
+             in_c_key=False)
+
 AddConfigVar('gcc.cxxflags',
              "Extra compiler flags for gcc",
              StrParam(""),
@@ -1237,6 +1295,21 @@ AddConfigVar('cmodule.debug',
              BoolParam(False),
              in_c_key=True)
 
+AddConfigVar('cmodule.index',
+             "If True, the C module cache is looked up through an index file "
+             "of the compilation directory, and a module's key file is only "
+             "loaded when it is needed, instead of loading all of them at "
+             "startup. The index is rebuilt when it is missing or corrupt.",
+             BoolParam(False),
+             in_c_key=False)
+
+AddConfigVar('cmodule.parallel_compile',
+             "Number of C modules compiled concurrently when linking a "
+             "function. With 1, they are compiled one after the other. "
+             "With 0, use one compilation job per CPU.",
+             IntParam(1, lambda i: i >= 0),
+             in_c_key=False)
+
 
 def default_blas_ldflags():
     global numpy
@@ -1527,6 +1600,12 @@ AddConfigVar('vm.lazy',
              ConfigParam('None', filter_vm_lazy),
              in_c_key=False)
 
+AddConfigVar('vm.parallel_threads',
+             "Number of threads used by the vm_parallel linker to run "
+             "independent nodes concurrently. 0 means one per CPU.",
+             IntParam(0, lambda i: i >= 0),
+             in_c_key=False)
+
 AddConfigVar(
     'warn.identify_1pexp_bug',
     'Warn if Theano versions prior to 7987b51 (2011-12-18) could have '
@@ -1624,6 +1703,13 @@ period for running processes.""",
                       allow_override=False),
              in_c_key=False)
 
+AddConfigVar('compile.lock_granularity',
+             "global: a single lock on the compilation directory serializes "
+             "all the processes that compile C code. module: processes only "
+             "wait on each other when they compile the same module.",
+             EnumStr('global', 'module'),
+             in_c_key=False)
+
 
 try:
     p_out = output_subprocess_Popen([config.cxx, '-dumpversion'])
@@ -114,6 +114,10 @@ typedef struct {
     int do_timing;
     int need_update_inputs;
     int position_of_error; // -1 for no error, otw the index into `thunks` that failed.
+
+    PyObject * input_storage; // list of cells filled by call_inputs.
+    PyObject * post_call_clear; // list of cells cleared at the end of call_inputs.
+    int unpack_single; // 1 if call_inputs returns its only output directly.
 } CLazyLinker;
 
 
@@ -173,6 +177,8 @@ CLazyLinker_dealloc(PyObject* _self)
   Py_XDECREF(self->call_times);
   Py_XDECREF(self->call_counts);
   Py_XDECREF(self->pre_call_clear);
+  Py_XDECREF(self->input_storage);
+  Py_XDECREF(self->post_call_clear);
   Py_TYPE(self)->tp_free((PyObject*)self);
 }
 static PyObject *
@@ -222,6 +228,10 @@ CLazyLinker_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
 
       self->need_update_inputs = 0;
       self->position_of_error = -1;
+
+      self->input_storage = NULL;
+      self->post_call_clear = NULL;
+      self->unpack_single = 0;
     }
     return (PyObject *)self;
 }
@@ -784,6 +794,9 @@ int lazy_rec_eval(CLazyLinker * self, Py_ssize_t var_idx, PyObject*one, PyObject
   return err;
 }
 
+static PyObject *
+CLazyLinker_run(CLazyLinker * self, int n_calls, const char * output_subset);
+
 static PyObject *
 CLazyLinker_call(PyObject *_self, PyObject *args, PyObject *kwds)
 {
@@ -829,6 +842,28 @@ CLazyLinker_call(PyObject *_self, PyObject *args, PyObject *kwds)
             }
         }
     }
+  if (err)
+    {
+      free(output_subset);
+      return NULL;
+    }
+  PyObject * rval = CLazyLinker_run(self, n_calls, output_subset);
+  free(output_subset);
+  return rval;
+}
+
+/**
+  Run the program `n_calls` times and return the list of the values of
+  the outputs, or NULL with an exception set.
+
+  output_subset is NULL to compute all the outputs, otherwise it has one
+  flag per output, and only the flagged ones (and the updates) are
+  computed.
+  */
+static PyObject *
+CLazyLinker_run(CLazyLinker * self, int n_calls, const char * output_subset)
+{
+  int err = 0;
 
   self->position_of_error = -1;
   // create constants used to fill the var_compute_cells
@@ -938,9 +973,6 @@ CLazyLinker_call(PyObject *_self, PyObject *args, PyObject *kwds)
           PyList_SetItem(self->var_value_cells[i], 0, Py_None);
         }
     }
-  if (output_subset != NULL)
-    free(output_subset);
-
   Py_DECREF(one);
   Py_DECREF(zero);
   if (err)
@@ -951,14 +983,79 @@ CLazyLinker_call(PyObject *_self, PyObject *args, PyObject *kwds)
   return rval;
 }
 
-#if 0
-static PyMethodDef CLazyLinker_methods[] = {
+/**
+  Fast path of Function.__call__ for trusted positional inputs.
+
+  Put the items of the tuple `inputs` in the cells of `input_storage`, run
+  the program once, clear the cells of `post_call_clear` and return the
+  outputs that are not updates, all without going back to Python.
+  */
+static PyObject *
+CLazyLinker_call_inputs(PyObject *_self, PyObject *inputs)
+{
+  CLazyLinker * self = (CLazyLinker*)_self;
+  self->position_of_error = -1;
+  if (! PyTuple_Check(inputs))
     {
-      //"name", (PyCFunction)CLazyLinker_accept, METH_VARARGS, "Return the name, combining the first and last name"
-    },
+      PyErr_SetString(PyExc_TypeError, "call_inputs expects a tuple");
+      return NULL;
+    }
+  if (self->input_storage == NULL || ! PyList_Check(self->input_storage) ||
+      self->post_call_clear == NULL || ! PyList_Check(self->post_call_clear))
+    {
+      PyErr_SetString(PyExc_RuntimeError,
+                      "input_storage and post_call_clear must be lists");
+      return NULL;
+    }
+  Py_ssize_t n_inputs = PyList_GET_SIZE(self->input_storage);
+  if (PyTuple_GET_SIZE(inputs) != n_inputs)
+    {
+      PyErr_Format(PyExc_TypeError,
+                   "Expected %d inputs, got %d.",
+                   (int)n_inputs, (int)PyTuple_GET_SIZE(inputs));
+      return NULL;
+    }
+  for (Py_ssize_t i = 0; i < n_inputs; ++i)
+    {
+      PyObject * item = PyTuple_GET_ITEM(inputs, i);
+      Py_INCREF(item);
+      PyList_SetItem(PyList_GET_ITEM(self->input_storage, i), 0, item);
+    }
+
+  PyObject * rval = CLazyLinker_run(self, 1, NULL);
+  if (rval == NULL)
+    return NULL;
+
+  Py_ssize_t n_post_call_clear = PyList_GET_SIZE(self->post_call_clear);
+  for (Py_ssize_t i = 0; i < n_post_call_clear; ++i)
+    {
+      Py_INCREF(Py_None);
+      PyList_SetItem(PyList_GET_ITEM(self->post_call_clear, i), 0, Py_None);
+    }
+
+  // The values of the updates are at the end of rval.
+  Py_ssize_t n_returned = self->n_output_vars - self->n_updates;
+  if (self->unpack_single && n_returned == 1)
+    {
+      PyObject * item = PyList_GET_ITEM(rval, 0);
+      Py_INCREF(item);
+      Py_DECREF(rval);
+      return item;
+    }
+  if (self->n_updates)
+    {
+      PyObject * outputs = PyList_GetSlice(rval, 0, n_returned);
+      Py_DECREF(rval);
+      return outputs;
+    }
+  return rval;
+}
+
+static PyMethodDef CLazyLinker_methods[] = {
+    {"call_inputs", (PyCFunction)CLazyLinker_call_inputs, METH_O,
+     "Run the program on a tuple of trusted inputs and return its outputs"},
     {NULL}  /* Sentinel */
 };
-#endif
 
 
 static PyObject *
@@ -1003,6 +1100,12 @@ static PyMemberDef CLazyLinker_members[] = {
      (char*)"bool: nonzero means call will time thunks"},
     {(char*)"need_update_inputs", T_INT, offsetof(CLazyLinker, need_update_inputs), 0,
      (char*)"bool: nonzero means Function.__call__ must implement update mechanism"},
+    {(char*)"input_storage", T_OBJECT, offsetof(CLazyLinker, input_storage), 0,
+     (char*)"list of cells filled by call_inputs"},
+    {(char*)"post_call_clear", T_OBJECT, offsetof(CLazyLinker, post_call_clear), 0,
+     (char*)"list of cells cleared at the end of call_inputs"},
+    {(char*)"unpack_single", T_INT, offsetof(CLazyLinker, unpack_single), 0,
+     (char*)"bool: nonzero means call_inputs returns its only output directly"},
     {NULL}  /* Sentinel */
 };
 
@@ -1039,7 +1142,7 @@ static PyTypeObject lazylinker_ext_CLazyLinkerType = {
     0,                         /* tp_weaklistoffset */
     0,                         /* tp_iter */
     0,                         /* tp_iternext */
-    0,//CLazyLinker_methods,       /* tp_methods */
+    CLazyLinker_methods,       /* tp_methods */
     CLazyLinker_members,       /* tp_members */
     CLazyLinker_getset,        /* tp_getset */
     0,                         /* tp_base */
@@ -1054,7 +1157,7 @@ static PyTypeObject lazylinker_ext_CLazyLinkerType = {
 
 static PyObject * get_version(PyObject *dummy, PyObject *args)
 {
-  PyObject *result = PyFloat_FromDouble(0.211);
+  PyObject *result = PyFloat_FromDouble(0.212);
   return result;
 }
 
@@ -6,9 +6,14 @@ Defines Linkers that deal with C implementations.
 from __future__ import absolute_import, print_function, division
 
 # Python imports
+import contextlib
 from copy import copy
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 import os
+import shutil
 import sys
+import threading
 import logging
 
 import numpy as np
@@ -17,7 +22,7 @@ import theano
 from theano import config
 from theano.compat import PY3
 from theano.compat import izip
-from six import string_types, reraise
+from six import get_unbound_function, string_types, reraise
 from six.moves import StringIO, xrange
 
 # gof imports
@@ -25,7 +30,8 @@ from theano.gof import graph
 from theano.gof import link
 from theano.gof import utils
 from theano.gof import cmodule
-from theano.gof.compilelock import get_lock, release_lock
+from theano.gof import compiletrace
+from theano.gof.compilelock import get_lock, release_lock, module_lock_ctx
 from theano.gof.callcache import CallCache
 
 
@@ -59,6 +65,48 @@ def get_persistent_module_cache():
     return _persistent_module_cache
 
 
+# Keys of the modules of the nodes being linked, known from a previous
+# process. See cmodule_key_hints.
+_cmodule_key_hints = threading.local()
+
+
+@contextlib.contextmanager
+def cmodule_key_hints(keys):
+    """
+    Make the C thunks built in this context reuse already computed keys.
+
+    This is used when unpickling a Theano function, to load the modules of
+    its nodes from the cache without computing their keys again.
+
+    Parameters
+    ----------
+    keys : dict
+        Maps Apply nodes to the key of the module of their C thunk, as
+        recorded in the `cmodule_key` attribute of the thunks. The keys
+        must have been computed for the same nodes, with the same version of
+        Theano. Their compilation parameters are checked by
+        `CLinker.checked_cmodule_key`.
+
+    """
+    previous = getattr(_cmodule_key_hints, 'keys', None)
+    _cmodule_key_hints.keys = keys
+    try:
+        yield
+    finally:
+        _cmodule_key_hints.keys = previous
+
+
+def get_cmodule_key_hint(node):
+    """
+    Return the key given to `cmodule_key_hints` for `node`, or None.
+
+    """
+    keys = getattr(_cmodule_key_hints, 'keys', None)
+    if not keys:
+        return None
+    return keys.get(node)
+
+
 class CodeBlock:
     """
     Represents a computation unit composed of declare, behavior, and cleanup.
@@ -559,6 +607,12 @@ class CLinker(link.Linker):
 
     """
 
+    # Key computed for the same fgraph by another process, to use instead of
+    # calling cmodule_key() if it is still valid. See checked_cmodule_key.
+    cmodule_key_hint = None
+    # Key of the module used by the last thunk made by this linker.
+    module_key = None
+
     def __init__(self, schedule=None):
         self.fgraph = None
         if schedule:
@@ -848,6 +902,21 @@ class CLinker(link.Linker):
             behavior = ("// Op class " + node.op.__class__.__name__ + "\n" +
                         behavior)
 
+            # The computation that the op can do without the GIL. It
+            # cannot fail, so it is not given the failure code.
+            sub_nogil = dict(sub)
+            del sub_nogil['fail']
+            try:
+                behavior_nogil = op.c_code_nogil(node, name, isyms, osyms,
+                                                 sub_nogil)
+            except utils.MethodNotDefined:
+                pass
+            else:
+                assert isinstance(behavior_nogil, string_types), (
+                    str(node.op) + " didn't return a string for c_code_nogil")
+                behavior += ("\nPy_BEGIN_ALLOW_THREADS\n%s\n"
+                             "Py_END_ALLOW_THREADS\n" % behavior_nogil)
+
             try:
                 cleanup = op.c_code_cleanup(node, name, isyms, osyms, sub)
             except utils.MethodNotDefined:
@@ -1300,6 +1369,75 @@ class CLinker(link.Linker):
                                  c_compiler=self.c_compiler(),
                                  )
 
+    def cmodule_key_header(self, compile_args, libraries, header_dirs,
+                           insert_config_hash, c_compiler):
+        """
+        Return the compilation parameters that start the signature of the
+        keys, as a list.
+
+        """
+        sig = ['CLinker.cmodule_key']
+        if compile_args is not None:
+            # We must sort it as the order from a set is not guaranteed.
+            # In  particular, 2 sets with the same content can give different
+            # order depending on the order you put data in it.
+            # Sets are used to remove duplicate elements.
+            args = sorted(compile_args)
+            args = tuple(args)
+            sig.append(args)
+        if libraries is not None:
+            # see comments for compile_args
+            args = sorted(libraries)
+            args = tuple(args)
+            sig.append(args)
+
+        if header_dirs is not None:
+            args = sorted(header_dirs)
+            args = tuple(args)
+            sig.append(args)
+
+        # We must always add the numpy ABI version here as
+        # DynamicModule always add the include <numpy/arrayobject.h>
+        sig.append('NPY_ABI_VERSION=0x%X' %
+                   np.core.multiarray._get_ndarray_c_version())
+        if c_compiler:
+            sig.append('c_compiler_str=' + c_compiler.version_str())
+
+        # IMPORTANT: The 'md5' prefix is used to isolate the compilation
+        # parameters from the rest of the key. If you want to add more key
+        # elements, they should be before this md5 hash if and only if they
+        # can lead to a different compiled file with the same source code.
+
+        # NOTE: config md5 is not using md5 hash, but sha256 instead. Function
+        # string instances of md5 will be updated at a later release.
+        if insert_config_hash:
+            sig.append('md5:' + theano.configparser.get_config_hash())
+        else:
+            sig.append('md5: <omitted>')
+        return sig
+
+    def checked_cmodule_key(self):
+        """
+        Return `cmodule_key_hint` if it can be used, else `cmodule_key()`.
+
+        The hint is only used if it was computed with the current compilation
+        parameters: compiler, compilation flags, libraries, numpy ABI and
+        config hash. The part of the key that describes the nodes is not
+        checked, it is up to the caller of `cmodule_key_hints` to only give
+        keys computed for the same nodes.
+
+        """
+        hint = self.cmodule_key_hint
+        if hint is not None:
+            header = self.cmodule_key_header(
+                self.compile_args(), self.libraries(), self.header_dirs(),
+                True, self.c_compiler())
+            if tuple(hint[1][:len(header)]) == tuple(header):
+                return hint
+            _logger.debug('Ignoring cmodule key hint computed with other '
+                          'compilation parameters')
+        return self.cmodule_key()
+
     def cmodule_key_variables(self, inputs, outputs, no_recycling,
                               compile_args=None, libraries=None,
                               header_dirs=None, insert_config_hash=True,
@@ -1352,45 +1490,9 @@ class CLinker(link.Linker):
         op_pos = {}  # Apply -> topological position
 
         # First we put the header, compile_args, library names and config hash
-        # into the signature.
-        sig = ['CLinker.cmodule_key']  # will be cast to tuple on return
-        if compile_args is not None:
-            # We must sort it as the order from a set is not guaranteed.
-            # In  particular, 2 sets with the same content can give different
-            # order depending on the order you put data in it.
-            # Sets are used to remove duplicate elements.
-            args = sorted(compile_args)
-            args = tuple(args)
-            sig.append(args)
-        if libraries is not None:
-            # see comments for compile_args
-            args = sorted(libraries)
-            args = tuple(args)
-            sig.append(args)
-
-        if header_dirs is not None:
-            args = sorted(header_dirs)
-            args = tuple(args)
-            sig.append(args)
-
-        # We must always add the numpy ABI version here as
-        # DynamicModule always add the include <numpy/arrayobject.h>
-        sig.append('NPY_ABI_VERSION=0x%X' %
-                   np.core.multiarray._get_ndarray_c_version())
-        if c_compiler:
-            sig.append('c_compiler_str=' + c_compiler.version_str())
-
-        # IMPORTANT: The 'md5' prefix is used to isolate the compilation
-        # parameters from the rest of the key. If you want to add more key
-        # elements, they should be before this md5 hash if and only if they
-        # can lead to a different compiled file with the same source code.
-
-        # NOTE: config md5 is not using md5 hash, but sha256 instead. Function
-        # string instances of md5 will be updated at a later release.
-        if insert_config_hash:
-            sig.append('md5:' + theano.configparser.get_config_hash())
-        else:
-            sig.append('md5: <omitted>')
+        # into the signature. It will be cast to tuple on return.
+        sig = self.cmodule_key_header(compile_args, libraries, header_dirs,
+                                      insert_config_hash, c_compiler)
 
         error_on_play = [False]
 
@@ -1504,30 +1606,46 @@ class CLinker(link.Linker):
         """
         if location is None:
             location = cmodule.dlimport_workdir(config.compiledir)
-        mod = self.get_dynamic_module()
-        c_compiler = self.c_compiler()
-        libs = self.libraries()
-        preargs = self.compile_args()
         # We want to compute the code without the lock
-        src_code = mod.code()
-        get_lock()
+        c_compiler, compile_kwargs = self.compile_cmodule_args(location)
+        # With module locks, `location` is private to this process and
+        # module_from_key already holds the lock on this module.
+        global_lock = config.compile.lock_granularity != 'module'
+        if global_lock:
+            get_lock()
         try:
             _logger.debug("LOCATION %s", str(location))
-            module = c_compiler.compile_str(
-                module_name=mod.code_hash,
-                src_code=src_code,
-                location=location,
-                include_dirs=self.header_dirs(),
-                lib_dirs=self.lib_dirs(),
-                libs=libs,
-                preargs=preargs)
+            module = c_compiler.compile_str(**compile_kwargs)
         except Exception as e:
             e.args += (str(self.fgraph),)
             raise
         finally:
-            release_lock()
+            if global_lock:
+                release_lock()
         return module
 
+    def compile_cmodule_args(self, location):
+        """
+        Return the compiler to use for this linker's module, and the
+        keyword arguments of the `compile_str` call that builds it in
+        `location`.
+
+        All the C code is generated here, so that the compilation itself
+        does not need to call any Op or Type method.
+
+        """
+        mod = self.get_dynamic_module()
+        c_compiler = self.c_compiler()
+        compile_kwargs = dict(
+            module_name=mod.code_hash,
+            src_code=mod.code(),
+            location=location,
+            include_dirs=self.header_dirs(),
+            lib_dirs=self.lib_dirs(),
+            libs=self.libraries(),
+            preargs=self.compile_args())
+        return c_compiler, compile_kwargs
+
     def get_dynamic_module(self):
         """
         Return a cmodule.DynamicModule instance full of the code for our fgraph.
@@ -1537,7 +1655,11 @@ class CLinker(link.Linker):
 
         """
         if not hasattr(self, '_mod'):
-            self.code_gen()
+            with compiletrace.span('code_gen', 'cgen'):
+                if compiletrace.is_tracing():
+                    compiletrace.annotate(ops=', '.join(
+                        str(node.op) for node in self.node_order))
+                self.code_gen()
 
             mod = cmodule.DynamicModule()
 
@@ -1606,9 +1728,10 @@ class CLinker(link.Linker):
         type, value and traceback of the exception in error_storage.
         """
         try:
-            key = self.cmodule_key()
+            key = self.checked_cmodule_key()
         except KeyError:
             key = None
+        self.module_key = key
         if key is None:
             # If we can't get a key, then forget the cache mechanism.
             module = self.compile_cmodule()
@@ -1735,6 +1858,204 @@ class _CThunk(object):
             reraise(exc_type, exc_value, exc_trace)
 
 
+def _uses_default_c_thunk(op):
+    """
+    Return True if `op` builds its C thunk with `Op.make_c_thunk`, i.e. with
+    a CLinker over its node alone.
+
+    """
+    op_class = theano.gof.op.Op
+    if not isinstance(op, op_class):
+        return False
+    for name in ('make_thunk', 'make_c_thunk'):
+        if (get_unbound_function(getattr(type(op), name)) is not
+                get_unbound_function(getattr(op_class, name))):
+            return False
+    return True
+
+
+def _node_clinker(node, storage_map, compute_map, no_recycling):
+    """
+    Return the CLinker that `Op.make_c_thunk` uses for `node`, or None if
+    `node` does not use the default C thunk.
+
+    """
+    if not _uses_default_c_thunk(node.op):
+        return None
+    # float16 gets special treatment, see Op.make_c_thunk.
+    if (not getattr(node.op, '_f16_ok', False) and
+            any(getattr(v.type, 'dtype', '') == 'float16'
+                for v in node.inputs + node.outputs)):
+        return None
+    node.op.prepare_node(node, storage_map=storage_map,
+                         compute_map=compute_map, impl='c')
+    e = theano.gof.fg.FunctionGraph(node.inputs, node.outputs)
+    e_no_recycling = [new_o
+                      for (new_o, old_o) in zip(e.outputs, node.outputs)
+                      if old_o in no_recycling]
+    cl = CLinker().accept(e, no_recycling=e_no_recycling)
+    cl.cmodule_key_hint = get_cmodule_key_hint(node)
+    return cl
+
+
+def needs_compilation(node, storage_map, compute_map, no_recycling=()):
+    """
+    Return True if `node` uses the default C thunk of `Op.make_c_thunk`, and
+    its module is not in the ModuleCache yet.
+
+    """
+    cl = _node_clinker(node, storage_map, compute_map, no_recycling)
+    if cl is None:
+        return False
+    try:
+        key = cl.checked_cmodule_key()
+    except KeyError:
+        # The module will be compiled without using the cache.
+        return True
+    except (NotImplementedError, utils.MethodNotDefined):
+        return False
+    if key is None:
+        return True
+    module_cache = get_module_cache()
+    with module_cache.lock:
+        return module_cache._get_from_key(key) is None
+
+
+def _compile_job(job):
+    # Executed by the worker threads of precompile_cmodules: the actual
+    # work is done by the compiler subprocess, which does not hold the GIL.
+    c_compiler, compile_kwargs = job
+    try:
+        c_compiler.compile_str(py_module=False, **compile_kwargs)
+    except Exception as e:
+        return e
+    return None
+
+
+class _PrebuiltCModule(object):
+    """
+    Linker-like object giving to `ModuleCache.module_from_key` a module that
+    `precompile_cmodules` already built in `build_location`.
+
+    Its `compile_cmodule` only moves the built files into the location
+    chosen by the cache and imports the module.
+
+    """
+
+    def __init__(self, linker, build_location):
+        self.linker = linker
+        self.build_location = build_location
+
+    def get_src_code(self):
+        return self.linker.get_src_code()
+
+    def compile_cmodule(self, location):
+        for filename in os.listdir(self.build_location):
+            shutil.move(os.path.join(self.build_location, filename),
+                        location)
+        open(os.path.join(location, '__init__.py'), 'w').close()
+        lib_filename = os.path.join(
+            location, '%s.%s' % (self.linker.get_dynamic_module().code_hash,
+                                 cmodule.get_lib_extension()))
+        return cmodule.dlimport(lib_filename)
+
+
+def precompile_cmodules(nodes, storage_map, compute_map, no_recycling=(),
+                        n_jobs=None):
+    """
+    Compile concurrently the C modules of `nodes` missing from the cache.
+
+    The C code of all the nodes is generated first. Then the modules that
+    are not already in the ModuleCache are compiled by `n_jobs` concurrent
+    compiler processes, and registered in the cache through
+    `ModuleCache.module_from_key`. The thunks built afterwards by
+    `Op.make_thunk` only have to load them.
+
+    Nodes without C code are skipped, as well as modules that fail to
+    compile: the sequential path will fall back on `perform` or report
+    the compilation error as usual.
+
+    Parameters
+    ----------
+    nodes
+        Apply nodes, usually the schedule of the FunctionGraph being linked.
+    storage_map
+        Forwarded to `Op.prepare_node`.
+    compute_map
+        Forwarded to `Op.prepare_node`.
+    no_recycling
+        Variables for which it is forbidden to reuse memory. It is part of
+        the module key, so it must be what will be given to `make_thunk`.
+    n_jobs
+        Number of concurrent compilations. Defaults to the Theano flag
+        cmodule.parallel_compile, where 0 means one job per CPU.
+
+    """
+    if n_jobs is None:
+        n_jobs = config.cmodule.parallel_compile
+    if n_jobs == 0:
+        n_jobs = multiprocessing.cpu_count()
+    if n_jobs == 1 or not config.cxx:
+        return
+
+    module_cache = get_module_cache()
+    to_compile = []
+    module_hashes = set()
+    for node in nodes:
+        cl = _node_clinker(node, storage_map, compute_map, no_recycling)
+        if cl is None:
+            continue
+        try:
+            key = cl.checked_cmodule_key()
+            with module_cache.lock:
+                if key in module_cache.entry_from_key:
+                    continue
+            module_hash = cmodule.get_module_hash(cl.get_src_code(), key)
+        except (KeyError, NotImplementedError, utils.MethodNotDefined):
+            continue
+        # Identical modules only need to be compiled once, the other keys
+        # will be associated to it by module_from_key.
+        if module_hash in module_hashes:
+            continue
+        with module_cache.lock:
+            if module_hash in module_cache.module_hash_to_key_data:
+                continue
+        module_hashes.add(module_hash)
+        to_compile.append((key, cl))
+
+    if len(to_compile) < 2:
+        return
+
+    _logger.debug('Compiling %i modules with %i jobs',
+                  len(to_compile), n_jobs)
+    # We hold the module locks during the whole compilation, as
+    # module_from_key does, so that no other process cleans up the build
+    # directories. module_cache.lock is not held, so that the other threads
+    # of this process can use the cache meanwhile.
+    with module_lock_ctx(module_hashes):
+        jobs = []
+        for key, cl in to_compile:
+            location = cmodule.dlimport_workdir(config.compiledir)
+            jobs.append((key, cl, location, cl.compile_cmodule_args(location)))
+        pool = ThreadPool(min(n_jobs, len(jobs)))
+        try:
+            errors = pool.map(_compile_job, [job[3] for job in jobs])
+        finally:
+            pool.close()
+            pool.join()
+        for (key, cl, location, _), error in zip(jobs, errors):
+            try:
+                if error is None:
+                    module_cache.module_from_key(
+                        key=key, lnk=_PrebuiltCModule(cl, location))
+                else:
+                    _logger.debug('Parallel compilation failed, the module '
+                                  'will be compiled again: %s', error)
+            finally:
+                cmodule._rmtree(location, ignore_if_missing=True,
+                                msg='parallel compilation directory')
+
+
 class OpWiseCLinker(link.LocalLinker):
     """
     Uses CLinker on the individual Ops that comprise an fgraph and loops
@@ -1819,6 +2140,9 @@ class OpWiseCLinker(link.LocalLinker):
             for k in storage_map:
                 compute_map[k] = [k.owner is None]
 
+            precompile_cmodules(order, storage_map, compute_map,
+                                no_recycling)
+
             thunks = []
             for node in order:
                 # make_thunk will try by default C code, otherwise
@@ -5,6 +5,7 @@ Generate and compile C modules for Python.
 from __future__ import absolute_import, print_function, division
 
 import atexit
+from collections import OrderedDict
 import textwrap
 import six.moves.cPickle as pickle
 import logging
@@ -15,6 +16,7 @@ import stat
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import platform
 import distutils.sysconfig
@@ -34,6 +36,7 @@ from theano.misc.windows import (subprocess_Popen,
 
 # we will abuse the lockfile mechanism when reading and writing the registry
 from theano.gof import compilelock
+from theano.gof import compiletrace
 from theano.configdefaults import gcc_version_str, local_bitwidth
 
 importlib = None
@@ -520,15 +523,27 @@ class KeyData(object):
         pickle time (in which case a warning is also displayed).
 
         """
+        # We write to a temporary file that is then renamed, so that the
+        # processes reading the cache without holding the lock never see a
+        # partially written file.
+        tmp_pkl = '%s.%s.tmp' % (self.key_pkl, os.getpid())
         # Note that writing in binary mode is important under Windows.
         try:
-            with open(self.key_pkl, 'wb') as f:
+            with open(tmp_pkl, 'wb') as f:
                 pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
         except pickle.PicklingError:
             _logger.warning("Cache leak due to unpickle-able key data %s",
                             self.keys)
-            os.remove(self.key_pkl)
+            os.remove(tmp_pkl)
+            if os.path.exists(self.key_pkl):
+                os.remove(self.key_pkl)
             raise
+        try:
+            os.rename(tmp_pkl, self.key_pkl)
+        except OSError:
+            # Windows does not allow renaming over an existing file.
+            os.remove(self.key_pkl)
+            os.rename(tmp_pkl, self.key_pkl)
 
     def get_entry(self):
         """
@@ -573,6 +588,210 @@ class KeyData(object):
                     pass
 
 
+def get_key_digest(key):
+    """
+    Return a digest of a cache key that can be compared across processes.
+
+    Two equal keys normally have the same digest, but this is not guaranteed,
+    nor that two different keys have different digests: what is found
+    with it must be checked against the KeyData file.
+
+    """
+    try:
+        return hash_from_code(pickle.dumps(key,
+                                           protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return None
+
+
+class ModuleIndex(object):
+    """
+    Index of the versioned modules of a ModuleCache directory.
+
+    It lets ModuleCache find the directory of a module from a key or from a
+    module hash, without unpickling all the key.pkl files of the cache. It is
+    an append-only text file, each line of which maps a key digest (see
+    `get_key_digest`) to the hash and the directory of the module that has
+    this key. Entries may be stale, so what is found through the index must
+    be checked against the key.pkl file of the module.
+
+    The directories whose keys could not be read when the index was built,
+    e.g. because their key.pkl file refers to an Op whose module was not
+    imported yet, are listed with the `unindexed` digest and module hash, so
+    that `ModuleCache.refresh` reads them again.
+
+    Parameters
+    ----------
+    dirname
+        The cache directory.
+
+    """
+
+    filename = 'module_index.txt'
+    header = 'theano module index 1\n'
+    unindexed = '-'
+
+    def __init__(self, dirname):
+        self.path = os.path.join(dirname, self.filename)
+        self._reset()
+
+    def _reset(self):
+        self.entries = []
+        self._subdirs_from_digest = {}
+        self._subdirs_from_hash = {}
+        self._indexed_subdirs = set()
+        self._unindexed_subdirs = OrderedDict()
+        # Position and inode of the index file up to which it was read.
+        self._offset = 0
+        self._inode = None
+
+    def _add_entry(self, digest, module_hash, subdir):
+        self.entries.append((digest, module_hash, subdir))
+        if digest == self.unindexed:
+            self._unindexed_subdirs[subdir] = None
+            return
+        self._indexed_subdirs.add(subdir)
+        for mapping, k in ((self._subdirs_from_digest, digest),
+                           (self._subdirs_from_hash, module_hash)):
+            subdirs = mapping.setdefault(k, [])
+            if subdir not in subdirs:
+                subdirs.append(subdir)
+
+    def read(self):
+        """
+        Read the entries added to the index file since the last call.
+
+        Returns
+        -------
+        bool
+            False if the index file is missing or corrupt, and needs to be
+            rebuilt.
+
+        """
+        try:
+            with open(self.path) as f:
+                inode = os.fstat(f.fileno()).st_ino
+                if inode != self._inode:
+                    # New file, probably rewritten by another process.
+                    self._offset = 0
+                    self._inode = inode
+                if self._offset == 0:
+                    if f.readline() != self.header:
+                        return False
+                    self._offset = f.tell()
+                else:
+                    f.seek(self._offset)
+                while True:
+                    line = f.readline()
+                    if not line.endswith('\n'):
+                        # End of file, or line being written by another
+                        # process: we will read it next time.
+                        break
+                    fields = line.split()
+                    if len(fields) != 3:
+                        return False
+                    self._add_entry(*fields)
+                    self._offset = f.tell()
+        except (IOError, OSError):
+            return False
+        return True
+
+    def add(self, key, module_hash, key_pkl):
+        """
+        Add to the index that `key` is a key of the module of hash
+        `module_hash` whose KeyData is stored in `key_pkl`.
+
+        Nothing is written if the index file does not exist yet: it will be
+        built from the cache directory.
+
+        """
+        digest = get_key_digest(key)
+        if digest is not None:
+            subdir = os.path.basename(os.path.dirname(key_pkl))
+            self.add_entries([(digest, module_hash, subdir)])
+
+    def add_entries(self, entries):
+        """
+        Append `entries`, a list of (key digest, module hash, directory name)
+        tuples, to the index file if it exists.
+
+        """
+        if not entries or not os.path.exists(self.path):
+            return
+        # A single small write in append mode, so that lines written by
+        # different processes are not interleaved.
+        with open(self.path, 'a') as f:
+            f.write(''.join('%s %s %s\n' % entry for entry in entries))
+        # Read them, with the lines appended by other processes, so that
+        # the next read() does not add them again.
+        self.read()
+
+    def write(self, entries):
+        """
+        Replace the content of the index file by `entries`, a list of
+        (key digest, module hash, directory name) tuples.
+
+        """
+        tmp_path = '%s.%s.tmp' % (self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(self.header)
+            for entry in entries:
+                if entry[0] is not None:
+                    f.write('%s %s %s\n' % entry)
+        try:
+            os.rename(tmp_path, self.path)
+        except OSError:
+            # Windows does not allow renaming over an existing file.
+            os.remove(self.path)
+            os.rename(tmp_path, self.path)
+        self._reset()
+        self.read()
+
+    def remove_subdirs(self, subdirs):
+        """
+        Rewrite the index without the entries of the directories `subdirs`.
+
+        """
+        subdirs = set(subdirs)
+        if subdirs:
+            self.read()
+            self.write(list(OrderedDict.fromkeys(
+                e for e in self.entries if e[2] not in subdirs)))
+
+    def subdirs(self):
+        return list(set(e[2] for e in self.entries))
+
+    def subdirs_from_digest(self, digest):
+        return self._subdirs_from_digest.get(digest, [])
+
+    def subdirs_from_hash(self, module_hash):
+        return self._subdirs_from_hash.get(module_hash, [])
+
+    def unindexed_subdirs(self):
+        """
+        Return the directories listed as unindexed that have no key in the
+        index yet.
+
+        """
+        return [subdir for subdir in self._unindexed_subdirs
+                if subdir not in self._indexed_subdirs]
+
+    @staticmethod
+    def key_data_entries(key_data, subdir):
+        """
+        Return the index entries of the versioned keys of `key_data`, whose
+        key.pkl file is in the directory `subdir`.
+
+        """
+        entries = []
+        for key in key_data.keys:
+            if key[0]:
+                digest = get_key_digest(key)
+                if digest is not None:
+                    entries.append((digest, key_data.module_hash, subdir))
+        return entries
+
+
 class ModuleCache(object):
     """
     Interface to the cache of dynamically compiled modules on disk.
@@ -671,6 +890,12 @@ class ModuleCache(object):
     """
     Set of all key.pkl files that have been loaded.
 
+    """
+    index = None
+    """
+    The ModuleIndex of the cache directory, if the Theano flag cmodule.index
+    is True.
+
     """
 
     def __init__(self, dirname, check_for_broken_eq=True, do_refresh=True):
@@ -683,6 +908,15 @@ class ModuleCache(object):
         self.check_for_broken_eq = check_for_broken_eq
         self.loaded_key_pkl = set()
         self.time_spent_in_check_key = 0
+        # Serializes the accesses of the threads of this process, e.g. the
+        # background compilation of the tiered VM_Linker, to the mappings
+        # of the cache. It is not held while compiling: the compilation lock
+        # protects the compilation directory from other processes.
+        self.lock = threading.RLock()
+        if config.cmodule.index:
+            self.index = ModuleIndex(dirname)
+        else:
+            self.index = None
 
         if do_refresh:
             self.refresh()
@@ -736,7 +970,20 @@ class ModuleCache(object):
         list
             A list of modules of age higher than age_thresh_use.
 
+        With the Theano flag cmodule.index, the cache directory is only
+        walked if its index is missing or corrupt, and the index is then
+        rebuilt. Otherwise, the index is read and the modules are loaded when
+        they are looked up. Modules older than age_thresh_use are then only
+        listed if age_thresh_use is provided.
+
         """
+        with self.lock:
+            return self._refresh(age_thresh_use, delete_if_problem, cleanup)
+
+    def _refresh(self, age_thresh_use, delete_if_problem, cleanup):
+        if self.index is not None and self.index.read():
+            return self._refresh_from_index(age_thresh_use)
+
         if age_thresh_use is None:
             age_thresh_use = self.age_thresh_use
         start_time = time.time()
@@ -744,6 +991,8 @@ class ModuleCache(object):
 
         to_delete = []
         to_delete_empty = []
+        # Directories whose key.pkl can not be unpickled yet.
+        unread_subdirs = []
 
         def rmtree(*args, **kwargs):
             if cleanup:
@@ -765,7 +1014,7 @@ class ModuleCache(object):
         files, root = None, None  # To make sure the "del" below works
         for subdirs_elem in subdirs:
             # Never clean/remove lock_dir
-            if subdirs_elem == 'lock_dir':
+            if subdirs_elem in ('lock_dir', 'module_locks'):
                 continue
             root = os.path.join(self.dirname, subdirs_elem)
             # Don't delete the gpuarray kernel cache
@@ -778,8 +1027,12 @@ class ModuleCache(object):
                 continue
             files = os.listdir(root)
             if not files:
-                rmtree_empty(root, ignore_nocleanup=True,
-                             msg="empty dir")
+                # With compile.lock_granularity=module, another process
+                # may have just created this directory to compile a module
+                # in it, without holding the lock on the whole cache.
+                if (time_now - os.stat(root).st_mtime) > config.compile.timeout:
+                    rmtree_empty(root, ignore_nocleanup=True,
+                                 msg="empty dir")
                 continue
             if 'delete.me' in files:
                 rmtree(root, ignore_nocleanup=True,
@@ -830,7 +1083,7 @@ class ModuleCache(object):
                             # different Theano-based scripts). They are not
                             # necessarily broken, but we cannot load them
                             # now. They will be loaded later if needed.
-                            pass
+                            unread_subdirs.append(subdirs_elem)
                         continue
 
                     if not isinstance(key_data, KeyData):
@@ -902,7 +1155,8 @@ class ModuleCache(object):
                             if delete_if_problem or age > self.age_thresh_del:
                                 rmtree(root, ignore_nocleanup=True,
                                        msg='duplicated module',
-                                       level=logging.DEBUG)
+                                       level=logging.DEBUG,
+                                       module_hash=mod_hash)
                             else:
                                 _logger.debug('Found duplicated module not '
                                               'old enough yet to be deleted '
@@ -910,37 +1164,10 @@ class ModuleCache(object):
                                               age, entry)
                         continue
 
-                    # Remember the map from a module's hash to the KeyData
-                    # object associated with it.
-                    self.module_hash_to_key_data[mod_hash] = key_data
-
-                    for key in key_data.keys:
-                        if key not in self.entry_from_key:
-                            self.entry_from_key[key] = entry
-                            # Assert that we have not already got this
-                            # entry somehow.
-                            assert entry not in self.module_from_name
-                            # Store safe part of versioned keys.
-                            if key[0]:
-                                self.similar_keys.setdefault(
-                                    get_safe_part(key),
-                                    []).append(key)
-                        else:
-                            dir1 = os.path.dirname(self.entry_from_key[key])
-                            dir2 = os.path.dirname(entry)
-                            _logger.warning(
-                                "The same cache key is associated to "
-                                "different modules (%s and %s). This "
-                                "is not supposed to happen! You may "
-                                "need to manually delete your cache "
-                                "directory to fix this.",
-                                dir1, dir2)
-                    # Clean up the name space to prevent bug.
-                    if key_data.keys:
-                        del key
-                    self.loaded_key_pkl.add(key_pkl)
+                    self._register_key_data(key_data, entry, key_pkl)
                 else:
                     too_old_to_use.append(entry)
+                    unread_subdirs.append(subdirs_elem)
 
             # If the compilation failed, no key.pkl is in that
             # directory, but a mod.* should be there.
@@ -949,7 +1176,164 @@ class ModuleCache(object):
         # Clean up the name space to prevent bug.
         del root, files, subdirs
 
-        # Remove entries that are not in the filesystem.
+        self._remove_gone_entries()
+
+        if to_delete or to_delete_empty:
+            with compilelock.lock_ctx():
+                for a, kw in to_delete:
+                    _rmtree_unless_locked(*a, **kw)
+                for a, kw in to_delete_empty:
+                    files = os.listdir(a[0])
+                    if not files:
+                        _rmtree(*a, **kw)
+
+        if self.index is not None:
+            self.rebuild_index(unread_subdirs)
+
+        _logger.debug('Time needed to refresh cache: %s',
+                      (time.time() - start_time))
+
+        return too_old_to_use
+
+    def _refresh_from_index(self, age_thresh_use):
+        """
+        Implementation of `refresh` when the index can be used.
+
+        """
+        self._remove_gone_entries()
+        unindexed = self.index.unindexed_subdirs()
+        if unindexed:
+            # Their key.pkl may refer to Ops that are now imported, or they
+            # may be young enough for the current age_thresh_use.
+            self.index.add_entries([
+                entry for subdir, key_data in self._load_from_index(unindexed)
+                for entry in ModuleIndex.key_data_entries(key_data, subdir)])
+        too_old_to_use = []
+        if age_thresh_use is not None:
+            time_now = time.time()
+            for subdir in self.index.subdirs():
+                root = os.path.join(self.dirname, subdir)
+                if os.path.join(root, 'key.pkl') in self.loaded_key_pkl:
+                    continue
+                entry = module_name_from_dir(root, err=False)
+                if (entry is not None and
+                        time_now - last_access_time(entry) >= age_thresh_use):
+                    too_old_to_use.append(entry)
+        return too_old_to_use
+
+    def _load_from_index(self, subdirs):
+        """
+        Load the KeyData of the cache directories `subdirs`, found through
+        the index.
+
+        Entries of the index may be stale, so directories that would not be
+        loaded by `refresh` are ignored.
+
+        Returns
+        -------
+        list
+            The (directory, KeyData) pairs that were loaded.
+
+        """
+        loaded = []
+        time_now = time.time()
+        for subdir in subdirs:
+            root = os.path.join(self.dirname, subdir)
+            key_pkl = os.path.join(root, 'key.pkl')
+            if key_pkl in self.loaded_key_pkl:
+                continue
+            try:
+                files = os.listdir(root)
+                if 'delete.me' in files:
+                    continue
+                entry = module_name_from_dir(root, files=files)
+                if (time_now - last_access_time(entry)) >= self.age_thresh_use:
+                    continue
+                with open(key_pkl, 'rb') as f:
+                    key_data = pickle.load(f)
+            except Exception:
+                # Directory deleted or broken, refresh will take care of it
+                # when the index is rebuilt.
+                _logger.debug('Skipping stale index entry %s', root)
+                continue
+            if not isinstance(key_data, KeyData):
+                continue
+            kd_entry = key_data.get_entry()
+            if kd_entry != entry:
+                if not is_same_entry(entry, kd_entry):
+                    continue
+                key_data.entry = entry
+                key_data.key_pkl = key_pkl
+            if (not key_data.keys or
+                    not all(key[0] for key in key_data.keys) or
+                    key_data.module_hash in self.module_hash_to_key_data):
+                continue
+            self._register_key_data(key_data, entry, key_pkl)
+            loaded.append((subdir, key_data))
+        return loaded
+
+    def rebuild_index(self, unread_subdirs=()):
+        """
+        Write the index of the cache from the modules loaded in memory.
+
+        This is done by `refresh` after walking the cache directory, when
+        the index is missing or corrupt.
+
+        Parameters
+        ----------
+        unread_subdirs
+            The cache directories whose key.pkl file was not loaded, because
+            it could not be unpickled or its module was too old to use. They
+            are listed as unindexed, to be read again by later refreshes.
+
+        """
+        entries = []
+        for module_hash, key_data in iteritems(self.module_hash_to_key_data):
+            subdir = os.path.basename(os.path.dirname(key_data.key_pkl))
+            entries.extend(ModuleIndex.key_data_entries(key_data, subdir))
+        entries.extend((ModuleIndex.unindexed, ModuleIndex.unindexed, subdir)
+                       for subdir in unread_subdirs)
+        with compilelock.lock_ctx():
+            self.index.write(entries)
+
+    def _register_key_data(self, key_data, entry, key_pkl):
+        """
+        Add to the in-memory mappings a KeyData object loaded from `key_pkl`.
+
+        """
+        mod_hash = key_data.module_hash
+        # Remember the map from a module's hash to the KeyData
+        # object associated with it.
+        self.module_hash_to_key_data[mod_hash] = key_data
+
+        for key in key_data.keys:
+            if key not in self.entry_from_key:
+                self.entry_from_key[key] = entry
+                # Assert that we have not already got this
+                # entry somehow.
+                assert entry not in self.module_from_name
+                # Store safe part of versioned keys.
+                if key[0]:
+                    self.similar_keys.setdefault(
+                        get_safe_part(key),
+                        []).append(key)
+            else:
+                dir1 = os.path.dirname(self.entry_from_key[key])
+                dir2 = os.path.dirname(entry)
+                _logger.warning(
+                    "The same cache key is associated to "
+                    "different modules (%s and %s). This "
+                    "is not supposed to happen! You may "
+                    "need to manually delete your cache "
+                    "directory to fix this.",
+                    dir1, dir2)
+        self.loaded_key_pkl.add(key_pkl)
+
+    def _remove_gone_entries(self):
+        """
+        Remove the entries whose module is no longer in the filesystem.
+
+        """
         items_copy = list(self.module_hash_to_key_data.items())
         for module_hash, key_data in items_copy:
             entry = key_data.get_entry()
@@ -992,20 +1376,6 @@ class ModuleCache(object):
                                         pkl_file_to_remove)
                     self.loaded_key_pkl.remove(pkl_file_to_remove)
 
-        if to_delete or to_delete_empty:
-            with compilelock.lock_ctx():
-                for a, kw in to_delete:
-                    _rmtree(*a, **kw)
-                for a, kw in to_delete_empty:
-                    files = os.listdir(a[0])
-                    if not files:
-                        _rmtree(*a, **kw)
-
-        _logger.debug('Time needed to refresh cache: %s',
-                      (time.time() - start_time))
-
-        return too_old_to_use
-
     def _get_from_key(self, key, key_data=None):
         """
         Returns a module if the passed-in key is found in the cache
@@ -1022,6 +1392,10 @@ class ModuleCache(object):
             except (TypeError, ValueError):
                 raise ValueError(
                     "Invalid key. key must have form (version, rest)", key)
+            if (key not in self.entry_from_key and key[0] and
+                    self.index is not None):
+                self._load_from_index(
+                    self.index.subdirs_from_digest(get_key_digest(key)))
             if key in self.entry_from_key:
                 name = self.entry_from_key[key]
         else:
@@ -1032,10 +1406,18 @@ class ModuleCache(object):
         return self._get_module(name)
 
     def _get_from_hash(self, module_hash, key, keep_lock=False):
-        if module_hash in self.module_hash_to_key_data:
-            key_data = self.module_hash_to_key_data[module_hash]
-            module = self._get_from_key(None, key_data)
-            with compilelock.lock_ctx(keep_lock=keep_lock):
+        with self.lock:
+            if (module_hash not in self.module_hash_to_key_data and
+                    self.index is not None):
+                self._load_from_index(
+                    self.index.subdirs_from_hash(module_hash))
+            key_data = self.module_hash_to_key_data.get(module_hash)
+            if key_data is not None:
+                module = self._get_from_key(None, key_data)
+        if key_data is not None:
+            # self.lock is not held here: a thread waiting for the module
+            # lock must not block the other threads of this process.
+            with compilelock.module_lock_ctx(module_hash, keep_lock=keep_lock):
                 try:
                     key_data.add_key(key, save_pkl=bool(key[0]))
                     key_broken = False
@@ -1048,7 +1430,11 @@ class ModuleCache(object):
                 if (key[0] and not key_broken and
                         self.check_for_broken_eq):
                     self.check_key(key, key_data.key_pkl)
-            self._update_mappings(key, key_data, module.__file__, check_in_keys=not key_broken)
+                if key[0] and not key_broken and self.index is not None:
+                    self.index.add(key, module_hash, key_data.key_pkl)
+            with self.lock:
+                self._update_mappings(key, key_data, module.__file__,
+                                      check_in_keys=not key_broken)
             return module
         else:
             return None
@@ -1100,6 +1486,8 @@ class ModuleCache(object):
                 key_data.save_pkl()
             if not key_broken and self.check_for_broken_eq:
                 self.check_key(key, key_pkl)
+            if not key_broken and self.index is not None:
+                self.index.add(key, module_hash, key_pkl)
             self.loaded_key_pkl.add(key_pkl)
         elif config.cmodule.warn_no_version:
             key_flat = flatten(key)
@@ -1129,9 +1517,18 @@ class ModuleCache(object):
             If True, the compilation lock will not be released if taken.
 
         """
+        with compiletrace.span('module_from_key', 'cmodule'):
+            return self._module_from_key(key, lnk, keep_lock)
+
+    def _module_from_key(self, key, lnk, keep_lock):
+        # self.lock is only held while the mappings of the cache are read or
+        # updated, not during the compilation, so that the other threads of
+        # this process can keep using the cache.
         # Is the module in the cache?
-        module = self._get_from_key(key)
+        with self.lock:
+            module = self._get_from_key(key)
         if module is not None:
+            compiletrace.annotate(found='key')
             return module
 
         src_code = lnk.get_src_code()
@@ -1139,9 +1536,10 @@ class ModuleCache(object):
         module_hash = get_module_hash(src_code, key)
         module = self._get_from_hash(module_hash, key, keep_lock=keep_lock)
         if module is not None:
+            compiletrace.annotate(found='hash')
             return module
 
-        with compilelock.lock_ctx(keep_lock=keep_lock):
+        with compilelock.module_lock_ctx(module_hash, keep_lock=keep_lock):
             # 1) Maybe somebody else compiled it for us while we
             #    where waiting for the lock. Try to load it again.
             # 2) If other repo that import Theano have Theano ops defined,
@@ -1158,12 +1556,15 @@ class ModuleCache(object):
             #    compilation fixes this problem. (we could do that only once)
             self.refresh(cleanup=False)
 
-            module = self._get_from_key(key)
+            with self.lock:
+                module = self._get_from_key(key)
             if module is not None:
+                compiletrace.annotate(found='key')
                 return module
 
             module = self._get_from_hash(module_hash, key)
             if module is not None:
+                compiletrace.annotate(found='hash')
                 return module
 
             hash_key = hash(key)
@@ -1174,8 +1575,6 @@ class ModuleCache(object):
                 module = lnk.compile_cmodule(location)
                 name = module.__file__
                 assert name.startswith(location)
-                assert name not in self.module_from_name
-                self.module_from_name[name] = module
                 nocleanup = True
             except OSError as e:
                 _logger.error(e)
@@ -1193,8 +1592,23 @@ class ModuleCache(object):
             # compilation.
             assert hash(key) == hash_key
 
-            key_data = self._add_to_cache(module, key, module_hash)
-            self.module_hash_to_key_data[module_hash] = key_data
+            with self.lock:
+                if (key in self.entry_from_key or
+                        module_hash in self.module_hash_to_key_data):
+                    # Another thread of this process compiled it meanwhile:
+                    # the compilation lock does not exclude the threads of
+                    # the process holding it.
+                    _rmtree(location, ignore_if_missing=True,
+                            msg='module compiled by another thread')
+                    module = None
+                else:
+                    assert name not in self.module_from_name
+                    self.module_from_name[name] = module
+                    key_data = self._add_to_cache(module, key, module_hash)
+                    self.module_hash_to_key_data[module_hash] = key_data
+            if module is None:
+                return self._module_from_key(key, lnk, keep_lock)
+            compiletrace.annotate(found='compiled', module_hash=module_hash)
 
         self.stats[2] += 1
         return module
@@ -1301,7 +1715,7 @@ class ModuleCache(object):
                 _logger.info("Clearing all modules.")
             age_thresh_use = age_thresh_del
         else:
-            age_thresh_use = None
+            age_thresh_use = self.age_thresh_use
 
         too_old_to_use = self.refresh(
             age_thresh_use=age_thresh_use,
@@ -1315,6 +1729,7 @@ class ModuleCache(object):
             # processes and get all module that are too old to use
             # (not loaded in self.entry_from_key).
 
+            deleted = []
             for entry in too_old_to_use:
                 # TODO: we are assuming that modules that haven't been
                 # accessed in over age_thresh_del are not currently in
@@ -1323,8 +1738,12 @@ class ModuleCache(object):
                 assert entry not in self.module_from_name
                 parent = os.path.dirname(entry)
                 assert parent.startswith(os.path.join(self.dirname, 'tmp'))
-                _rmtree(parent, msg='old cache directory', level=logging.INFO,
-                        ignore_nocleanup=True)
+                if _rmtree_unless_locked(parent, msg='old cache directory',
+                                         level=logging.INFO,
+                                         ignore_nocleanup=True):
+                    deleted.append(os.path.basename(parent))
+            if self.index is not None:
+                self.index.remove_subdirs(deleted)
 
     def clear(self, unversioned_min_age=None, clear_base_files=False,
               delete_if_problem=False):
@@ -1364,6 +1783,8 @@ class ModuleCache(object):
         next time we clear the cache.
 
         """
+        # These modules are always compiled under the lock on the whole
+        # cache, whatever the Theano flag compile.lock_granularity.
         with compilelock.lock_ctx():
             for base_dir in ('cutils_ext', 'lazylinker_ext', 'scan_perform'):
                 to_delete = os.path.join(self.dirname, base_dir + '.delete.me')
@@ -1554,6 +1975,58 @@ def _rmtree(parent, ignore_nocleanup=False, msg='', level=logging.DEBUG,
 _module_cache = None
 
 
+def _rmtree_unless_locked(parent, module_hash=None, **kwargs):
+    """
+    Call `_rmtree` on a module directory, unless the module is being compiled.
+
+    With the Theano flag compile.lock_granularity=module, the processes
+    compiling a module only hold the lock of that module, not the lock on the
+    whole cache. The directory is then only deleted while holding the lock of
+    its module, whose hash is read from its key.pkl file if `module_hash` is
+    not provided, and it is skipped if another process holds that lock. When
+    the module hash is unknown, e.g. because key.pkl can not be unpickled, the
+    directory is skipped if it was modified in the last compile.timeout
+    seconds.
+
+    Returns
+    -------
+    bool
+        False if the directory was skipped.
+
+    """
+    if config.compile.lock_granularity != 'module':
+        _rmtree(parent, **kwargs)
+        return True
+    if module_hash is None:
+        try:
+            with open(os.path.join(parent, 'key.pkl'), 'rb') as f:
+                key_data = pickle.load(f)
+            if isinstance(key_data, KeyData):
+                module_hash = key_data.module_hash
+        except Exception:
+            pass
+    if module_hash is None:
+        try:
+            mtime = max([os.stat(parent).st_mtime] +
+                        [os.stat(os.path.join(parent, f)).st_mtime
+                         for f in os.listdir(parent)])
+        except OSError:
+            # Deleted by another process meanwhile.
+            return False
+        if time.time() - mtime <= config.compile.timeout:
+            _logger.debug('Not deleting %s, it may be in use', parent)
+            return False
+        _rmtree(parent, **kwargs)
+        return True
+    with compilelock.try_module_lock_ctx(module_hash) as locked:
+        if not locked:
+            _logger.debug('Not deleting %s, its module is being compiled',
+                          parent)
+            return False
+        _rmtree(parent, **kwargs)
+        return True
+
+
 def get_module_cache(dirname, init_args=None):
     """
     Create a new module_cache with the (k, v) pairs in this dictionary
@@ -2305,7 +2778,9 @@ class GCC_compiler(Compiler):
             print(' '.join(cmd), file=sys.stderr)
 
         try:
-            p_out = output_subprocess_Popen(cmd)
+            with compiletrace.span('compile_str', 'cmodule',
+                                   module=module_name):
+                p_out = output_subprocess_Popen(cmd)
             compile_stderr = decode(p_out[1])
         except Exception:
             # An exception can occur e.g. if `g++` is not found.
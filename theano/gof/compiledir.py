@@ -1,14 +1,18 @@
 from __future__ import absolute_import, print_function, division
 import six.moves.cPickle as pickle
+import json
 import logging
 import os
 import shutil
+import tarfile
+import tempfile
 
 import numpy as np
 
 import theano
 from six import string_types, iteritems
 from theano import config
+from theano.gof import cmodule, compilelock
 from theano.gof.utils import flatten
 
 
@@ -245,3 +249,221 @@ def basecompiledir_ls():
 
 def basecompiledir_purge():
     shutil.rmtree(config.base_compiledir)
+
+
+# Name of the directory of the archives made by `export_cache`.
+_export_root = 'theano_cache'
+
+
+def _compile_info(key):
+    """
+    Return the config hash, C compiler and numpy ABI strings of a module key.
+
+    """
+    info = dict(config_hash=None, compiler=None, npy_abi=None)
+    for obj in key[1]:
+        if isinstance(obj, string_types):
+            if obj.startswith('md5:'):
+                info['config_hash'] = obj[len('md5:'):].strip()
+            elif obj.startswith('c_compiler_str='):
+                info['compiler'] = obj[len('c_compiler_str='):]
+            elif obj.startswith('NPY_ABI_VERSION='):
+                info['npy_abi'] = obj
+    return info
+
+
+def _current_compile_info():
+    return dict(
+        config_hash=theano.configparser.get_config_hash(),
+        compiler=cmodule.GCC_compiler.version_str(),
+        npy_abi='NPY_ABI_VERSION=0x%X' %
+        np.core.multiarray._get_ndarray_c_version())
+
+
+def _current_platform():
+    return (theano.configdefaults.default_compiledir_format %
+            theano.configdefaults.compiledir_format_dict)
+
+
+def export_cache(filename, compiledir=None):
+    """
+    Pack the versioned modules of a compiledir into a compressed tar
+    archive, so that they can be imported in the compiledir of another host
+    with `import_cache`.
+
+    Modules whose key.pkl file can not be loaded are skipped.
+
+    Parameters
+    ----------
+    filename : str
+        The archive to write.
+    compiledir : str
+        Defaults to "theano.config.compiledir".
+
+    Returns
+    -------
+    int
+        The number of exported modules.
+
+    """
+    if compiledir is None:
+        compiledir = config.compiledir
+    modules = []
+    with compilelock.lock_ctx(os.path.join(compiledir, 'lock_dir')):
+        tar = tarfile.open(filename, 'w:gz')
+        try:
+            for subdir in sorted(os.listdir(compiledir)):
+                root = os.path.join(compiledir, subdir)
+                key_pkl = os.path.join(root, 'key.pkl')
+                if (not os.path.exists(key_pkl) or
+                        os.path.exists(os.path.join(root, 'delete.me'))):
+                    continue
+                try:
+                    cmodule.module_name_from_dir(root)
+                    with open(key_pkl, 'rb') as f:
+                        key_data = pickle.load(f)
+                except Exception:
+                    _logger.warning("Not exporting '%s': its key file can "
+                                    "not be loaded.", root)
+                    continue
+                if (not isinstance(key_data, cmodule.KeyData) or
+                        not key_data.keys or
+                        not all(key[0] for key in key_data.keys)):
+                    continue
+                keys = sorted(key_data.keys, key=str)
+                modules.append(dict(
+                    subdir=subdir,
+                    module_hash=key_data.module_hash,
+                    keys=[_compile_info(key) for key in keys],
+                    digests=[cmodule.get_key_digest(key) for key in keys]))
+                # The key file is added last, so that an interrupted
+                # import never leaves a module without its library.
+                files = sorted(os.listdir(root))
+                files.remove('key.pkl')
+                for name in files + ['key.pkl']:
+                    tar.add(os.path.join(root, name),
+                            arcname='/'.join([_export_root, subdir, name]),
+                            recursive=False)
+            manifest = dict(version=1,
+                            platform=_current_platform(),
+                            modules=modules)
+            manifest.update(_current_compile_info())
+            _add_json(tar, '/'.join([_export_root, 'manifest.json']),
+                      manifest)
+        finally:
+            tar.close()
+    print('Exported %d modules from %s to %s' % (
+        len(modules), compiledir, filename))
+    return len(modules)
+
+
+def _add_json(tar, arcname, obj):
+    tmp_fd, tmp_path = tempfile.mkstemp(suffix='.json')
+    try:
+        with os.fdopen(tmp_fd, 'w') as f:
+            json.dump(obj, f, indent=1, sort_keys=True)
+        tar.add(tmp_path, arcname=arcname)
+    finally:
+        os.remove(tmp_path)
+
+
+def import_cache(filename, compiledir=None):
+    """
+    Add to a compiledir the modules of an archive made by `export_cache`.
+
+    Modules that are already in the cache are skipped, as well as the
+    modules that were compiled with another Theano configuration (see
+    `theano.configparser.get_config_hash`), C compiler or numpy ABI. If the
+    archive comes from another platform, nothing is imported.
+
+    Parameters
+    ----------
+    filename : str
+        The archive to read.
+    compiledir : str
+        Defaults to "theano.config.compiledir".
+
+    Returns
+    -------
+    int
+        The number of imported modules.
+
+    """
+    if compiledir is None:
+        compiledir = config.compiledir
+    current = _current_compile_info()
+
+    def compatible(info):
+        # Some keys are computed without the config hash.
+        return (info['config_hash'] in (current['config_hash'],
+                                        '<omitted>') and
+                info['compiler'] == current['compiler'] and
+                info['npy_abi'] == current['npy_abi'])
+
+    tar = tarfile.open(filename, 'r:*')
+    try:
+        members = dict((m.name, m) for m in tar.getmembers() if m.isfile())
+        manifest_name = '/'.join([_export_root, 'manifest.json'])
+        if manifest_name not in members:
+            raise ValueError('%s is not an archive of a Theano cache' %
+                             filename)
+        manifest = json.loads(
+            tar.extractfile(members[manifest_name]).read().decode('utf-8'))
+        if manifest['platform'] != _current_platform():
+            _logger.error("Not importing %s: it was exported on platform "
+                          "%s, this is %s.", filename, manifest['platform'],
+                          _current_platform())
+            return 0
+
+        cache = cmodule.ModuleCache(compiledir)
+        known = set(cache.module_hash_to_key_data)
+        if cache.index is not None:
+            known.update(e[1] for e in cache.index.entries)
+
+        n_imported = 0
+        n_incompatible = 0
+        index_entries = []
+        with compilelock.lock_ctx(os.path.join(compiledir, 'lock_dir')):
+            for module in manifest['modules']:
+                if module['module_hash'] in known:
+                    continue
+                if not any(compatible(info) for info in module['keys']):
+                    n_incompatible += 1
+                    continue
+                prefix = '/'.join([_export_root, module['subdir'], ''])
+                names = [n[len(prefix):] for n in members
+                         if n.startswith(prefix)]
+                # Keep the directory name, so that the paths stored in the
+                # key file are still valid (see `cmodule.is_same_entry`).
+                subdir = module['subdir']
+                if ('key.pkl' not in names or
+                        not subdir.startswith('tmp') or
+                        any(os.sep in n or '/' in n or n.startswith('.')
+                            for n in names + [subdir])):
+                    _logger.warning("Not importing module %s: its files "
+                                    "are missing or invalid.", subdir)
+                    continue
+                root = os.path.join(compiledir, subdir)
+                try:
+                    os.mkdir(root)
+                except OSError:
+                    _logger.warning("Not importing module %s: the "
+                                    "directory already exists.", root)
+                    continue
+                names.remove('key.pkl')
+                for name in names + ['key.pkl']:
+                    src = tar.extractfile(members[prefix + name])
+                    with open(os.path.join(root, name), 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+                index_entries.extend(
+                    (digest, module['module_hash'], subdir)
+                    for digest in module['digests'] if digest is not None)
+                known.add(module['module_hash'])
+                n_imported += 1
+            if cache.index is not None:
+                cache.index.add_entries(index_entries)
+    finally:
+        tar.close()
+    print('Imported %d modules from %s to %s, skipped %d incompatible '
+          'modules' % (n_imported, filename, compiledir, n_incompatible))
+    return n_imported
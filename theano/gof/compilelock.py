@@ -5,12 +5,14 @@ from __future__ import absolute_import, print_function, division
 import atexit
 import os
 import socket  # only used for gethostname()
+import threading
 import time
 import logging
 
 from contextlib import contextmanager
 
 import numpy as np
+from six import string_types
 
 from theano import config
 
@@ -137,6 +139,153 @@ def set_lock_status(use_lock):
     """
     get_lock.lock_is_enabled = use_lock
 
+
+# Map (thread id, module hash) to [number of times it was locked, time of
+# the last refresh, lock directory] for the module locks held by the threads
+# of this process. Only the re-entrant locking by the same thread is counted:
+# the other threads of the process wait on the lock directory like other
+# processes.
+_module_locks = {}
+
+
+def _module_lock_dir(module_hash):
+    return os.path.join(config.compiledir, 'module_locks', module_hash)
+
+
+def get_module_lock(module_hash, **kw):
+    """
+    Obtain lock on the compilation of one module.
+
+    Unlike `get_lock`, only the processes compiling the same module wait on
+    each other, and the threads of one process also exclude each other. It
+    can be acquired several times by the same thread and it is refreshed when
+    it is held for a long time, so that other processes can detect stale
+    locks.
+
+    Parameters
+    ----------
+    module_hash : str
+        Hash identifying the module (see `theano.gof.cmodule.get_module_hash`).
+    kw
+        Additional arguments to be forwarded to the `lock` function when
+        acquiring the lock.
+
+    """
+    lock_is_enabled = getattr(get_lock, 'lock_is_enabled', True)
+    lock_key = (threading.current_thread().ident, module_hash)
+    state = _module_locks.get(lock_key)
+    if state is None:
+        lock_dir = _module_lock_dir(module_hash)
+        if lock_is_enabled:
+            lock(lock_dir, **kw)
+        state = _module_locks[lock_key] = [0, time.time(), lock_dir]
+    elif lock_is_enabled:
+        now = time.time()
+        if now - state[1] > config.compile.timeout / 2:
+            lockpath = os.path.join(state[2], 'lock')
+            _logger.info('Refreshing lock %s', str(lockpath))
+            refresh_lock(lockpath)
+            state[1] = now
+    state[0] += 1
+
+
+def release_module_lock(module_hash):
+    """
+    Release lock on the compilation of one module.
+
+    """
+    lock_key = (threading.current_thread().ident, module_hash)
+    state = _module_locks[lock_key]
+    state[0] -= 1
+    assert state[0] >= 0
+    if state[0] == 0:
+        del _module_locks[lock_key]
+        if getattr(get_lock, 'lock_is_enabled', True):
+            Unlocker(state[2]).unlock(force=False)
+
+
+def _release_module_locks():
+    # Remove the module locks of a process that exits while compiling.
+    for lock_key in list(_module_locks):
+        state = _module_locks.pop(lock_key)
+        if getattr(get_lock, 'lock_is_enabled', True):
+            Unlocker(state[2]).unlock(force=False)
+
+atexit.register(_release_module_locks)
+
+
+@contextmanager
+def module_lock_ctx(module_hashes, keep_lock=False, **kw):
+    """
+    Lock the compilation of the modules identified by `module_hashes`.
+
+    If the Theano flag compile.lock_granularity is 'module', only the
+    processes compiling one of these modules wait on each other. Otherwise,
+    this is `lock_ctx` on the whole compilation directory, and `keep_lock`
+    has the same meaning.
+
+    Parameters
+    ----------
+    module_hashes : str or list of str
+        Hash(es) identifying the module(s) that will be compiled.
+
+    """
+    if config.compile.lock_granularity != 'module':
+        with lock_ctx(keep_lock=keep_lock, **kw):
+            yield
+        return
+    if isinstance(module_hashes, string_types):
+        module_hashes = [module_hashes]
+    locked = []
+    try:
+        # Always lock in the same order, to avoid dead locks between
+        # processes compiling several modules.
+        for module_hash in sorted(set(module_hashes)):
+            get_module_lock(module_hash, **kw)
+            locked.append(module_hash)
+        yield
+    finally:
+        for module_hash in reversed(locked):
+            release_module_lock(module_hash)
+
+
+@contextmanager
+def try_module_lock_ctx(module_hash):
+    """
+    Lock the compilation of one module, unless someone else holds its lock.
+
+    Unlike `module_lock_ctx`, this does not wait: the context yields False
+    if another process or thread holds the lock of the module, and True
+    once the lock is acquired. The lock is not re-entrant.
+
+    Parameters
+    ----------
+    module_hash : str
+        Hash identifying the module (see `theano.gof.cmodule.get_module_hash`).
+
+    """
+    if not getattr(get_lock, 'lock_is_enabled', True):
+        yield True
+        return
+    lock_dir = _module_lock_dir(module_hash)
+    base_lock = os.path.dirname(lock_dir)
+    if not os.path.isdir(base_lock):
+        try:
+            os.makedirs(base_lock)
+        except OSError:
+            # Someone else was probably trying to create it at the same time.
+            pass
+    try:
+        os.mkdir(lock_dir)
+    except OSError:
+        yield False
+        return
+    try:
+        refresh_lock(os.path.join(lock_dir, 'lock'))
+        yield True
+    finally:
+        Unlocker(lock_dir).unlock(force=False)
+
 # This is because None is a valid input for timeout
 notset = object()
 
@@ -238,7 +387,7 @@ def lock(tmp_dir, timeout=notset, min_wait=None, max_wait=None, verbosity=1):
                         msg = "process '%s'" % read_owner.split('_')[0]
                         _logger.warning("Overriding existing lock by dead %s "
                                         "(I am process '%s')", msg, my_pid)
-                    get_lock.unlocker.unlock(force=True)
+                    Unlocker(tmp_dir).unlock(force=True)
                     continue
                 if last_owner == read_owner:
                     if (timeout is not None and
@@ -251,7 +400,7 @@ def lock(tmp_dir, timeout=notset, min_wait=None, max_wait=None, verbosity=1):
                                 msg = "process '%s'" % read_owner.split('_')[0]
                             _logger.warning("Overriding existing lock by %s "
                                             "(I am process '%s')", msg, my_pid)
-                        get_lock.unlocker.unlock(force=True)
+                        Unlocker(tmp_dir).unlock(force=True)
                         continue
                 else:
                     last_owner = read_owner
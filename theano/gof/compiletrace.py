@@ -0,0 +1,198 @@
+"""
+Tracing of the compilation of Theano functions.
+
+The spans recorded while a trace is active (graph cloning, optimizers,
+local optimizer applications, C code generation, C compilation and module
+cache lookups) can be saved in the Chrome trace event format, and viewed
+with chrome://tracing or https://ui.perfetto.dev.
+
+Use the `compile_trace` context manager::
+
+    with compile_trace('compile.json'):
+        f = theano.function(...)
+
+or the Theano flag ``profiling.compile_trace`` to trace all the
+compilations of a process.
+
+When no trace is active, `span` and `annotate` only cost a function call.
+
+"""
+from __future__ import absolute_import, print_function, division
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+from theano import config
+
+_lock = threading.Lock()
+# Trace collecting the spans, None when tracing is disabled. It is shared by
+# all the threads, as the C modules can be compiled by a thread pool.
+_current_trace = None
+# Arguments of the spans open in each thread, innermost last.
+_open_spans = threading.local()
+
+
+class CompileTrace(object):
+    """
+    List of events in the Chrome trace event format.
+
+    """
+
+    def __init__(self):
+        self.events = []
+        self.pid = os.getpid()
+
+    def add_span(self, name, cat, start, duration, args):
+        """
+        Add a complete event ("X") for a span that started at `start` and
+        lasted `duration` seconds.
+
+        """
+        event = {'name': name, 'cat': cat, 'ph': 'X',
+                 'ts': start * 1e6, 'dur': duration * 1e6,
+                 'pid': self.pid, 'tid': threading.current_thread().ident}
+        if args:
+            event['args'] = dict((str(k), _json_value(v))
+                                 for k, v in args.items())
+        with _lock:
+            self.events.append(event)
+
+    def to_json(self):
+        with _lock:
+            events = list(self.events)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save(self, filename):
+        """
+        Write the trace in `filename`, replacing its previous content.
+
+        """
+        tmp_filename = '%s.%s.tmp' % (filename, os.getpid())
+        with open(tmp_filename, 'w') as f:
+            json.dump(self.to_json(), f)
+        os.rename(tmp_filename, filename)
+
+
+def _json_value(v):
+    if isinstance(v, (bool, int, float)) or v is None:
+        return v
+    return str(v)
+
+
+def is_tracing():
+    return _current_trace is not None
+
+
+@contextlib.contextmanager
+def compile_trace(filename=None):
+    """
+    Trace the compilations done in this context.
+
+    Nested calls record their spans in the trace of the outermost one.
+
+    Parameters
+    ----------
+    filename : str
+        If provided, the trace is saved there when the outermost context
+        exits.
+
+    Yields
+    ------
+    CompileTrace
+        The active trace.
+
+    """
+    global _current_trace
+    if _current_trace is not None:
+        yield _current_trace
+        return
+    trace = CompileTrace()
+    _current_trace = trace
+    try:
+        yield trace
+    finally:
+        _current_trace = None
+        if filename:
+            trace.save(filename)
+
+
+# (file name, trace) of all the compilations of the process, with the
+# Theano flag profiling.compile_trace.
+_process_trace = (None, None)
+
+
+@contextlib.contextmanager
+def function_span(name):
+    """
+    Span of the compilation of a Theano function called `name`.
+
+    With the Theano flag ``profiling.compile_trace``, the compilation is
+    traced even if no trace is active. Its spans are added to the ones of
+    the previous compilations of the process traced with the same flag
+    value, and all of them are saved in the file given by the flag.
+
+    """
+    global _current_trace, _process_trace
+    filename = config.profiling.compile_trace
+    if not filename or _current_trace is not None:
+        with span('theano.function', 'function', name=name):
+            yield
+        return
+    if _process_trace[0] != filename:
+        _process_trace = (filename, CompileTrace())
+    trace = _process_trace[1]
+    _current_trace = trace
+    try:
+        with span('theano.function', 'function', name=name):
+            yield
+    finally:
+        _current_trace = None
+        trace.save(filename)
+
+
+@contextlib.contextmanager
+def span(name, cat, **args):
+    """
+    Record the time spent in this context, if a trace is active.
+
+    Parameters
+    ----------
+    name : str
+        Name of the span, e.g. the name of an optimizer.
+    cat : str
+        Category of the span, e.g. 'optimizer' or 'cmodule'.
+    args
+        Information shown with the span. The body of the context can add
+        some with `annotate`.
+
+    """
+    trace = _current_trace
+    if trace is None:
+        yield
+        return
+    stack = getattr(_open_spans, 'stack', None)
+    if stack is None:
+        stack = _open_spans.stack = []
+    stack.append(args)
+    t0 = time.time()
+    try:
+        yield
+    finally:
+        duration = time.time() - t0
+        stack.pop()
+        trace.add_span(name, cat, t0, duration, args)
+
+
+def annotate(**args):
+    """
+    Add information to the innermost span open in this thread.
+
+    """
+    if _current_trace is None:
+        return
+    stack = getattr(_open_spans, 'stack', None)
+    if stack:
+        stack[-1].update(args)
@@ -291,7 +291,7 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
 
     It is a work in progress. The following data structures have been
     converted to use the incremental strategy:
-        <none>
+        topo_order, used to detect cycles in validate().
 
     The following data structures remain to be converted:
         <unknown>
@@ -381,6 +381,19 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
         self.clients = OrderedDict()  # variable -> apply -> ninputs
         self.stale_droot = True
 
+        """
+        Maps every Apply node to its position in a topological order of the
+        graph, including the orderings of the destroyers. validate() keeps
+        it up to date with the algorithm of Pearce and Kelly, so it only
+        visits the nodes between the ends of the edges that break it.
+        topo_pending holds the nodes whose inputs changed since the last
+        successful validate().
+
+        """
+        self.topo_order = {}
+        self.topo_next = 0
+        self.topo_pending = OrderedSet()
+
         self.debug_all_apps = set()
         if self.do_imports_on_attach:
             toolbox.Bookkeeper.on_attach(self, fgraph)
@@ -449,6 +462,9 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
         del self.view_o
         del self.clients
         del self.stale_droot
+        del self.topo_order
+        del self.topo_next
+        del self.topo_pending
         assert self.fgraph.destroyer_handler is self
         delattr(self.fgraph, 'destroyers')
         delattr(self.fgraph, 'has_destroyers')
@@ -536,6 +552,10 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
         for i, output in enumerate(app.outputs):
             self.clients.setdefault(output, OrderedDict())
 
+        self.topo_order[app] = self.topo_next
+        self.topo_next += 1
+        self.topo_pending.add(app)
+
         self.stale_droot = True
 
     def on_prune(self, fgraph, app, reason):
@@ -573,6 +593,9 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
             if not self.view_o[i]:
                 del self.view_o[i]
 
+        del self.topo_order[app]
+        self.topo_pending.discard(app)
+
         self.stale_droot = True
         if app in self.fail_validate:
             del self.fail_validate[app]
@@ -598,6 +621,8 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
             self.clients.setdefault(new_r, OrderedDict()).setdefault(app, 0)
             self.clients[new_r][app] += 1
 
+            self.topo_pending.add(app)
+
             # UPDATE self.view_i, self.view_o
             for o_idx, i_idx_list in iteritems(getattr(app.op, 'view_map',
                                                        OrderedDict())):
@@ -653,7 +678,7 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
                         raise app_err_pairs[app]
             else:
                 ords = self.orderings(fgraph, ordered=False)
-                if _contains_cycle(fgraph, ords):
+                if self._contains_cycle(ords):
                     raise InconsistencyError("Dependency graph contains cycles")
         else:
             # James's Conjecture:
@@ -669,6 +694,102 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
             pass
         return True
 
+    def _contains_cycle(self, ords):
+        """
+        Return True if the graph with the extra dependencies `ords` contains
+        a cycle, updating self.topo_order otherwise.
+
+        Only the edges that break topo_order are inserted again: the inputs
+        of the nodes in topo_pending and the orderings. Their cost is the
+        size of the region of topo_order between their ends, not the size of
+        the graph as with the module function _contains_cycle.
+
+        """
+        order = self.topo_order
+        broken = []
+        for app in self.topo_pending:
+            for input in app.inputs:
+                if input.owner is not None and \
+                        order[input.owner] >= order[app]:
+                    broken.append((input.owner, app))
+        for app, prereqs in iteritems(ords):
+            for prereq in prereqs:
+                if order[prereq] >= order[app]:
+                    broken.append((prereq, app))
+        if broken:
+            ords_clients = {}
+            for app, prereqs in iteritems(ords):
+                for prereq in prereqs:
+                    ords_clients.setdefault(prereq, []).append(app)
+            # The edges not inserted yet must not be followed.
+            waiting = set(broken)
+            for edge in broken:
+                waiting.discard(edge)
+                if not self._insert_edge(edge[0], edge[1], ords,
+                                         ords_clients, waiting):
+                    return True
+        self.topo_pending.clear()
+        return False
+
+    def _insert_edge(self, src, dst, ords, ords_clients, waiting):
+        """
+        Insert the edge src -> dst in self.topo_order with the algorithm
+        of Pearce and Kelly. Return False if the edge closes a cycle.
+
+        """
+        order = self.topo_order
+        lower = order[dst]
+        upper = order[src]
+        if lower > upper:
+            return True
+        if src is dst:
+            return False
+
+        # The nodes reachable from dst that are before src in the order.
+        forward = [dst]
+        seen = set(forward)
+        stack = [dst]
+        while stack:
+            node = stack.pop()
+            clients = [c for out in node.outputs for c, _ in out.clients
+                       if c != 'output']
+            clients.extend(ords_clients.get(node, ()))
+            for client in clients:
+                if waiting and (node, client) in waiting:
+                    continue
+                if client is src:
+                    return False
+                if client not in seen and order[client] < upper:
+                    seen.add(client)
+                    forward.append(client)
+                    stack.append(client)
+
+        # The nodes that reach src and are after dst in the order.
+        backward = [src]
+        seen = set(backward)
+        stack = [src]
+        while stack:
+            node = stack.pop()
+            prereqs = [i.owner for i in node.inputs if i.owner is not None]
+            prereqs.extend(ords.get(node, ()))
+            for prereq in prereqs:
+                if waiting and (prereq, node) in waiting:
+                    continue
+                if prereq not in seen and order[prereq] > lower:
+                    seen.add(prereq)
+                    backward.append(prereq)
+                    stack.append(prereq)
+
+        # Put the backward nodes before the forward ones, in the positions
+        # they used, keeping their relative order.
+        backward.sort(key=order.__getitem__)
+        forward.sort(key=order.__getitem__)
+        nodes = backward + forward
+        positions = sorted(order[node] for node in nodes)
+        for node, position in zip(nodes, positions):
+            order[node] = position
+        return True
+
     def orderings(self, fgraph, ordered=True):
         """
         Return orderings induced by destructive operations.
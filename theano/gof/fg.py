@@ -802,6 +802,8 @@ class FunctionGraph(utils.object2):
 
     def __setstate__(self, dct):
         self.__dict__.update(dct)
+        self.execute_callbacks_times = dict((feature, 0)
+                                            for feature in self._features)
         for feature in self._features:
             if hasattr(feature, "unpickle"):
                 feature.unpickle(self)
@@ -302,6 +302,33 @@ class CLinkerOp(CLinkerObject):
         """
         raise utils.MethodNotDefined('%s.c_code' % self.__class__.__name__)
 
+    def c_code_nogil(self, node, name, inputs, outputs, sub):
+        """
+        Optional: return C code to run after c_code, without the GIL.
+
+        Ops that release the GIL let other Python threads run while they
+        compute, e.g. other Theano functions called from a thread pool or
+        the other nodes of the `Parallel` VM. The usual split is to check
+        the inputs and allocate the outputs in c_code, and to do the
+        computation here.
+
+        This code is in the same C block as the code of c_code, so it can
+        use the variables c_code declared. It must not use the Python C-API,
+        except the macros that read the fields of the inputs and outputs
+        (PyArray_DATA, PyArray_DIMS, ...), and it cannot fail: `sub` has no
+        'fail' symbol. All the errors must be detected by c_code.
+
+        The parameters are the same as the ones of `c_code`.
+
+        Raises
+        ------
+        MethodNotDefined
+            The subclass does not override this method.
+
+        """
+        raise utils.MethodNotDefined('%s.c_code_nogil' %
+                                     self.__class__.__name__)
+
     def c_code_cache_version_apply(self, node):
         """
         Return a tuple of integers indicating the version of this Op.
@@ -836,6 +863,7 @@ class Op(utils.object2, PureOp, CLinkerOp):
                           if old_o in no_recycling]
         cl = theano.gof.cc.CLinker().accept(e,
                                             no_recycling=e_no_recycling)
+        cl.cmodule_key_hint = theano.gof.cc.get_cmodule_key_hint(node)
         # float16 gets special treatment since running
         # unprepared C code will get bad results.
         if not getattr(self, '_f16_ok', False):
@@ -865,6 +893,7 @@ class Op(utils.object2, PureOp, CLinkerOp):
 
         rval.thunk = thunk
         rval.cthunk = thunk.cthunk
+        rval.cmodule_key = cl.module_key
         rval.inputs = node_input_storage
         rval.outputs = node_output_storage
         rval.lazy = False
@@ -23,7 +23,7 @@ from theano import config
 from theano.compat import izip
 from six import string_types, iteritems, itervalues, integer_types
 from six.moves import reduce
-from theano.gof import graph, op, utils, unify, toolbox
+from theano.gof import compiletrace, graph, op, utils, unify, toolbox
 from theano.gof.fg import InconsistencyError
 from theano.misc.ordered_set import OrderedSet
 
@@ -85,7 +85,9 @@ class Optimizer(object):
         try:
             orig = theano.tensor.basic.constant.enable
             theano.tensor.basic.constant.enable = False
-            ret = self.apply(fgraph, *args, **kwargs)
+            with compiletrace.span(getattr(self, 'name', None) or
+                                   type(self).__name__, 'optimizer'):
+                ret = self.apply(fgraph, *args, **kwargs)
         finally:
             theano.tensor.basic.constant.enable = orig
         return ret
@@ -203,12 +205,23 @@ class SeqOptimizer(Optimizer, list):
         failure_callback : callable or None
             Keyword only argument. A callback used when a failure
             happen during optimization.
+        time_budget : float or None
+            Keyword only argument. Time in seconds after which the
+            optimizers are replaced by their fallback. If the fgraph
+            already has an ``optimization_deadline`` set by an enclosing
+            SeqOptimizer, it is used instead.
+        fallback : dict
+            Keyword only argument. Name of an optimizer -> the optimizer
+            to apply instead of it once the time budget is exhausted. The
+            optimizers that aren't in it are skipped.
 
         """
         if len(opts) == 1 and isinstance(opts[0], (list, tuple)):
             opts = opts[0]
         self[:] = opts
         self.failure_callback = kw.pop('failure_callback', None)
+        self.time_budget = kw.pop('time_budget', None)
+        self.fallback = kw.pop('fallback', {})
         assert len(kw) == 0
 
     def apply(self, fgraph):
@@ -234,12 +247,45 @@ class SeqOptimizer(Optimizer, list):
             self, l, -1, -1, nb_node_before,
             -1, sub_profs, sub_validate_time,
             nb_nodes, {})
+        time_budget = getattr(self, 'time_budget', None)
+        set_deadline = (time_budget is not None and
+                        getattr(fgraph, 'optimization_deadline', None) is None)
+        if set_deadline:
+            fgraph.optimization_deadline = time.time() + time_budget
         try:
-            for optimizer in self:
+            for phase in self:
+                optimizer = phase
                 try:
                     nb_nodes_before = len(fgraph.apply_nodes)
                     t0 = time.time()
+                    fallback = None
+                    if time_budget is not None:
+                        fallback = self.fallback.get(optimizer.name)
+                    if (time_budget is not None and
+                            t0 > fgraph.optimization_deadline):
+                        optimizer, fallback = fallback, None
+                        if optimizer is None:
+                            # Skipped, it has no cost in the profile.
+                            l.append(0.)
+                            sub_profs.append(None)
+                            nb_nodes.append((nb_nodes_before,
+                                             nb_nodes_before))
+                            if fgraph.profile:
+                                sub_validate_time.append(
+                                    fgraph.profile.validate_time)
+                            continue
                     sub_prof = optimizer.optimize(fgraph)
+                    if (fallback is not None and fallback is not optimizer and
+                            isinstance(optimizer, EquilibriumOptimizer) and
+                            getattr(optimizer, 'stop_at_deadline', False) and
+                            time.time() > fgraph.optimization_deadline):
+                        # The optimizer could have stopped before doing
+                        # everything the fallback does.
+                        fallback.optimize(fgraph)
+                    if optimizer is not phase:
+                        # The profile of the fallback can not be printed or
+                        # merged as one of the phase.
+                        sub_prof = None
                     l.append(float(time.time() - t0))
                     sub_profs.append(sub_prof)
                     nb_nodes.append((nb_nodes_before,
@@ -256,6 +302,8 @@ class SeqOptimizer(Optimizer, list):
                     else:
                         raise
         finally:
+            if set_deadline:
+                del fgraph.optimization_deadline
 
             if fgraph.profile:
                 validate_time = fgraph.profile.validate_time - validate_before
@@ -364,7 +412,11 @@ class SeqOptimizer(Optimizer, list):
             new_t.append(prof1[1][idx1] +
                          prof2[1][idx2])
             new_l.append(l)
-            if hasattr(l, 'merge_profile'):
+            if prof1[6][idx1] is None or prof2[6][idx2] is None:
+                # The phase was skipped or replaced by its fallback in one
+                # of them (see SeqOptimizer.time_budget).
+                new_sub_profile.append(prof1[6][idx1] or prof2[6][idx2])
+            elif hasattr(l, 'merge_profile'):
                 assert len(prof1[6][idx1]) == len(prof2[6][idx2])
                 new_sub_profile.append(l.merge_profile(prof1[6][idx1],
                                                        prof2[6][idx2]))
@@ -390,7 +442,11 @@ class SeqOptimizer(Optimizer, list):
                     else:
                         p = prof2
                     new_t[idx] += p[1][p[0].index(l)]
-                    if hasattr(l, 'merge_profile'):
+                    if (new_sub_profile[idx] is None or
+                            p[6][p[0].index(l)] is None):
+                        new_sub_profile[idx] = (new_sub_profile[idx] or
+                                                p[6][p[0].index(l)])
+                    elif hasattr(l, 'merge_profile'):
                         assert len(p[6][p[0].index(l)]) == \
                             len(new_sub_profile[idx])
                         new_sub_profile[idx] = l.merge_profile(
@@ -510,6 +566,11 @@ class MergeFeature(object):
     That way, the MergeOptimizer can remember the result of the last merge
     pass on the fgraph.
 
+    The distinct Apply nodes are hash-consed: they are stored in a table
+    keyed on their op and the ids of their inputs, kept up to date by the
+    fgraph callbacks. Finding the node a new node can be merged with is
+    one lookup in that table.
+
     """
     def on_attach(self, fgraph):
         assert not hasattr(fgraph, 'merge_feature')
@@ -525,8 +586,11 @@ class MergeFeature(object):
         # For all Apply nodes
         # Set of distinct (not mergeable) nodes
         self.nodes_seen = set()
-        # Ordered set of distinct (not mergeable) nodes without any input
-        self.noinput_nodes = OrderedSet()
+        # (op, ids of the inputs) -> distinct node
+        self.node_table = {}
+        # distinct node -> its key in node_table, as its inputs can
+        # change before we remove it from the table
+        self.node_key = {}
 
         # Each element of scheduled is a list of list of (out, new_out) pairs.
         # Each list of pairs represent the substitution needed to replace all
@@ -551,7 +615,7 @@ class MergeFeature(object):
         # If inputs to node change, it is not guaranteed that it is distinct
         # from the other nodes in nodes_seen
         if node in self.nodes_seen:
-            self.nodes_seen.discard(node)
+            self.forget_node(node)
             self.process_node(fgraph, node)
 
         # Since we are in on_change_input, node should have inputs.
@@ -569,9 +633,7 @@ class MergeFeature(object):
         self.process_node(fgraph, node)
 
     def on_prune(self, fgraph, node, reason):
-        self.nodes_seen.discard(node)
-        if not node.inputs:
-            self.noinput_nodes.discard(node)
+        self.forget_node(node)
         for c in node.inputs:
             if isinstance(c, graph.Constant) and (len(c.clients) <= 1):
                 # This was the last node using this constant
@@ -601,6 +663,16 @@ class MergeFeature(object):
             self.const_sig_inv[sig] = c
             self.seen_constants.add(id(c))
 
+    def forget_node(self, node):
+        """
+        Remove node from the distinct nodes.
+
+        """
+        self.nodes_seen.discard(node)
+        key = self.node_key.pop(node, None)
+        if key is not None and self.node_table.get(key) is node:
+            del self.node_table[key]
+
     def process_node(self, fgraph, node):
         """
         Check if a node can be merged, and queue that replacement.
@@ -609,137 +681,58 @@ class MergeFeature(object):
         if node in self.nodes_seen:
             return
 
-        node_has_assert = False
-
-        # These asserts ensure that the fgraph has set the clients field
-        # properly.
-        # The clients should at least contain `node` itself!
-        if node.inputs:
-            # Take the smallest clients list. Some ops like elemwise
-            # have optimization that put constant as the first inputs.
-            # As constant have in general more clients than other type of nodes
-            # using always inputs[0] make us look at more nodes.
-            # Always pick the smallest clints list between inputs 0
-            # and -1 speed up optimization.
-
-            if len(node.inputs[0].clients) < len(node.inputs[-1].clients):
-                clients = node.inputs[0].clients
-            else:
-                clients = node.inputs[-1].clients
-            assert len(clients) > 0
-
-            merge_candidates = [c for c, i in clients if c in self.nodes_seen]
-
-            # Put all clients of Assert inputs (if exist) into merge_candidates
-            # TODO: Deactivated for now as this cause cycle in the graph.
-            # (There is a second deactivation part below.)
-            for i in []:  # node.inputs:
-                if i.owner and isinstance(i.owner.op,
-                                          theano.tensor.opt.Assert):
-                    node_has_assert = True
-                    assert_clients = [c for (c, _) in i.owner.inputs[0].clients
-                                      if c in self.nodes_seen]
-
-                    for idx in range(len(assert_clients)):
-                        client = assert_clients[idx]
-                        if isinstance(i.owner.op, theano.tensor.opt.Assert):
-                            for c in client.outputs[0].clients:
-                                if c[0] in self.nodes_seen:
-                                    assert_clients.append(c[0])
-
-                    merge_candidates.extend(assert_clients)
+        # TODO: The merge of nodes whose inputs differ only by Assert is
+        # deactivated as it causes cycles in the graph. See
+        # get_merged_assert_input.
+        key = (node.op, tuple(id(i) for i in node.inputs))
+        try:
+            candidate = self.node_table.get(key)
+        except TypeError:
+            # The op isn't hashable, compare it to the clients of its inputs
+            key = None
+            candidate = self.find_candidate(node)
+
+        if (candidate is not None and candidate is not node and
+                (node, candidate) not in self.blacklist):
+            # Schedule transfer of clients from node to candidate
+            pairs = list(zip(node.outputs,
+                             candidate.outputs,
+                             ['merge'] * len(node.outputs)))
+
+            # transfer names
+            for node_output, cand_output, _ in pairs:
+                # clobber old name with new one
+                # it's arbitrary... one of the names has to go
+                if node_output.name:
+                    cand_output.name = node_output.name
+
+            self.scheduled.append([pairs])
         else:
-            # If two nodes have no input, but perform the same operation,
-            # they are not always constant-folded, so we want to merge them.
-            # In that case, the candidates are all the nodes without inputs.
-            merge_candidates = self.noinput_nodes
-
-        replacement_candidates = []
-        for candidate in merge_candidates:
-            if candidate is node:
-                continue
-            if len(node.inputs) != len(candidate.inputs):
-                continue
-
-            cand_has_assert = False
-
-            # Get input list of the candidate with assert removed
-            cand_inputs_assert_removed = []
-            # TODO: Deactivated while Assert merging is disabled. (See above and below.)
-            for i in []:  # candidate.inputs:
-                if i.owner and isinstance(i.owner.op,
-                                          theano.tensor.opt.Assert):
-                    cand_has_assert = True
-                    cand_inputs_assert_removed.append(i.owner.inputs[0])
-                else:
-                    cand_inputs_assert_removed.append(i)
-
-            # TODO: Remove this when Assert merging is re-enabled. (See above.)
-            # Without Assert merging we can still look for identical Asserts,
-            # so we should not treat Asserts separately for now.
-            cand_inputs_assert_removed = candidate.inputs
-
-            # Get input list of the node with assert removed
-            if node_has_assert:
-                node_inputs_assert_removed = []
-                for i in node.inputs:
-                    if i.owner and isinstance(i.owner.op,
-                                              theano.tensor.opt.Assert):
-                        node_inputs_assert_removed.append(i.owner.inputs[0])
-                    else:
-                        node_inputs_assert_removed.append(i)
-            else:
-                node_inputs_assert_removed = node.inputs
+            self.nodes_seen.add(node)
+            if key is not None and candidate is None:
+                self.node_table[key] = node
+                self.node_key[node] = key
 
-            inputs_match = all(node_in is cand_in
-                               for node_in, cand_in
-                               in zip(node_inputs_assert_removed,
-                                      cand_inputs_assert_removed))
+    def find_candidate(self, node):
+        """
+        Return a distinct node with the same op and inputs as node, or None.
 
-            if inputs_match and node.op == candidate.op:
-                if (node, candidate) in self.blacklist:
-                    # They were already tried, and there was an error
-                    continue
+        This is only used for the ops that can't be hashed.
 
-                # replace node with candidate
-                if not (node_has_assert or cand_has_assert):
-                    # Schedule transfer of clients from node to candidate
-                    pairs = list(zip(node.outputs,
-                                     candidate.outputs,
-                                     ['merge'] * len(node.outputs)))
-
-                # if the current node has assert input, it should not be
-                # replaced with a candidate node which has no assert input
-                elif node_has_assert and not cand_has_assert:
-                    pairs = list(zip(candidate.outputs,
-                                     node.outputs,
-                                     ['merge'] * len(node.outputs)))
-                else:
-                    new_inputs = self.get_merged_assert_input(node, candidate)
-                    new_node = node.op(*new_inputs)
-                    pairs = list(zip(node.outputs,
-                                     new_node.owner.outputs,
-                                     ['new_node'] * len(node.outputs))) +\
-                        list(zip(candidate.outputs,
-                                 new_node.owner.outputs,
-                                 ['new_node'] * len(node.outputs)))
-
-                # transfer names
-                for pair in pairs:
-                    node_output, cand_output = pair[:2]
-                    # clobber old name with new one
-                    # it's arbitrary... one of the names has to go
-                    if node_output.name:
-                        cand_output.name = node_output.name
-
-                replacement_candidates.append(pairs)
-
-        if replacement_candidates:
-            self.scheduled.append(replacement_candidates)
+        """
+        if node.inputs:
+            candidates = [c for c, i in node.inputs[0].clients
+                          if c in self.nodes_seen]
         else:
-            self.nodes_seen.add(node)
-            if not node.inputs:
-                self.noinput_nodes.add(node)
+            candidates = [c for c in self.nodes_seen if not c.inputs]
+        for candidate in candidates:
+            if (candidate is not node and
+                    len(node.inputs) == len(candidate.inputs) and
+                    all(node_in is cand_in for node_in, cand_in
+                        in zip(node.inputs, candidate.inputs)) and
+                    node.op == candidate.op):
+                return candidate
+        return None
 
     def get_merged_assert_input(self, node, candidate):
         new_inputs = []
@@ -1286,6 +1279,56 @@ def local_optimizer(tracks, inplace=False, requirements=()):
     return decorator
 
 
+class OpDispatchTable(object):
+    """
+    Map an Op to the ordered list of the local optimizers to try on its
+    nodes.
+
+    The list of an Op is the concatenation of the optimizers that track
+    its class, the ones that track the Op instance and the ones that track
+    all the Ops (key None in `track_map`). The optimizers of a class are
+    gathered the first time an Op of this class is seen, so that each node
+    only costs two dict lookups: one for its class, one for the optimizers
+    that track its Op instance. As the tables can live as long as the
+    optimizers, only the classes are cached, not the Op instances.
+
+    Parameters
+    ----------
+    track_map : dict
+        Op class, Op instance or None -> list of local optimizers.
+    untracked_first : bool
+        If True, the optimizers that track all the Ops come first.
+
+    """
+    def __init__(self, track_map, untracked_first=False):
+        self.track_map = track_map
+        self.untracked_first = untracked_first
+        # Op class -> (optimizers before the ones of the instance,
+        #              optimizers after them, concatenation of both)
+        self.cache = {}
+
+    def _class_opts(self, op_class):
+        get = self.track_map.get
+        untracked = list(get(None, ()))
+        class_opts = list(get(op_class, ()))
+        if self.untracked_first:
+            head, tail = untracked + class_opts, []
+        else:
+            head, tail = class_opts, untracked
+        entry = self.cache[op_class] = (head, tail, head + tail)
+        return entry
+
+    def __getitem__(self, op):
+        try:
+            head, tail, opts = self.cache[type(op)]
+        except KeyError:
+            head, tail, opts = self._class_opts(type(op))
+        instance_opts = self.track_map.get(op)
+        if instance_opts:
+            return head + instance_opts + tail
+        return opts
+
+
 class LocalOptGroup(LocalOptimizer):
     """Takes a list of LocalOptimizer and applies them to the node.
 
@@ -1339,6 +1382,7 @@ class LocalOptGroup(LocalOptimizer):
             else:
                 for c in tracks:
                     self.track_map[c].append(o)
+        self.dispatch = OpDispatchTable(self.track_map)
 
     def __str__(self):
         return getattr(self, '__name__',
@@ -1359,7 +1403,7 @@ class LocalOptGroup(LocalOptimizer):
         fgraph = node.fgraph
         repl = None
         while True:
-            opts = self.track_map[type(node.op)] + self.track_map[node.op] + self.track_map[None]
+            opts = self.dispatch[node.op]
             new_repl = None
             for opt in opts:
                 opt_start = time.time()
@@ -1465,7 +1509,7 @@ class GraphToGPULocalOptGroup(LocalOptGroup):
         if len(self.opts) == 0:
             return
         fgraph = outputs[0].fgraph
-        opts = self.track_map[type(op)] + self.track_map[op] + self.track_map[None]
+        opts = self.dispatch[op]
         for opt in opts:
             opt_start = time.time()
             new_repl = opt.transform(op, context_name, inputs, outputs)
@@ -1672,6 +1716,7 @@ class PatternSub(LocalOptimizer):
         self.pdb = pdb
         self._tracks = tracks
         self.get_nodes = get_nodes
+        self._match = None
         if tracks != ():
             assert get_nodes
 
@@ -1702,73 +1747,13 @@ class PatternSub(LocalOptimizer):
 
         if node.op != self.op:
             return False
-        # TODO: if we remove pdb, do this speed things up?
-
-        def match(pattern, expr, u, allow_multiple_clients=False, pdb=False):
-            # TODO move outside match
-            def retry_with_equiv():
-                if not self.skip_identities_fn:
-                    return False
-                expr_equiv = self.skip_identities_fn(expr)
-                if expr_equiv is None:
-                    return False
-                # TODO: Not sure how to handle multiple_clients flag
-                # print 'retrying match', pattern, expr_equiv
-                return match(pattern, expr_equiv, u,
-                             allow_multiple_clients=allow_multiple_clients)
-
-            if isinstance(pattern, (list, tuple)):
-                if expr.owner is None:
-                    return False
-                if (not (expr.owner.op == pattern[0]) or
-                        (not allow_multiple_clients and len(expr.clients) > 1)):
-                    return retry_with_equiv()
-                if len(pattern) - 1 != len(expr.owner.inputs):
-                    return retry_with_equiv()
-                for p, v in zip(pattern[1:], expr.owner.inputs):
-                    u = match(p, v, u, self.allow_multiple_clients)
-                    if not u:
-                        return False
-            elif isinstance(pattern, dict):
-                try:
-                    real_pattern = pattern['pattern']
-                except KeyError:
-                    raise KeyError(
-                        "Malformed pattern: %s (expected key 'pattern')"
-                        % pattern)
-                constraint = pattern.get('constraint', lambda expr: True)
-                if constraint(expr):
-                    return match(real_pattern, expr, u,
-                                 pattern.get('allow_multiple_clients',
-                                             allow_multiple_clients))
-                else:
-                    return retry_with_equiv()
-            elif isinstance(pattern, string_types):
-                v = unify.Var(pattern)
-                if u[v] is not v and u[v] is not expr:
-                    return retry_with_equiv()
-                else:
-                    u = u.merge(expr, v)
-            elif (isinstance(pattern, (integer_types, float)) and
-                    isinstance(expr, graph.Constant)):
-                if np.all(theano.tensor.constant(pattern).value == expr.value):
-                    return u
-                else:
-                    return retry_with_equiv()
-            elif (isinstance(pattern, graph.Constant) and
-                    isinstance(expr, graph.Constant) and
-                    pattern.equals(expr)):
-                return u
-            else:
-                return retry_with_equiv()
-            if pdb:
-                import pdb
+        if getattr(self, '_match', None) is None:
+            self._match = self._compile(self.in_pattern)
+        u = self._match(node.out, unify.Unification(), True)
+        if u:
+            if self.pdb:
                 pdb.set_trace()
-            return u
 
-        u = match(self.in_pattern, node.out, unify.Unification(), True,
-                  self.pdb)
-        if u:
             def build(pattern, u):
                 if isinstance(pattern, (list, tuple)):
                     args = [build(p, u) for p in pattern[1:]]
@@ -1787,6 +1772,94 @@ class PatternSub(LocalOptimizer):
         else:
             return False
 
+    def _compile(self, pattern):
+        """
+        Compile `pattern` into a function ``match(expr, u,
+        allow_multiple_clients)`` that returns the Unification `u`
+        extended with the match of `expr`, or False.
+
+        The pattern is walked once here, so an attempt only tests the ops,
+        the number of inputs and the constants of the pattern against the
+        graph, and binds its strings with `gof.unify`.
+
+        """
+        def retry_with_equiv(expr, u, allow_multiple_clients):
+            if not self.skip_identities_fn:
+                return False
+            expr_equiv = self.skip_identities_fn(expr)
+            if expr_equiv is None:
+                return False
+            # TODO: Not sure how to handle multiple_clients flag
+            return match(expr_equiv, u, allow_multiple_clients)
+
+        if isinstance(pattern, (list, tuple)):
+            pattern_op = pattern[0]
+            nb_inputs = len(pattern) - 1
+            sub_matches = [self._compile(p) for p in pattern[1:]]
+
+            def match(expr, u, allow_multiple_clients):
+                if expr.owner is None:
+                    return False
+                if (not (expr.owner.op == pattern_op) or
+                        (not allow_multiple_clients and
+                         len(expr.clients) > 1) or
+                        nb_inputs != len(expr.owner.inputs)):
+                    return retry_with_equiv(expr, u, allow_multiple_clients)
+                for sub_match, v in zip(sub_matches, expr.owner.inputs):
+                    u = sub_match(v, u, self.allow_multiple_clients)
+                    if not u:
+                        return False
+                return u
+        elif isinstance(pattern, dict):
+            try:
+                sub_match = self._compile(pattern['pattern'])
+            except KeyError:
+                raise KeyError(
+                    "Malformed pattern: %s (expected key 'pattern')"
+                    % pattern)
+            constraint = pattern.get('constraint', lambda expr: True)
+
+            def match(expr, u, allow_multiple_clients):
+                if constraint(expr):
+                    return sub_match(expr, u,
+                                     pattern.get('allow_multiple_clients',
+                                                 allow_multiple_clients))
+                return retry_with_equiv(expr, u, allow_multiple_clients)
+        elif isinstance(pattern, string_types):
+            v = unify.Var(pattern)
+
+            def match(expr, u, allow_multiple_clients):
+                if u[v] is not v and u[v] is not expr:
+                    return retry_with_equiv(expr, u, allow_multiple_clients)
+                return u.merge(expr, v)
+        elif isinstance(pattern, (integer_types, float)):
+            # theano.tensor is not always imported when the pattern is
+            # compiled, so the value is computed at the first attempt.
+            value = []
+
+            def match(expr, u, allow_multiple_clients):
+                if isinstance(expr, graph.Constant):
+                    if not value:
+                        value.append(theano.tensor.constant(pattern).value)
+                    if np.all(value[0] == expr.value):
+                        return u
+                return retry_with_equiv(expr, u, allow_multiple_clients)
+        elif isinstance(pattern, graph.Constant):
+            def match(expr, u, allow_multiple_clients):
+                if isinstance(expr, graph.Constant) and pattern.equals(expr):
+                    return u
+                return retry_with_equiv(expr, u, allow_multiple_clients)
+        else:
+            def match(expr, u, allow_multiple_clients):
+                return retry_with_equiv(expr, u, allow_multiple_clients)
+        return match
+
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        # The compiled matcher is made of closures, that can't be pickled.
+        d['_match'] = None
+        return d
+
     def __str__(self):
         if getattr(self, '__name__', None):
             return self.__name__
@@ -2132,6 +2205,8 @@ class TopoOptimizer(NavigatorOptimizer):
 
         callback_time = fgraph.execute_callbacks_time - callback_before
         nb_nodes_end = len(fgraph.apply_nodes)
+        if compiletrace.is_tracing():
+            compiletrace.annotate(**{str(self.local_opt): nb})
         return (self, nb, nb_nodes_start, nb_nodes_end,
                 io_t, loop_t, callback_time, self.local_opt)
 
@@ -2281,6 +2356,49 @@ class ChangeTracker:
         del fgraph.change_tracker
 
 
+class WorklistTracker:
+    """
+    Record the nodes that an EquilibriumOptimizer in worklist mode must
+    visit again: the nodes imported or whose inputs changed, with their
+    clients, and the nodes that gained or lost a client.
+
+    """
+    def __init__(self):
+        self.nodes = OrderedDict()
+
+    def add(self, node):
+        if not isinstance(node, string_types):
+            self.nodes[node] = None
+
+    def on_import(self, fgraph, node, reason):
+        self.add(node)
+
+    def on_prune(self, fgraph, node, reason):
+        for r in node.inputs:
+            if r.owner:
+                self.add(r.owner)
+
+    def on_change_input(self, fgraph, node, i, r, new_r, reason):
+        for var in (r, new_r):
+            if var.owner:
+                self.add(var.owner)
+        if not isinstance(node, string_types):
+            self.add(node)
+            # The patterns of the clients can look at the inputs of node.
+            for out in node.outputs:
+                for client, _ in getattr(out, 'clients', ()):
+                    self.add(client)
+
+    def pop_nodes(self, fgraph):
+        """
+        Return the recorded nodes that are still in fgraph, and forget them.
+
+        """
+        nodes = [node for node in self.nodes if node in fgraph.apply_nodes]
+        self.nodes = OrderedDict()
+        return nodes
+
+
 def merge_dict(d1, d2):
     """
     merge 2 dicts by adding the values.
@@ -2316,6 +2434,21 @@ class EquilibriumOptimizer(NavigatorOptimizer):
         They must not traverse the graph as they are called very frequently.
         The MergeOptimizer is one example of optimization that respect this.
         They are applied after all global optimizer, then when one local optimizer is applied, then after all final optimizer.
+    worklist
+        If True, only the first pass applies the local optimizers to all
+        the nodes. The next passes only visit the nodes that were imported
+        or whose inputs changed since the previous pass, their clients, and
+        the nodes that gained or lost a client. This is much faster on big
+        graphs, where the last passes change few nodes. As some local
+        optimizers look further than the neighbours of the node they are
+        applied to (e.g. the Canonizer looks at the whole mul/add tree),
+        a full pass is done when a worklist pass changes nothing, and the
+        worklist passes start again if it changes something. So the fixed
+        point is the same as without worklist.
+    stop_at_deadline
+        If True, no new pass is started once the time of
+        ``fgraph.optimization_deadline`` is passed. It is set by a
+        SeqOptimizer with a time budget.
 
     """
 
@@ -2326,7 +2459,9 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                  tracks_on_change_inputs=False,
                  max_use_ratio=None,
                  final_optimizers=None,
-                 cleanup_optimizers=None):
+                 cleanup_optimizers=None,
+                 worklist=False,
+                 stop_at_deadline=False):
         super(EquilibriumOptimizer, self).__init__(
             None,
             ignore_newtrees=ignore_newtrees,
@@ -2337,6 +2472,8 @@ class EquilibriumOptimizer(NavigatorOptimizer):
         self.final_optimizers = []
         self.cleanup_optimizers = []
         self.tracks_on_change_inputs = tracks_on_change_inputs
+        self.worklist = worklist
+        self.stop_at_deadline = stop_at_deadline
         for opt in optimizers:
             if isinstance(opt, LocalOptimizer):
                 if opt.tracks() is None:
@@ -2379,6 +2516,12 @@ class EquilibriumOptimizer(NavigatorOptimizer):
     def apply(self, fgraph, start_from=None):
         change_tracker = ChangeTracker()
         fgraph.attach_feature(change_tracker)
+        worklist_tracker = None
+        if getattr(self, 'worklist', False):
+            worklist_tracker = WorklistTracker()
+            fgraph.attach_feature(worklist_tracker)
+        # Whether the next pass visits all the nodes.
+        full_pass = True
         if start_from is None:
             start_from = fgraph.outputs
         else:
@@ -2392,6 +2535,9 @@ class EquilibriumOptimizer(NavigatorOptimizer):
         start_nb_nodes = len(fgraph.apply_nodes)
         max_nb_nodes = len(fgraph.apply_nodes)
         max_use = max_nb_nodes * self.max_use_ratio
+        track_map = dict(self.local_optimizers_map)
+        track_map[None] = self.local_optimizers_all
+        dispatch = OpDispatchTable(track_map, untracked_first=True)
 
         loop_timing = []
         loop_process_count = []
@@ -2465,7 +2611,13 @@ class EquilibriumOptimizer(NavigatorOptimizer):
 
             # apply local optimizer
             topo_t0 = time.time()
-            q = deque(graph.io_toposort(fgraph.inputs, start_from))
+            if worklist_tracker is not None and not full_pass:
+                # Only the nodes changed since the previous pass
+                q = deque(worklist_tracker.pop_nodes(fgraph))
+            else:
+                q = deque(graph.io_toposort(fgraph.inputs, start_from))
+                if worklist_tracker is not None:
+                    worklist_tracker.pop_nodes(fgraph)
             io_toposort_timing.append(time.time() - topo_t0)
 
             nb_nodes.append(len(q))
@@ -2490,9 +2642,7 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                     if node not in fgraph.apply_nodes:
                         continue
                     current_node = node
-                    for lopt in (self.local_optimizers_all +
-                                 self.local_optimizers_map.get(type(node.op), []) +
-                                 self.local_optimizers_map.get(node.op, [])):
+                    for lopt in dispatch[node.op]:
                         nb = change_tracker.nb_imported
                         t_opt = time.time()
                         lopt_change = self.process_node(fgraph, node, lopt)
@@ -2553,6 +2703,25 @@ class EquilibriumOptimizer(NavigatorOptimizer):
             loop_process_count.append(process_count)
             loop_timing.append(float(time.time() - t0))
 
+            deadline = getattr(fgraph, 'optimization_deadline', None)
+            if (changed and getattr(self, 'stop_at_deadline', False) and
+                    deadline is not None and time.time() > deadline):
+                _logger.info("EquilibriumOptimizer %s stopped after %d passes,"
+                             " the time budget is exhausted" % (
+                                 getattr(self, 'name', None),
+                                 len(loop_timing)))
+                break
+
+            if worklist_tracker is not None:
+                if not changed and not full_pass:
+                    # The worklist pass can miss the local optimizers that
+                    # look further than the neighbours of the changed
+                    # nodes: check the fixed point with a full pass.
+                    changed = True
+                    full_pass = True
+                else:
+                    full_pass = False
+
         end_nb_nodes = len(fgraph.apply_nodes)
 
         if max_use_abort:
@@ -2565,6 +2734,8 @@ class EquilibriumOptimizer(NavigatorOptimizer):
             else:
                 _logger.error(msg)
         fgraph.remove_feature(change_tracker)
+        if worklist_tracker is not None:
+            fgraph.remove_feature(worklist_tracker)
         assert len(loop_process_count) == len(loop_timing)
         assert len(loop_process_count) == len(global_opt_timing)
         assert len(loop_process_count) == len(nb_nodes)
@@ -2572,6 +2743,12 @@ class EquilibriumOptimizer(NavigatorOptimizer):
         assert len(loop_process_count) == len(global_sub_profs)
         assert len(loop_process_count) == len(final_sub_profs)
         assert len(loop_process_count) == len(cleanup_sub_profs)
+        if compiletrace.is_tracing():
+            # Number of applications of each optimizer that did something.
+            compiletrace.annotate(**dict(
+                (getattr(opt, 'name', None) or str(opt), count)
+                for opt, count in iteritems(global_process_count)
+                if count))
         return (self, loop_timing, loop_process_count,
                 (start_nb_nodes, end_nb_nodes, max_nb_nodes),
                 global_opt_timing, nb_nodes, time_opts, io_toposort_timing,
@@ -164,12 +164,20 @@ class Query(object):
     position_cutoff : float
         Used by SequenceDB to keep only optimizer that are positioned before
         the cut_off point.
+    time_budget : float or None
+        Time in seconds of the optimization of a graph. Once it is spent,
+        SequenceDB replaces the next optimizers by the ones of `fallback`,
+        and the EquilibriumDB stop after their current pass.
+    fallback : Query or None
+        The query of the optimizers still applied once the time budget is
+        exhausted. They must be enough to make the graph executable. If
+        None, all the next optimizers are skipped.
 
     """
 
     def __init__(self, include, require=None, exclude=None,
                  subquery=None, position_cutoff=float('inf'),
-                 extra_optimizations=None):
+                 extra_optimizations=None, time_budget=None, fallback=None):
         self.include = OrderedSet(include)
         self.require = require or OrderedSet()
         self.exclude = exclude or OrderedSet()
@@ -178,21 +186,30 @@ class Query(object):
         if extra_optimizations is None:
             extra_optimizations = []
         self.extra_optimizations = extra_optimizations
+        self.time_budget = time_budget
+        self.fallback = fallback
         if isinstance(self.require, (list, tuple)):
             self.require = OrderedSet(self.require)
         if isinstance(self.exclude, (list, tuple)):
             self.exclude = OrderedSet(self.exclude)
 
     def __str__(self):
-        return ("Query{inc=%s,ex=%s,require=%s,subquery=%s,"
-                "position_cutoff=%f,extra_opts=%s}" %
-                (self.include, self.exclude, self.require, self.subquery,
-                 self.position_cutoff, self.extra_optimizations))
+        s = ("Query{inc=%s,ex=%s,require=%s,subquery=%s,"
+             "position_cutoff=%f,extra_opts=%s" %
+             (self.include, self.exclude, self.require, self.subquery,
+              self.position_cutoff, self.extra_optimizations))
+        if self.time_budget is not None:
+            s += ",time_budget=%f,fallback=%s" % (self.time_budget,
+                                                  self.fallback)
+        return s + "}"
 
     def __setstate__(self, state):
         self.__dict__.update(state)
         if not hasattr(self, 'extra_optimizations'):
             self.extra_optimizations = []
+        if not hasattr(self, 'time_budget'):
+            self.time_budget = None
+            self.fallback = None
 
     # add all opt with this tag
     def including(self, *tags):
@@ -201,7 +218,9 @@ class Query(object):
                      self.exclude,
                      self.subquery,
                      self.position_cutoff,
-                     self.extra_optimizations)
+                     self.extra_optimizations,
+                     self.time_budget,
+                     self.fallback)
 
     # remove all opt with this tag
     def excluding(self, *tags):
@@ -210,7 +229,9 @@ class Query(object):
                      self.exclude.union(tags),
                      self.subquery,
                      self.position_cutoff,
-                     self.extra_optimizations)
+                     self.extra_optimizations,
+                     self.time_budget,
+                     self.fallback)
 
     # keep only opt with this tag.
     def requiring(self, *tags):
@@ -219,7 +240,9 @@ class Query(object):
                      self.exclude,
                      self.subquery,
                      self.position_cutoff,
-                     self.extra_optimizations)
+                     self.extra_optimizations,
+                     self.time_budget,
+                     self.fallback)
 
     def register(self, *optimizations):
         return Query(self.include,
@@ -227,7 +250,20 @@ class Query(object):
                      self.exclude,
                      self.subquery,
                      self.position_cutoff,
-                     self.extra_optimizations + list(optimizations))
+                     self.extra_optimizations + list(optimizations),
+                     self.time_budget,
+                     self.fallback)
+
+    # spend at most time_budget seconds, then only apply fallback
+    def budgeted(self, time_budget, fallback=None):
+        return Query(self.include,
+                     self.require,
+                     self.exclude,
+                     self.subquery,
+                     self.position_cutoff,
+                     self.extra_optimizations,
+                     time_budget,
+                     fallback)
 
 
 class EquilibriumDB(DB):
@@ -294,7 +330,11 @@ class EquilibriumDB(DB):
             tracks_on_change_inputs=self.tracks_on_change_inputs,
             failure_callback=opt.NavigatorOptimizer.warn_inplace,
             final_optimizers=final_opts,
-            cleanup_optimizers=cleanup_opts)
+            cleanup_optimizers=cleanup_opts,
+            worklist=config.optdb.worklist,
+            stop_at_deadline=(len(tags) >= 1 and
+                              getattr(tags[0], 'time_budget', None)
+                              is not None))
 
 
 class SequenceDB(DB):
@@ -373,6 +413,13 @@ class SequenceDB(DB):
         kwargs = {}
         if self.failure_callback:
             kwargs["failure_callback"] = self.failure_callback
+        time_budget = getattr(tags[0], 'time_budget', None)
+        if time_budget is not None:
+            kwargs["time_budget"] = time_budget
+            kwargs["fallback"] = {}
+            if tags[0].fallback is not None:
+                kwargs["fallback"] = dict(
+                    (o.name, o) for o in self.query(tags[0].fallback))
         ret = self.seq_opt(opts, **kwargs)
         if hasattr(tags[0], 'name'):
             ret.name = tags[0].name
@@ -1,5 +1,8 @@
 from __future__ import absolute_import, print_function, division
 from collections import defaultdict
+import heapq
+
+import numpy as np
 from six import iteritems
 from theano.gof.graph import list_of_nodes
 from theano.compat import cmp
@@ -274,3 +277,166 @@ def key_to_cmp(key):
     def key_cmp(a, b):
         return cmp(key(a), key(b))
     return key_cmp
+
+
+def estimate_size(var, dim=100):
+    """
+    Estimate the size in bytes of the value of a variable from its type.
+
+    The length of the dimensions that are not broadcastable is unknown
+    before the function is called, so they count as `dim`. Variables of
+    types without a dtype, like random states, count as empty.
+
+    """
+    dtype = getattr(var.type, 'dtype', None)
+    broadcastable = getattr(var.type, 'broadcastable', None)
+    if dtype is None or broadcastable is None:
+        return 0
+    size = np.dtype(dtype).itemsize
+    for b in broadcastable:
+        if not b:
+            size *= dim
+    return size
+
+
+def min_memory_order(fgraph, var_size=estimate_size):
+    """
+    Order the nodes of `fgraph` so that the allocated memory stays low.
+
+    Among the nodes that can run, this greedily runs the one that
+    increases the allocated memory the least: the size of the outputs it
+    allocates, minus the size of the buffers that are not needed after it.
+    Outputs that are views or that work inplace (see `view_map` and
+    `destroy_map`) allocate nothing, and they keep alive the buffer they
+    alias. Ties are broken by the order of `fgraph.toposort()`.
+
+    This is a heuristic for the peak memory that the memory profile of
+    `ProfileStats` minimizes by an exhaustive search. It runs in
+    O(n log n) for n nodes, so it scales to large graphs.
+
+    Parameters
+    ----------
+    fgraph : FunctionGraph
+        The graph to order. Its `orderings` are respected.
+    var_size
+        Function returning the size of a variable, in any unit.
+
+    Returns
+    -------
+    list
+        The nodes of `fgraph`.
+
+    """
+    toposort = fgraph.toposort()
+    position = dict((node, i) for i, node in enumerate(toposort))
+    orderings = fgraph.orderings()
+    successors = dict((node, []) for node in toposort)
+    n_predecessors = {}
+    for node in toposort:
+        predecessors = set(i.owner for i in node.inputs if i.owner)
+        predecessors.update(orderings.get(node, ()))
+        n_predecessors[node] = len(predecessors)
+        for p in predecessors:
+            successors[p].append(node)
+
+    # The buffer of a variable is the variable that allocated the memory
+    # it views or destroys.
+    buffer_of = {}
+    alloc = {}
+    for node in toposort:
+        aliased = {}
+        for omap in (getattr(node.op, 'destroy_map', {}),
+                     getattr(node.op, 'view_map', {})):
+            for o, i in iteritems(omap):
+                aliased[o] = node.inputs[i[0]]
+        alloc[node] = 0
+        for idx, out in enumerate(node.outputs):
+            if idx in aliased:
+                buffer_of[out] = buffer_of.get(aliased[idx], aliased[idx])
+            else:
+                alloc[node] += var_size(out)
+    # Buffers that are never freed: inputs, constants and outputs.
+    kept = set(buffer_of.get(o, o) for o in fgraph.outputs)
+    # The nodes that still have to read each buffer that can be freed.
+    users = {}
+    for var in fgraph.variables:
+        buf = buffer_of.get(var, var)
+        if buf.owner is None or buf in kept:
+            continue
+        readers = users.setdefault(buf, set())
+        for client, _ in var.clients:
+            if client != 'output':
+                readers.add(client)
+
+    def freed(node):
+        size = 0
+        for buf in set(buffer_of.get(i, i) for i in node.inputs):
+            if buf in users and users[buf] == set([node]):
+                size += var_size(buf)
+        # Outputs that nothing reads are freed right away.
+        for out in node.outputs:
+            if out in users and not users[out]:
+                size += var_size(out)
+        return size
+
+    score = {}
+    ready = []
+
+    def push(node):
+        s = alloc[node] - freed(node)
+        if score.get(node) != s:
+            score[node] = s
+            heapq.heappush(ready, (s, position[node], node))
+
+    for node in toposort:
+        if n_predecessors[node] == 0:
+            push(node)
+    order = []
+    done = set()
+    while ready:
+        s, _, node = heapq.heappop(ready)
+        if node in done or s != score[node]:
+            # Outdated entry, the node was pushed again with a new score.
+            continue
+        done.add(node)
+        order.append(node)
+        for buf in set(buffer_of.get(i, i) for i in node.inputs):
+            readers = users.get(buf)
+            if readers is None:
+                continue
+            readers.discard(node)
+            if len(readers) == 1:
+                # The last reader of the buffer now frees it.
+                last, = readers
+                if n_predecessors[last] == 0 and last not in done:
+                    push(last)
+        for succ in successors[node]:
+            n_predecessors[succ] -= 1
+            if n_predecessors[succ] == 0:
+                push(succ)
+    assert len(order) == len(toposort)
+    return order
+
+
+def memory_schedule_fn(var_size=estimate_size):
+    """
+    Make a schedule function that keeps the allocated memory low.
+
+    Use it with the linkers that accept a schedule, e.g.
+    ``VM_Linker(schedule=memory_schedule_fn())``. Combined with the
+    garbage collection of intermediate results (the Theano flag
+    ``allow_gc``), this lowers the peak memory of a function without
+    changing its graph.
+
+    See Also
+    --------
+    min_memory_order
+
+    """
+    def schedule(fgraph):
+        """
+        Order nodes in a FunctionGraph.
+
+        """
+        return min_memory_order(fgraph, var_size)
+    return schedule
@@ -301,6 +301,37 @@ def test_opwiseclinker_constant():
     assert res == 15.3
 
 
+def test_opwiseclinker_parallel_compile():
+    if not theano.config.cxx:
+        raise SkipTest("G++ not available, so we need to skip this test.")
+
+    class UnversionedAdd(Add):
+        # Unversioned, so that the modules are not already in the cache.
+        def c_code_cache_version(self):
+            return ()
+
+    x, y, z = inputs()
+    e = add(mul(x, y), UnversionedAdd()(div(x, y), bad_sub(y, z)))
+    g = Env([x, y, z], [e])
+    order = g.toposort()
+    storage_map = dict((v, [None]) for v in g.variables)
+    compute_map = dict((v, [v.owner is None]) for v in g.variables)
+    theano.gof.cc.precompile_cmodules(order, storage_map, compute_map,
+                                      n_jobs=2)
+    module_cache = theano.gof.cc.get_module_cache()
+    for node in order:
+        key = CLinker().accept(Env(node.inputs, node.outputs)).cmodule_key()
+        assert key in module_cache.entry_from_key
+
+    old_parallel_compile = theano.config.cmodule.parallel_compile
+    try:
+        theano.config.cmodule.parallel_compile = 0
+        fn = OpWiseCLinker().accept(g).make_function()
+    finally:
+        theano.config.cmodule.parallel_compile = old_parallel_compile
+    assert fn(2.0, 2.0, 2.0) == 5.0
+
+
 class MyExc(Exception):
     pass
 
@@ -386,6 +417,35 @@ def test_c_fail_error():
     assert 0  # test failed
 
 
+class MulNogil(Binary):
+    def c_code(self, node, name, inp, out, sub):
+        return "double %(name)s_tmp;" % locals()
+
+    def c_code_nogil(self, node, name, inp, out, sub):
+        x, y = inp
+        z, = out
+        assert 'fail' not in sub
+        return """%(name)s_tmp = %(x)s * %(y)s;
+            %(z)s = %(name)s_tmp;""" % locals()
+
+    def impl(self, x, y):
+        return x * y
+mul_nogil = MulNogil()
+
+
+def test_c_code_nogil():
+    if not theano.config.cxx:
+        raise SkipTest("G++ not available, so we need to skip this test.")
+    x, y, z = inputs()
+    e = add(mul_nogil(x, y), z)
+    lnk = CLinker().accept(Env([x, y, z], [e]))
+    code = lnk.code_gen()
+    assert code.count('Py_BEGIN_ALLOW_THREADS') == 1
+    assert code.count('Py_END_ALLOW_THREADS') == 1
+    fn = lnk.make_function()
+    assert fn(2.0, 3.0, 4.0) == 10.0
+
+
 def test_shared_input_output():
     # Test bug reported on the mailing list by Alberto Orlandi
     # https://groups.google.com/d/topic/theano-users/6dLaEqc2R6g/discussion
@@ -6,10 +6,18 @@ deterministic based on the input type and the op.
 """
 from __future__ import absolute_import, print_function, division
 
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+
+from nose.plugins.skip import SkipTest
 import numpy as np
 
 import theano
-from theano.gof.cmodule import GCC_compiler
+from theano.gof import compilelock
+from theano.gof.cmodule import GCC_compiler, ModuleCache
 
 
 class MyOp(theano.compile.ops.DeepCopyOp):
@@ -67,3 +75,104 @@ def test_flag_detection():
     # but was not detected because that path is not usually taken,
     # so we test it here directly.
     GCC_compiler.try_flags(["-lblas"])
+
+
+def _try_module_locks(module_hashes, results):
+    for module_hash in module_hashes:
+        with compilelock.try_module_lock_ctx(module_hash) as locked:
+            results.put((module_hash, locked))
+
+
+def test_module_lock():
+    # Processes and threads locking the same module exclude each other,
+    # not the ones locking different modules.
+    old_granularity = theano.config.compile.lock_granularity
+    theano.config.compile.lock_granularity = 'module'
+    try:
+        with compilelock.module_lock_ctx(['m_a', 'm_b']):
+            with compilelock.module_lock_ctx('m_a'):
+                lock_key = (threading.current_thread().ident, 'm_a')
+                assert compilelock._module_locks[lock_key][0] == 2
+            assert os.path.isdir(compilelock._module_lock_dir('m_a'))
+        assert not compilelock._module_locks
+        assert not os.path.exists(compilelock._module_lock_dir('m_a'))
+
+        with compilelock.module_lock_ctx('m_a'):
+            results = multiprocessing.Queue()
+            proc = multiprocessing.Process(target=_try_module_locks,
+                                           args=(['m_a', 'm_b'], results))
+            proc.start()
+            proc.join()
+            assert proc.exitcode == 0
+            assert results.get() == ('m_a', False)
+            assert results.get() == ('m_b', True)
+
+            results = multiprocessing.Queue()
+            thread = threading.Thread(target=_try_module_locks,
+                                      args=(['m_a', 'm_b'], results))
+            thread.start()
+            thread.join()
+            assert results.get() == ('m_a', False)
+            assert results.get() == ('m_b', True)
+        assert not os.path.exists(compilelock._module_lock_dir('m_b'))
+    finally:
+        theano.config.compile.lock_granularity = old_granularity
+
+
+def test_module_index():
+    # With an index, a new ModuleCache only loads the key file of the
+    # modules that are looked up.
+    if not theano.config.cxx:
+        raise SkipTest("Need cxx for this test")
+    x = theano.tensor.dvector('x')
+    fgraph = theano.gof.FunctionGraph([x], [theano.tensor.exp(x)])
+    linker = theano.gof.CLinker().accept(fgraph)
+    key = linker.cmodule_key()
+    assert key[0]
+
+    dirname = tempfile.mkdtemp()
+    old_index = theano.config.cmodule.index
+    theano.config.cmodule.index = True
+    try:
+        cache = ModuleCache(dirname)
+        assert os.path.exists(cache.index.path)
+        module = cache.module_from_key(key=key, lnk=linker)
+
+        other_cache = ModuleCache(dirname)
+        assert not other_cache.loaded_key_pkl
+        assert other_cache._get_from_key(key).__file__ == module.__file__
+        assert len(other_cache.loaded_key_pkl) == 1
+
+        # A corrupt index is rebuilt from the cache directory.
+        with open(cache.index.path, 'w') as f:
+            f.write('corrupt')
+        other_cache = ModuleCache(dirname)
+        assert len(other_cache.loaded_key_pkl) == 1
+        subdir = os.path.basename(os.path.dirname(module.__file__))
+        assert other_cache.index.subdirs() == [subdir]
+
+        # A key file that can not be unpickled when the index is rebuilt,
+        # e.g. because it refers to a module that is not imported yet, is
+        # read again by the next refresh.
+        key_pkl = os.path.join(os.path.dirname(module.__file__), 'key.pkl')
+        with open(key_pkl, 'rb') as f:
+            key_pkl_content = f.read()
+        with open(key_pkl, 'wb') as f:
+            f.write(b'cnot_imported_module\nOp\n.')
+        with open(cache.index.path, 'w') as f:
+            f.write('corrupt')
+        other_cache = ModuleCache(dirname)
+        assert not other_cache.loaded_key_pkl
+        assert other_cache.index.unindexed_subdirs() == [subdir]
+        with open(key_pkl, 'wb') as f:
+            f.write(key_pkl_content)
+        other_cache.refresh()
+        assert other_cache._get_from_key(key).__file__ == module.__file__
+        assert not other_cache.index.unindexed_subdirs()
+        # The appended entries are not read again by the next refresh.
+        n_entries = len(other_cache.index.entries)
+        other_cache.refresh()
+        assert len(other_cache.index.entries) == n_entries
+    finally:
+        theano.config.cmodule.index = old_index
+        shutil.rmtree(dirname)
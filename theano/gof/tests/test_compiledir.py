@@ -1,5 +1,14 @@
 from __future__ import absolute_import, print_function, division
+import os
+import shutil
+import tempfile
+
+from nose.plugins.skip import SkipTest
+
+import theano
 from theano.configdefaults import short_platform
+from theano.gof.cmodule import ModuleCache
+from theano.gof.compiledir import export_cache, import_cache
 
 
 def test_short_platform():
@@ -19,3 +28,30 @@ def test_short_platform():
     ]:
         o = short_platform(r, p)
         assert o == a, (o, a)
+
+
+def test_export_import_cache():
+    if not theano.config.cxx:
+        raise SkipTest("Need cxx for this test")
+    x = theano.tensor.dvector('x')
+    fgraph = theano.gof.FunctionGraph([x], [theano.tensor.exp(x)])
+    linker = theano.gof.CLinker().accept(fgraph)
+    key = linker.cmodule_key()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        src_dir = os.path.join(tmpdir, 'src')
+        dst_dir = os.path.join(tmpdir, 'dst')
+        archive = os.path.join(tmpdir, 'cache.tar.gz')
+        os.mkdir(src_dir)
+        os.mkdir(dst_dir)
+        ModuleCache(src_dir).module_from_key(key=key, lnk=linker)
+
+        assert export_cache(archive, compiledir=src_dir) == 1
+        assert import_cache(archive, compiledir=dst_dir) == 1
+        # The module is now found without compiling it.
+        assert ModuleCache(dst_dir)._get_from_key(key) is not None
+        # Modules already in the cache are not imported again.
+        assert import_cache(archive, compiledir=dst_dir) == 0
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,64 @@
+from __future__ import absolute_import, print_function, division
+import json
+import os
+import shutil
+import tempfile
+
+import theano
+import theano.tensor as T
+from theano.gof import compiletrace
+
+
+def _compile(name):
+    x = T.vector('x')
+    y = T.vector('y')
+    return theano.function([x, y], T.exp(x) * 2 + y, mode='FAST_RUN',
+                           name=name)
+
+
+def test_compile_trace():
+    dirname = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(dirname, 'trace.json')
+        with compiletrace.compile_trace(filename) as trace:
+            _compile('traced')
+        assert not compiletrace.is_tracing()
+        with open(filename) as f:
+            events = json.load(f)['traceEvents']
+        assert len(events) == len(trace.events)
+        assert all(e['ph'] == 'X' and e['dur'] >= 0 for e in events)
+        names = set(e['name'] for e in events)
+        for name in ['theano.function', 'clone graph', 'optimize', 'link']:
+            assert name in names, name
+        function, = [e for e in events if e['name'] == 'theano.function']
+        assert function['args']['name'] == 'traced'
+        assert any(e['cat'] == 'optimizer' and e['name'] != 'optimize'
+                   for e in events)
+        if theano.config.cxx:
+            lookups = [e for e in events if e['name'] == 'module_from_key']
+            assert lookups
+            assert all(e['args']['found'] in ('key', 'hash', 'compiled')
+                       for e in lookups)
+
+        # Nothing is recorded outside of the context.
+        n_events = len(trace.events)
+        _compile('not traced')
+        assert len(trace.events) == n_events
+    finally:
+        shutil.rmtree(dirname)
+
+
+def test_compile_trace_flag():
+    dirname = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(dirname, 'trace.json')
+        with theano.change_flags(**{'profiling.compile_trace': filename}):
+            _compile('f1')
+            _compile('f2')
+        with open(filename) as f:
+            events = json.load(f)['traceEvents']
+        names = [e['args']['name'] for e in events
+                 if e['name'] == 'theano.function']
+        assert 'f1' in names and 'f2' in names
+    finally:
+        shutil.rmtree(dirname)
@@ -492,3 +492,32 @@ def test_multiple_inplace():
     OpSubOptimizer(multiple_in_place_1, multiple_in_place_0_1, fail).optimize(g)
     consistent(g)
     assert fail.failures == 1
+
+
+def test_incremental_topo_order():
+    # After each successful validate, topo_order must be a topological
+    # order of the graph with the orderings of the destroyers.
+    x, y, z = inputs()
+    e = dot(sigmoid(add(x, y)), sigmoid(sigmoid(add(y, z))))
+    g = Env([x, y, z], [e, add(x, z)])
+    dh = g.destroy_handler
+
+    def check_order():
+        order = dh.topo_order
+        assert set(order) == g.apply_nodes
+        assert not dh.topo_pending
+        ords = dh.orderings(g, ordered=False)
+        for node in g.apply_nodes:
+            for prereq in [i.owner for i in node.inputs if i.owner]:
+                assert order[prereq] < order[node]
+            for prereq in ords.get(node, ()):
+                assert order[prereq] < order[node]
+
+    fail = FailureWatch()
+    OpSubOptimizer(add, add_in_place, fail).optimize(g)
+    consistent(g)
+    assert dh.destroyers
+    check_order()
+    OpSubOptimizer(sigmoid, transpose_view, fail).optimize(g)
+    consistent(g)
+    check_order()
@@ -1,8 +1,12 @@
 from __future__ import absolute_import, print_function, division
 import os
+import shutil
+import tempfile
+
 import numpy as np
 import theano
 import theano.tensor as T
+from theano.compile import optcache
 
 floatX = 'float32'
 
@@ -38,5 +42,90 @@ def test_graph_opt_caching():
     finally:
         theano.config.cache_optimizations = default
 
+
+def test_graph_opt_caching_shared_values():
+    # A graph loaded from the cache must use the shared variables of the
+    # function being compiled, not the ones of the function that saved it.
+    mode = theano.compile.mode.get_mode('FAST_RUN')
+    default = theano.config.cache_optimizations
+    try:
+        theano.config.cache_optimizations = True
+
+        def build(value):
+            a = T.fmatrix()
+            c = theano.shared(np.ones((3, 3), dtype=floatX) * value)
+            return theano.function([a], T.sum(T.exp(a) * c), mode=mode)
+
+        f1 = build(1)
+        f2 = build(2)
+        in1 = np.zeros((3, 3), dtype=floatX)
+        assert f1(in1) == 9
+        assert f2(in1) == 18
+
+        maker = f2.maker
+        fgraph, _ = theano.compile.function_module.std_fgraph(
+            maker.inputs, maker.outputs)
+        key = theano.gof.utils.hash_from_code(
+            optcache.graph_key(fgraph, maker.inputs) +
+            optcache.optimizer_key(mode))
+        assert os.path.exists(
+            optcache.get_optimized_graph_cache().path(key))
+    finally:
+        theano.config.cache_optimizations = default
+
+
+def test_graph_opt_caching_evict():
+    dirname = tempfile.mkdtemp()
+    try:
+        cache = optcache.OptimizedGraphCache(dirname)
+        x = T.vector()
+        fgraph = theano.gof.FunctionGraph([x], [T.exp(x)])
+        keys = ['aa01', 'aa02', 'bb03']
+        for i, key in enumerate(keys):
+            cache.save(key, fgraph)
+            os.utime(cache.path(key), (i, i))
+        size = os.path.getsize(cache.path(keys[0]))
+        # Loading a graph makes it the most recently used one.
+        assert cache.load(keys[0], fgraph) is not None
+        cache.evict(max_size=2 * size)
+        assert os.path.exists(cache.path(keys[0]))
+        assert not os.path.exists(cache.path(keys[1]))
+        assert os.path.exists(cache.path(keys[2]))
+    finally:
+        shutil.rmtree(dirname)
+
+
+def test_graph_opt_caching_evict_on_save():
+    # The directory is only walked when the size is unknown or when the
+    # estimated size goes past the limit.
+    walks = []
+
+    class Cache(optcache.OptimizedGraphCache):
+        def evict(self, max_size=None):
+            walks.append(max_size)
+            super(Cache, self).evict(max_size)
+
+    dirname = tempfile.mkdtemp()
+    try:
+        with theano.change_flags(cache_optimizations_max_size=1):
+            cache = Cache(dirname)
+            x = T.vector()
+            fgraph = theano.gof.FunctionGraph([x], [T.exp(x)])
+            cache.save('aa01', fgraph)
+            assert len(walks) == 1
+            size = os.path.getsize(cache.path('aa01'))
+            assert cache._size == size
+            cache.save('aa02', fgraph)
+            assert len(walks) == 1
+            assert cache._size == 2 * size
+            # Other processes filled the cache.
+            cache._size = 2 ** 20
+            cache.save('aa03', fgraph)
+            assert len(walks) == 2
+            assert cache._size == 3 * size
+    finally:
+        shutil.rmtree(dirname)
+
+
 if __name__ == '__main__':
     test_graph_opt_caching()
@@ -6,7 +6,8 @@ from theano.gof.op import Op
 from theano.gof.opt import (OpKeyOptimizer, PatternSub, TopoOptimizer, OpSub,
                             MergeOptimizer, config, theano,
                             EquilibriumOptimizer, logging, pre_constant_merge,
-                            pre_greedy_local_optimizer)
+                            pre_greedy_local_optimizer, OpDispatchTable,
+                            local_optimizer)
 from theano.gof.fg import FunctionGraph
 
 from theano import tensor as T
@@ -263,6 +264,22 @@ class TestPatternOptimizer:
         str_g = str(g)
         assert str_g == "[Op4(z, y)]"
 
+    def test_compiled_pattern(self):
+        # The pattern is compiled at the first attempt, then reused.
+        x, y, z = inputs()
+        sub = PatternSub((op1, (op2, '1', '2'), '3'), (op4, '3', '2'))
+        assert sub._match is None
+        g = FunctionGraph([x, y, z], [op1(op2(x, y), z)])
+        OpKeyOptimizer(sub).optimize(g)
+        assert str(g) == "[Op4(z, y)]"
+        match = sub._match
+        assert match is not None
+        g = FunctionGraph([x, y, z], [op1(op3(x, y), z)])
+        OpKeyOptimizer(sub).optimize(g)
+        assert str(g) == "[Op1(Op3(x, y), z)]"
+        assert sub._match is match
+        assert sub.__getstate__()['_match'] is None
+
 #     def test_multi_ingraph(self):
 #         # known to fail
 #         x, y, z = inputs()
@@ -295,6 +312,22 @@ class TestOpSubOptimizer:
         assert str(g) == "[Op1(Op2(x), Op4(y), Op4(z))]"
 
 
+class TestOpDispatchTable:
+
+    def test_order(self):
+        a, b, c, d = [MyOp(name) for name in 'abcd']
+        track_map = {MyOp: [a], op1: [b], op2: [c], None: [d]}
+        table = OpDispatchTable(track_map)
+        assert table[op1] == [a, b, d]
+        assert table[op3] == [a, d]
+        assert table[op3] is table[op3]
+        # Only the Op classes are cached.
+        assert list(table.cache) == [MyOp]
+        table = OpDispatchTable(track_map, untracked_first=True)
+        assert table[op2] == [d, a, c]
+        assert table[NoInputOp(1)] == [d]
+
+
 class NoInputOp(Op):
     __props__ = ('param',)
 
@@ -537,6 +570,25 @@ class TestMergeOptimizer:
                         if isinstance(n.op, NoInputOp)]
         assert len(no_input_ops) == 2, fg.apply_nodes
 
+    def test_node_table(self):
+        # Repeated subexpressions are merged, and the hash-cons table
+        # holds exactly the distinct nodes left in the graph.
+        x, y, z = inputs()
+        outs = []
+        for i in range(10):
+            e = op2(x, y)
+            for j in range(5):
+                e = op1(op3(e, z), op_y(e, x))
+            outs.append(e)
+        g = FunctionGraph([x, y, z], outs)
+        MergeOptimizer().optimize(g)
+        assert len(set(g.outputs)) == 1
+        assert len(g.apply_nodes) == 16
+        feature = g.merge_feature
+        assert set(feature.node_table.values()) == g.apply_nodes
+        for node, key in feature.node_key.items():
+            assert key == (node.op, tuple(id(i) for i in node.inputs))
+
 
 class TestEquilibrium(object):
 
@@ -595,6 +647,66 @@ class TestEquilibrium(object):
         # print 'after', g
         assert str(g) == '[Op1(x, y)]'
 
+    def test_worklist(self):
+        x, y, z = map(MyVariable, 'xyz')
+        for e in [op3(op4(x, y)),
+                  op1(op1(op3(x, y))),
+                  op3(op1(op4(op1(x, y), z))),
+                  op4(op3(op4(x, y)), op3(op2(op1(x, z), y)))]:
+            results = []
+            for worklist in [False, True]:
+                g = FunctionGraph([x, y, z], [e])
+                opt = EquilibriumOptimizer(
+                    [PatternSub((op1, 'x', 'y'), (op2, 'x', 'y')),
+                     PatternSub((op4, 'x', 'y'), (op1, 'x', 'y')),
+                     PatternSub((op3, (op2, 'x', 'y')), (op4, 'x', 'y'))
+                     ],
+                    max_use_ratio=10, worklist=worklist)
+                opt.optimize(g)
+                results.append(str(g))
+            assert results[0] == results[1], results
+
+    def test_worklist_fast_run(self):
+        x = T.dvector('x')
+        out = x
+        for i in range(20):
+            out = T.exp(T.log(out * 1 + 0)) * (i + 1) - T.neg(-out)
+        graphs = []
+        for worklist in [False, True]:
+            with theano.change_flags(**{'optdb.worklist': worklist}):
+                f = theano.function([x], out, mode='FAST_RUN')
+            graphs.append(theano.printing.debugprint(f, file='str'))
+        assert graphs[0] == graphs[1], graphs
+
+    def test_worklist_deep_canonize(self):
+        # The leaf of a mul tree is rewritten after the root was visited
+        # by the first pass. The Canonizer only simplifies the tree from
+        # its root, that is more than two nodes away from the leaf.
+        @local_optimizer([T.exp])
+        def local_exp_neg_log(node):
+            if node.op != T.exp:
+                return False
+            neg = node.inputs[0].owner
+            if neg is None or neg.op != T.neg:
+                return False
+            log = neg.inputs[0].owner
+            if log is None or log.op != T.log:
+                return False
+            return [T.inv(log.inputs[0])]
+
+        x, y, z, w = T.dvectors('xyzw')
+        e = (x * y) * (z * (w * T.exp(-T.log(x))))
+        results = []
+        for worklist in [False, True]:
+            g = FunctionGraph([x, y, z, w], [e])
+            opt = EquilibriumOptimizer(
+                [T.opt.local_mul_canonizer, local_exp_neg_log],
+                max_use_ratio=10, worklist=worklist)
+            opt.optimize(g)
+            results.append(theano.printing.debugprint(g.outputs, file='str'))
+        assert results[0] == results[1], results
+        assert 'inv' not in results[1], results[1]
+
 
 def test_pre_constant_merge_slice():
     ms = theano.tensor.type_other.MakeSlice()(1)
@@ -1,8 +1,11 @@
 from __future__ import absolute_import, print_function, division
+import time
 from unittest import TestCase
 
+from theano import tensor
 from theano.compat import exc_message
-from theano.gof.optdb import opt, DB
+from theano.gof.fg import FunctionGraph
+from theano.gof.optdb import opt, DB, Query, SequenceDB
 
 
 class Test_DB(TestCase):
@@ -55,3 +58,73 @@ class Test_DB(TestCase):
                 raise
         except Exception:
             self.fail()
+
+    def test_time_budget(self):
+
+        calls = []
+
+        class Opt(opt.Optimizer):
+            def __init__(self, duration=0):
+                self.duration = duration
+
+            def apply(self, fgraph):
+                calls.append(self.name)
+                time.sleep(self.duration)
+
+        db = SequenceDB()
+        db.register('a', Opt(0.05), 1, 'fast_run')
+        db.register('b', Opt(), 2, 'fast_run')
+        db.register('c', Opt(), 3, 'fast_run', 'fast_compile')
+        fast_run = Query(include=['fast_run'])
+        fallback = Query(include=['fast_compile'])
+        x = tensor.vector()
+        fgraph = FunctionGraph([x], [x * 2])
+
+        db.query(fast_run.budgeted(10, fallback)).optimize(fgraph)
+        self.assertEqual(calls, ['a', 'b', 'c'])
+        del calls[:]
+        # Once the budget is spent, only the fallback is applied.
+        db.query(fast_run.budgeted(0.01, fallback)).optimize(fgraph)
+        self.assertEqual(calls, ['a', 'c'])
+        del calls[:]
+        db.query(fast_run.budgeted(0.01)).optimize(fgraph)
+        self.assertEqual(calls, ['a'])
+        self.assertFalse(hasattr(fgraph, 'optimization_deadline'))
+
+    def test_time_budget_fallback(self):
+
+        calls = []
+
+        class Opt(opt.Optimizer):
+            def __init__(self, duration=0):
+                self.duration = duration
+
+            def apply(self, fgraph):
+                calls.append(self.name)
+                time.sleep(self.duration)
+                return [self.name]
+
+            @staticmethod
+            def merge_profile(prof1, prof2):
+                return prof1 + prof2
+
+        db = SequenceDB()
+        db.register('a', Opt(0.05), 1, 'fast_run', 'fast_compile')
+        db.register('b', Opt(), 2, 'fast_run')
+        fast_run = Query(include=['fast_run'])
+        fallback = Query(include=['fast_compile'])
+        x = tensor.vector()
+        fgraph = FunctionGraph([x], [x * 2])
+
+        # An optimizer that is its own fallback is not applied again when
+        # it overruns the budget.
+        budgeted = db.query(fast_run.budgeted(0.01, fallback))
+        prof = budgeted.optimize(fgraph)
+        self.assertEqual(calls, ['a'])
+        self.assertEqual(prof[6], [['a'], None])
+
+        # The profile of the skipped phase can be merged.
+        full_prof = db.query(fast_run).optimize(fgraph)
+        merged = budgeted.merge_profile(prof, full_prof)
+        sub_profs = dict(zip([o.name for o in merged[0]], merged[6]))
+        self.assertEqual(sub_profs, {'a': ['a', 'a'], 'b': ['b']})
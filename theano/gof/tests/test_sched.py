@@ -1,9 +1,15 @@
 from __future__ import absolute_import, print_function, division
+import numpy as np
+
+import theano
 from theano.gof.sched import (make_dependence_cmp, sort_apply_nodes,
-                              reverse_dict, _toposort, posort)
+                              reverse_dict, _toposort, posort,
+                              min_memory_order, memory_schedule_fn)
 
 from theano import tensor
+from theano.gof.fg import FunctionGraph
 from theano.gof.graph import io_toposort
+from theano.gof.vm import VM_Linker
 from theano.compat import cmp
 
 
@@ -68,3 +74,26 @@ def test_posort():
             lambda a, b: a - b]
     assert (posort(l, *cmps) ==
             [10, 1, 11, 2, 12, 3, 13, 4, 14, 5, 15, 6, 16, 7, 17, 8, 18, 9, 19])
+
+
+def test_min_memory_order():
+    x = tensor.vector('x')
+    # Two independent chains that each allocate a large matrix and reduce
+    # it. Running a chain completely before the other one halves the peak.
+    a = tensor.outer(x, x).sum()
+    b = tensor.outer(x + 1, x).sum()
+    fgraph = FunctionGraph([x], [a + b])
+    order = min_memory_order(fgraph)
+    assert set(order) == set(fgraph.apply_nodes)
+    for i, node in enumerate(order):
+        for inp in node.inputs:
+            assert inp.owner is None or inp.owner in order[:i]
+    for reduction in (a.owner, b.owner):
+        # Each matrix is reduced as soon as it is computed.
+        outer = reduction.inputs[0].owner
+        assert order.index(reduction) == order.index(outer) + 1
+
+    linker = VM_Linker(schedule=memory_schedule_fn())
+    f = theano.function([x], a + b, mode=theano.Mode(linker=linker))
+    v = np.arange(3).astype(theano.config.floatX)
+    assert np.allclose(f(v), np.outer(v, v).sum() + np.outer(v + 1, v).sum())
@@ -453,3 +453,110 @@ def test_no_recycling():
         m1 = f.fn.thunks[0].thunk.module
         m2 = f2.fn.thunks[0].thunk.module
         assert m1 is m2
+
+
+def test_tiered_linker():
+    if not theano.config.cxx:
+        raise SkipTest('G++ not available, so we need to skip this test.')
+    x = tensor.dvector('x')
+    # Use a new constant, so that the module of the fused Elemwise is not in
+    # the cache yet.
+    c = 1.5 + (time.time() % 1)
+    linker = vm.VM_Linker(tiered=True, use_cloop=True)
+    f = function([x], tensor.exp(x) * c + 1,
+                 mode=Mode(linker=linker, optimizer='fast_run'))
+    assert isinstance(f.fn, (vm.Loop, vm.LoopGC, vm.Stack))
+    v = np.arange(4.)
+    expected = np.exp(v) * c + 1
+    # The function can be called while the C code is compiled.
+    assert np.allclose(f(v), expected)
+
+    vm.wait_tiered_compilation()
+    node_thunks = [(node, thunk)
+                   for node, thunk in zip(f.fn.nodes, f.fn.thunks)
+                   if isinstance(node.op, tensor.Elemwise)]
+    assert node_thunks
+    assert all(hasattr(thunk, 'cthunk') for node, thunk in node_thunks)
+    assert np.allclose(f(v), expected)
+
+
+def test_parallel_vm():
+    x = tensor.dmatrix('x')
+    # Independent branches, joined at the end.
+    branches = [tensor.tanh(tensor.dot(x, x) * i).sum() for i in range(4)]
+    out = sum(branches)
+    v = np.random.rand(20, 20)
+    f_ref = function([x], out)
+    for allow_gc in (True, False):
+        linker = vm.VM_Linker(parallel=True, allow_gc=allow_gc)
+        f = function([x], out, mode=Mode(linker=linker,
+                                         optimizer='fast_run'))
+        assert isinstance(f.fn, vm.Parallel)
+        for i in range(3):
+            assert np.allclose(f(v), f_ref(v))
+
+
+def test_parallel_vm_inplace():
+    # The nodes reading x must run before the one destroying it.
+    x = tensor.dvector('x')
+    z = x + 1
+    out = [tensor.exp(z), tensor.log(z), z * 2]
+    linker = vm.VM_Linker(parallel=True)
+    f = function([x], out, mode=Mode(linker=linker, optimizer='fast_run'))
+    assert isinstance(f.fn, vm.Parallel)
+    v = np.arange(1., 5.)
+    for a, b in zip(f(v), [np.exp(v + 1), np.log(v + 1), (v + 1) * 2]):
+        assert np.allclose(a, b)
+
+
+def test_parallel_vm_error():
+    x = tensor.dvector('x')
+    y = tensor.dvector('y')
+    linker = vm.VM_Linker(parallel=True)
+    f = function([x, y], [x + y, tensor.exp(x)],
+                 mode=Mode(linker=linker, optimizer='fast_run'))
+    try:
+        f(np.ones(3), np.ones(4))
+    except ValueError:
+        pass
+    else:
+        assert False
+    # The function still works after an error.
+    assert np.allclose(f(np.ones(3), np.ones(3))[0], 2)
+
+
+def test_plan_arena():
+    intervals = {'a': (0, 2), 'b': (1, 3), 'c': (3, 4), 'd': (4, 5),
+                 'e': (0, 5)}
+    sizes = {'a': 100, 'b': 64, 'c': 200, 'd': 10, 'e': 1}
+    offsets, total = vm.plan_arena(intervals, sizes)
+    assert all(o % 64 == 0 for o in offsets.values())
+    for k1 in sizes:
+        for k2 in sizes:
+            if k1 < k2 and (intervals[k1][0] <= intervals[k2][1] and
+                            intervals[k2][0] <= intervals[k1][1]):
+                assert (offsets[k1] + sizes[k1] <= offsets[k2] or
+                        offsets[k2] + sizes[k2] <= offsets[k1]), (k1, k2)
+        assert offsets[k1] + sizes[k1] <= total
+    # a and c, then a and d, do not live at the same time.
+    assert total < sum(-(-s // 64) * 64 for s in sizes.values())
+
+
+def test_arena_vm():
+    x = tensor.dmatrix('x')
+    y = tensor.exp(x)
+    z = tensor.tanh(y * 2) + tensor.sqrt(y)
+    out = [tensor.dot(z, z.T).sum(), tensor.log(y + 1)]
+    f_ref = function([x], out)
+    for allow_gc in (True, False):
+        linker = vm.VM_Linker(arena=True, allow_gc=allow_gc)
+        f = function([x], out, mode=Mode(linker=linker,
+                                         optimizer='fast_run'))
+        assert isinstance(f.fn, vm.ArenaLoop)
+        # The shape changes at the fourth call.
+        for shape in [(5, 4)] * 3 + [(3, 7)] * 2:
+            v = np.random.rand(*shape)
+            for a, b in zip(f(v), f_ref(v)):
+                assert np.allclose(a, b)
+            assert f.fn.arena is not None
+        assert f.fn.input_shapes == [(3, 7)]
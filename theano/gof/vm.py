@@ -7,19 +7,30 @@ VM was a better name at some point.
 """
 from __future__ import absolute_import, print_function, division
 
-from . import link
+from . import link, utils
 from collections import defaultdict
 import logging
+import multiprocessing
 import sys
+import threading
 import time
 import warnings
+import weakref
+
+import numpy as np
 
 from theano.configparser import (config, _config_var_list)
 
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
 import theano.gof.cmodule
 
-from six import iteritems, itervalues
-from six.moves import xrange
+from six import get_unbound_function, iteritems, itervalues
+from six.moves import queue, xrange
 
 logger = logging.getLogger(__name__)
 
@@ -113,6 +124,94 @@ def calculate_reallocate_info(order, fgraph, storage_map, compute_map_re,
     return reallocated_info
 
 
+def calculate_live_intervals(order, fgraph):
+    """
+    Return the live intervals of the intermediate results of a graph.
+
+    Parameters
+    ----------
+    order
+        The nodes of `fgraph`, in the order they run.
+    fgraph
+        The FunctionGraph of the nodes.
+
+    Returns
+    -------
+    dict
+        {variable: [first, last]}, where `first` is the index in `order` of
+        the node computing the variable and `last` the index of the last
+        node that reads it, or a view of it. Only the variables that
+        allocate their memory are included: not the outputs of views or
+        inplace ops, and not the variables aliased by an output of
+        `fgraph`, whose memory must outlive the call.
+
+    """
+    buffer_of = {}
+    intervals = {}
+    for i, node in enumerate(order):
+        for inp in node.inputs:
+            buf = buffer_of.get(inp, inp)
+            if buf in intervals:
+                intervals[buf][1] = i
+        aliased = {}
+        for omap in (getattr(node.op, 'destroy_map', {}),
+                     getattr(node.op, 'view_map', {})):
+            for o, ins in iteritems(omap):
+                aliased[o] = node.inputs[ins[0]]
+        for idx, out in enumerate(node.outputs):
+            if idx in aliased:
+                buffer_of[out] = buffer_of.get(aliased[idx], aliased[idx])
+            else:
+                intervals[out] = [i, i]
+    for out in fgraph.outputs:
+        intervals.pop(buffer_of.get(out, out), None)
+    return intervals
+
+
+def plan_arena(intervals, sizes, alignment=64):
+    """
+    Place buffers in an arena so that buffers live at the same time do not
+    overlap.
+
+    The buffers are placed by decreasing size, each one at the lowest
+    offset that does not overlap the buffers already placed whose live
+    interval intersects its own.
+
+    Parameters
+    ----------
+    intervals
+        {key: (first, last)}, the live interval of each buffer, bounds
+        included.
+    sizes
+        {key: number of bytes}, for the buffers to place.
+    alignment
+        The offsets are multiples of it.
+
+    Returns
+    -------
+    (offsets, total)
+        {key: offset} and the size in bytes of the arena.
+
+    """
+    placed = []
+    offsets = {}
+    total = 0
+    for key in sorted(sizes, key=lambda k: (-sizes[k], intervals[k])):
+        size = -(-sizes[key] // alignment) * alignment
+        first, last = intervals[key]
+        offset = 0
+        for start, end in sorted((start, end)
+                                 for start, end, f, l in placed
+                                 if f <= last and first <= l):
+            if offset + size <= start:
+                break
+            offset = max(offset, end)
+        offsets[key] = offset
+        placed.append((offset, offset + size, first, last))
+        total = max(total, offset + size)
+    return offsets, total
+
+
 class VM(object):
     """
     A VM object's __call__ method evaluates a Theano program.
@@ -218,6 +317,11 @@ class VM(object):
         if hasattr(self, 'dependencies'):
             profile.dependencies = self.dependencies
 
+        if getattr(self, 'track_allocations', False):
+            profile.node_alloc_bytes = self.node_alloc_bytes.copy()
+            profile.node_alloc_peak = self.node_alloc_peak.copy()
+            profile.traced_peak_memory = self.traced_peak_memory
+
         # clear the timer info out of the buffers
         for i in xrange(len(self.call_times)):
             self.call_times[i] = 0.0
@@ -304,6 +408,287 @@ class LoopGC(VM):
                 link.raise_with_op(node, thunk)
 
 
+class ArenaLoop(VM):
+    """
+    Unconditional start-to-finish program execution in Python, with the
+    intermediate results preallocated in an arena.
+
+    The first call, and the calls where the shapes of the inputs changed,
+    keep all the intermediate results until the end, record their shapes,
+    and place them in one preallocated array, the arena, with `plan_arena`.
+    The results whose live intervals do not intersect share memory. The
+    other calls give the nodes views of the arena as preallocated outputs,
+    that the C code of most ops fills instead of allocating a new array.
+
+    The results that an op does not compute in its preallocated output,
+    e.g. because their shape changed or because the op has no C code, are
+    allocated as usual, so the plan never changes the results.
+
+    Parameters
+    ----------
+    post_thunk_clear
+        As for `LoopGC`, or None to keep the intermediate results.
+    storage_map
+        The storage of the variables of `fgraph`.
+
+    """
+
+    def __init__(self, nodes, thunks, pre_call_clear, post_thunk_clear,
+                 storage_map, fgraph):
+        super(ArenaLoop, self).__init__(nodes, thunks, pre_call_clear)
+        self.post_thunk_clear = post_thunk_clear
+        # Some other part of Theano query that information
+        self.allow_gc = post_thunk_clear is not None
+        self.input_storage = [storage_map[v] for v in fgraph.inputs]
+        no_recycling = set(id(s) for s in pre_call_clear)
+        self.intervals = dict(
+            (var, interval) for var, interval in
+            iteritems(calculate_live_intervals(nodes, fgraph))
+            if id(storage_map[var]) not in no_recycling)
+        self.storage_map = storage_map
+        # Shapes of the inputs when the arena was planned.
+        self.input_shapes = None
+        self.arena = None
+        # [(storage, view of the arena)]
+        self.arena_views = []
+
+    def plan(self):
+        """
+        Place in the arena the intermediate results of the last call.
+
+        """
+        sizes = {}
+        for var in self.intervals:
+            value = self.storage_map[var][0]
+            if type(value) is np.ndarray and value.nbytes:
+                sizes[var] = value.nbytes
+        offsets, total = plan_arena(self.intervals, sizes)
+        if self.arena is None or self.arena.size < total:
+            self.arena = np.empty(total, dtype='uint8')
+        self.arena_views = []
+        for var, offset in iteritems(offsets):
+            value = self.storage_map[var][0]
+            view = self.arena[offset:offset + value.nbytes]
+            self.arena_views.append((self.storage_map[var],
+                                     view.view(value.dtype).reshape(
+                                         value.shape)))
+
+    def __call__(self):
+        input_shapes = [getattr(s[0], 'shape', None)
+                        for s in self.input_storage]
+        planned = input_shapes == self.input_shapes
+        for cont in self.pre_call_clear:
+            cont[0] = None
+        if planned:
+            for storage, view in self.arena_views:
+                storage[0] = view
+        clear = self.allow_gc and planned
+        try:
+            for i, (thunk, node) in enumerate(zip(self.thunks, self.nodes)):
+                if self.time_thunks:
+                    t0 = time.time()
+                    thunk()
+                    self.call_counts[i] += 1
+                    self.call_times[i] += time.time() - t0
+                else:
+                    thunk()
+                if clear:
+                    for old_s in self.post_thunk_clear[i]:
+                        old_s[0] = None
+        except:
+            link.raise_with_op(node, thunk)
+        if not planned:
+            self.plan()
+            self.input_shapes = input_shapes
+            if self.allow_gc:
+                for old_storage in self.post_thunk_clear:
+                    for old_s in old_storage:
+                        old_s[0] = None
+
+
+class _ThunkPool(object):
+    """
+    Worker threads running the thunks of the Parallel VMs.
+
+    The pool is shared by all the Parallel VMs of the process. A task is a
+    tuple (done, idx, thunk, time_thunks): the thunk is called, then
+    (idx, exc_info, duration) is put in the queue `done`, where exc_info is
+    None if the thunk succeeded.
+
+    """
+
+    def __init__(self):
+        self.tasks = queue.Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def start(self, n_threads):
+        with self.lock:
+            self.threads = [t for t in self.threads if t.is_alive()]
+            for i in xrange(len(self.threads), n_threads):
+                thread = threading.Thread(target=self.run,
+                                          name='theano_vm_%i' % i)
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+
+    def run(self):
+        while True:
+            self.run_task(self.tasks.get())
+
+    @staticmethod
+    def run_task(task):
+        done, idx, thunk, time_thunks = task
+        t0 = time.time() if time_thunks else 0
+        try:
+            thunk()
+        except Exception:
+            done.put((idx, sys.exc_info(), 0))
+        else:
+            done.put((idx, None, time.time() - t0 if time_thunks else 0))
+
+    def help_until_done(self, done):
+        """
+        Return the next result of `done`, running the pending tasks of the
+        pool while waiting. This way, a VM called from a worker thread, e.g.
+        by the thunk of a Scan, can not wait on tasks that no thread runs.
+
+        """
+        while True:
+            try:
+                return done.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                task = self.tasks.get_nowait()
+            except queue.Empty:
+                return done.get()
+            self.run_task(task)
+
+
+_thunk_pool = _ThunkPool()
+
+
+class Parallel(VM):
+    """
+    Execute the thunks of independent nodes concurrently, on a pool of
+    threads.
+
+    A node is submitted to the pool as soon as the nodes computing its
+    inputs and the nodes that must run before it (e.g. the other clients of
+    an input it destroys, see `FunctionGraph.orderings`) are done. The
+    calling thread schedules the nodes, and runs pending tasks while it
+    waits for them.
+
+    Lazy thunks are not supported. The thunks run concurrently only if they
+    release the GIL: most NumPy functions do, and the C thunks of the ops
+    that declare `c_nogil`.
+
+    Parameters
+    ----------
+    nodes
+        A list of nodes in toposort order.
+    thunks
+        A list of thunks to execute those nodes, in toposort order.
+    pre_call_clear
+        A list of containers to empty at the beginning of each call.
+    storage_map
+        The storage of the variables.
+    fgraph
+        The FunctionGraph of the nodes.
+    allow_gc
+        If True, the storage of an intermediate result is cleared once all
+        its clients are done.
+    n_threads
+        Number of worker threads. 0 means one per CPU.
+
+    """
+
+    def __init__(self, nodes, thunks, pre_call_clear, storage_map, fgraph,
+                 allow_gc, n_threads):
+        super(Parallel, self).__init__(nodes, thunks, pre_call_clear)
+        self.allow_gc = allow_gc
+        if n_threads == 0:
+            n_threads = multiprocessing.cpu_count()
+        self.n_threads = n_threads
+
+        node_idx = dict((node, i) for i, node in enumerate(nodes))
+        ords = fgraph.orderings()
+        # successors[i]: indices of the nodes waiting on node i.
+        self.successors = [[] for node in nodes]
+        self.n_predecessors = []
+        for i, node in enumerate(nodes):
+            predecessors = set(node_idx[v.owner] for v in node.inputs
+                               if v.owner in node_idx)
+            predecessors.update(node_idx[p] for p in ords.get(node, []))
+            for p in predecessors:
+                self.successors[p].append(i)
+            self.n_predecessors.append(len(predecessors))
+        self.initial = [i for i, n in enumerate(self.n_predecessors)
+                        if n == 0]
+
+        # gc_inputs[i]: (storage, index in n_clients) of the intermediate
+        # results used by node i, cleared when they have no client left.
+        self.gc_inputs = [[] for node in nodes]
+        self.n_clients = []
+        if allow_gc:
+            gc_idx = {}
+            for i, node in enumerate(nodes):
+                for v in set(node.inputs):
+                    if v.owner not in node_idx or v in fgraph.outputs:
+                        continue
+                    if v not in gc_idx:
+                        gc_idx[v] = len(self.n_clients)
+                        self.n_clients.append(0)
+                    self.n_clients[gc_idx[v]] += 1
+                    self.gc_inputs[i].append((storage_map[v], gc_idx[v]))
+
+    def __call__(self):
+        for cont in self.pre_call_clear:
+            cont[0] = None
+        _thunk_pool.start(self.n_threads)
+        tasks = _thunk_pool.tasks
+        done = queue.Queue()
+        time_thunks = self.time_thunks
+        thunks = self.thunks
+        successors = self.successors
+        gc_inputs = self.gc_inputs
+        n_predecessors = list(self.n_predecessors)
+        n_clients = list(self.n_clients)
+        for i in self.initial:
+            tasks.put((done, i, thunks[i], time_thunks))
+        pending = len(self.initial)
+        remaining = len(self.nodes)
+        error = None
+        while pending:
+            i, exc_info, dt = _thunk_pool.help_until_done(done)
+            pending -= 1
+            remaining -= 1
+            if exc_info is not None:
+                if error is None:
+                    error = (i, exc_info)
+                continue
+            if time_thunks:
+                self.call_counts[i] += 1
+                self.call_times[i] += dt
+            for storage, c in gc_inputs[i]:
+                n_clients[c] -= 1
+                if n_clients[c] == 0:
+                    storage[0] = None
+            if error is not None:
+                # Let the running nodes finish, but start no new one.
+                continue
+            for s in successors[i]:
+                n_predecessors[s] -= 1
+                if n_predecessors[s] == 0:
+                    tasks.put((done, s, thunks[s], time_thunks))
+                    pending += 1
+        if error is not None:
+            i, exc_info = error
+            link.raise_with_op(self.nodes[i], thunks[i], exc_info)
+        assert remaining == 0
+
+
 class Stack(VM):
     """
     Finish-to-start evalution order of thunks.
@@ -344,6 +729,18 @@ class Stack(VM):
         self.variable_shape = {}  # Variable -> shape
         self.variable_strides = {}  # Variable -> strides
         self.variable_offset = {}  # Variable -> offset
+        self.node_alloc_bytes = {}  # Apply -> bytes allocated and kept
+        self.node_alloc_peak = {}  # Apply -> peak of the bytes allocated
+        self.traced_peak_memory = 0
+        self.track_allocations = False
+        if config.profile_memory and config.profiling.track_allocations:
+            if getattr(tracemalloc, 'reset_peak', None) is None:
+                warnings.warn('profiling.track_allocations needs the '
+                              'tracemalloc module of Python 3.9 or later.')
+            else:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                self.track_allocations = True
         self.compute_map = compute_map
         self.node_idx = node_idx = {}
         self.callback = callback
@@ -387,6 +784,9 @@ class Stack(VM):
 
         """
         idx = self.node_idx[node]
+        if self.track_allocations:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
         t0 = time.time()
         rval = self.thunks[idx]()
         self.node_executed_order.append(node)
@@ -396,6 +796,15 @@ class Stack(VM):
         # Profile output looks buggy if a node has run but takes 0 time.
         # (and profile code might hide real bugs if it rounds up 0)
         dt = max(time.time() - t0, 1e-10)
+        if self.track_allocations:
+            # NumPy reports the allocations of the data of its arrays to
+            # tracemalloc, also when they are done by the C code of an op.
+            current, peak = tracemalloc.get_traced_memory()
+            self.node_alloc_bytes[node] = max(
+                self.node_alloc_bytes.get(node, 0), current - before)
+            self.node_alloc_peak[node] = max(
+                self.node_alloc_peak.get(node, 0), peak - before)
+            self.traced_peak_memory = max(self.traced_peak_memory, peak)
         if self.callback is not None:
             self.callback(
                 node=node,
@@ -689,6 +1098,89 @@ except (OSError, theano.gof.cmodule.MissingGXX) as e:
     pass
 
 
+class _TieredCompiler(object):
+    """
+    Background thread building the C thunks of the tiered VMs.
+
+    Each job replaces, in the `thunks` list of a VM, the Python thunks of
+    some nodes by C thunks. As the Python VMs fetch their thunks from that
+    list at each call, the next calls use the C code.
+
+    """
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, vm, indices, storage_map, compute_map):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='theano_tiered_compilation')
+                self.thread.daemon = True
+                self.thread.start()
+        # Do not keep alive the VM of a function that is deleted before its
+        # C thunks are built.
+        self.jobs.put((weakref.ref(vm), indices, storage_map, compute_map))
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                self.build_c_thunks(*job)
+            except Exception:
+                logger.exception('Background compilation failed, the '
+                                 'Python thunks will be kept')
+            finally:
+                self.jobs.task_done()
+
+    def build_c_thunks(self, vm_ref, indices, storage_map, compute_map):
+        vm = vm_ref()
+        if vm is None:
+            return
+        nodes = [vm.nodes[i] for i in indices]
+        del vm
+        theano.gof.cc.precompile_cmodules(nodes, storage_map, compute_map)
+        for i, node in zip(indices, nodes):
+            try:
+                thunk = node.op.make_thunk(node, storage_map, compute_map,
+                                           [], impl='c')
+            except (NotImplementedError, utils.MethodNotDefined) as e:
+                logger.debug('No C thunk for %s: %s', node, e)
+                continue
+            thunk.lazy = False
+            thunk.inputs = [storage_map[v] for v in node.inputs]
+            thunk.outputs = [storage_map[v] for v in node.outputs]
+            vm = vm_ref()
+            if vm is None:
+                return
+            # Assigning a list element is atomic, a concurrent call of the
+            # VM runs either the Python or the C thunk.
+            vm.thunks[i] = thunk
+            del vm
+
+    def wait(self):
+        self.jobs.join()
+
+
+_tiered_compiler = _TieredCompiler()
+
+
+def wait_tiered_compilation():
+    """
+    Block until the background compilation of all the functions linked
+    with a tiered VM_Linker is finished.
+
+    """
+    _tiered_compiler.wait()
+
+
+def _has_perform(op):
+    return (get_unbound_function(type(op).perform) is not
+            get_unbound_function(theano.gof.op.PureOp.perform))
+
+
 class VM_Linker(link.LocalLinker):
     """
     Class that satisfies the Linker interface by acting as a VM factory.
@@ -723,12 +1215,29 @@ class VM_Linker(link.LocalLinker):
     allow_partial_eval
         If True, enforces usage of Stack or CVM, to allow for partial
         evaluation of functions (calculating a subset of outputs).
+    tiered
+        If True, the nodes whose C module is not in the cache start with a
+        Python thunk, so that the function can be called without waiting
+        for the C compilation. Their C thunks are built by a background
+        thread, and replace the Python thunks when they are ready. The C
+        VM is not used, as it can not swap thunks. See
+        `wait_tiered_compilation`.
+    parallel
+        If True, use the Parallel VM, that runs the independent nodes
+        concurrently on the number of threads given by the Theano flag
+        vm.parallel_threads. It is not used for lazy graphs, callbacks and
+        partial evaluation.
+    arena
+        If True, use the ArenaLoop VM, that preallocates the intermediate
+        results in one array planned from their live intervals. It is not
+        used for lazy graphs, callbacks and partial evaluation.
 
     """
 
     def __init__(self, allow_gc=None, use_cloop=False, callback=None,
                  callback_input=None, lazy=None, schedule=None,
-                 c_thunks=None, allow_partial_eval=None):
+                 c_thunks=None, allow_partial_eval=None, tiered=False,
+                 parallel=False, arena=False):
         # Note: if more parameters are added to __init__, make sure to forward
         # them in the "type(self)(...)" call in the "accept" method below.
         if allow_gc is None:
@@ -743,6 +1252,9 @@ class VM_Linker(link.LocalLinker):
             c_thunks = bool(theano.config.cxx)
         self.c_thunks = c_thunks
         self.allow_partial_eval = allow_partial_eval
+        self.tiered = tiered
+        self.parallel = parallel
+        self.arena = arena
         self.updated_vars = {}
         if schedule:
             self.schedule = schedule
@@ -805,7 +1317,10 @@ class VM_Linker(link.LocalLinker):
                 lazy=self.lazy,
                 schedule=self.schedule,
                 c_thunks=self.c_thunks,
-                allow_partial_eval=self.allow_partial_eval
+                allow_partial_eval=self.allow_partial_eval,
+                tiered=self.tiered,
+                parallel=self.parallel,
+                arena=self.arena
             ).accept(fgraph, no_recycling, profile)
         self.fgraph = fgraph
         self.no_recycling = no_recycling
@@ -898,7 +1413,16 @@ class VM_Linker(link.LocalLinker):
                 dependencies=deps,
                 callback=self.callback,
                 callback_input=self.callback_input)
-        elif self.use_cloop:
+        elif (self.arena and
+                not any(th.lazy for th in thunks)):
+            vm = ArenaLoop(nodes, thunks, pre_call_clear, post_thunk_clear,
+                           storage_map, self.fgraph)
+        elif (self.parallel and
+                not any(th.lazy for th in thunks)):
+            vm = Parallel(nodes, thunks, pre_call_clear, storage_map,
+                          self.fgraph, self.allow_gc,
+                          config.vm.parallel_threads)
+        elif self.use_cloop and not self.tiered:
             # create a map from nodes to ints and vars to ints
             nodes_idx = {}
             vars_idx = {}
@@ -1069,11 +1593,22 @@ class VM_Linker(link.LocalLinker):
         t0 = time.time()
         linker_make_thunk_time = {}
         impl = None
+        # Indices of the nodes whose C thunk is built in the background.
+        tiered = []
         if self.c_thunks is False:
             impl = 'py'
+        elif not self.tiered:
+            theano.gof.cc.precompile_cmodules(order, storage_map, compute_map)
         for node in order:
             try:
                 thunk_start = time.time()
+                node_impl = impl
+                if (self.tiered and impl is None and
+                        _has_perform(node.op) and
+                        theano.gof.cc.needs_compilation(
+                            node, storage_map, compute_map)):
+                    node_impl = 'py'
+                    tiered.append(len(thunks))
                 # no-recycling is done at each VM.__call__ So there is
                 # no need to cause duplicate c code by passing
                 # no_recycling here.
@@ -1081,7 +1616,7 @@ class VM_Linker(link.LocalLinker):
                                                  storage_map,
                                                  compute_map,
                                                  [],
-                                                 impl=impl))
+                                                 impl=node_impl))
                 linker_make_thunk_time[node] = time.time() - thunk_start
                 if not hasattr(thunks[-1], 'lazy'):
                     # We don't want all ops maker to think about lazy Ops.
@@ -1107,8 +1642,12 @@ class VM_Linker(link.LocalLinker):
             lazy = config.vm.lazy
         if lazy is None:
             lazy = not all([(not th.lazy) for th in thunks])
+        # The reuse of storage between variables relies on the order of the
+        # nodes, that the Parallel VM does not follow. The ArenaLoop VM
+        # plans the memory of all the variables itself.
         if not (lazy or ((config.profile or config.print_global_stats) and config.profile_memory) or
-                self.use_cloop or self.callback or self.callback_input):
+                self.use_cloop or self.callback or self.callback_input or
+                self.parallel or self.arena):
             for pair in itervalues(reallocated_info):
                 storage_map[pair[1]] = storage_map[pair[0]]
 
@@ -1138,6 +1677,9 @@ class VM_Linker(link.LocalLinker):
         vm.storage_map = storage_map
         vm.compute_map = compute_map
 
+        if tiered:
+            _tiered_compiler.submit(vm, tiered, storage_map, compute_map)
+
         return (vm,
                 [link.Container(input, storage)
                  for input, storage in zip(fgraph.inputs, input_storage)],
@@ -1154,3 +1696,9 @@ class VM_Linker(link.LocalLinker):
             self.allow_partial_eval = None
         if not hasattr(self, 'callback_input'):
             self.callback_input = None
+        if not hasattr(self, 'tiered'):
+            self.tiered = False
+        if not hasattr(self, 'parallel'):
+            self.parallel = False
+        if not hasattr(self, 'arena'):
+            self.arena = False
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Time "import theano" in new processes, with and without the Theano flag
+lazy_import.
+
+With --max-time, exit with an error status when an import takes longer
+than that, so that this script can be used to catch regressions of the
+import time.
+
+"""
+from __future__ import absolute_import, print_function, division
+from optparse import OptionParser
+import os
+import subprocess
+import sys
+import time
+
+parser = OptionParser(usage='%prog <options>\n Time "import theano"')
+parser.add_option('-n', '--n_runs', action='store', dest='n_runs',
+                  default=5, type="int",
+                  help="Number of imports timed for each setting")
+parser.add_option('--max-time', action='store', dest='max_time',
+                  default=None, type="float",
+                  help="Fail if the fastest import with lazy_import=True "
+                  "takes more than this number of seconds")
+parser.add_option('--modules', action='store', dest='n_modules',
+                  default=0, type="int",
+                  help="Print the N modules that take the longest to import "
+                  "with lazy_import=True (needs Python 3.7)")
+
+
+def _env(lazy_import):
+    env = dict(os.environ)
+    env['THEANO_FLAGS'] = ','.join(
+        [f for f in [env.get('THEANO_FLAGS', ''),
+                     'lazy_import=%s' % lazy_import] if f])
+    return env
+
+
+def time_import(lazy_import, n_runs):
+    """
+    Return the wall times of `n_runs` imports of theano, each in a new
+    process.
+
+    """
+    cmd = [sys.executable, '-c', 'import theano']
+    times = []
+    for i in range(n_runs):
+        t0 = time.time()
+        subprocess.check_call(cmd, env=_env(lazy_import))
+        times.append(time.time() - t0)
+    return times
+
+
+def slowest_modules(n_modules):
+    """
+    Return the `n_modules` (cumulative time in seconds, module name) that
+    take the longest to import, as reported by "python -X importtime".
+
+    """
+    cmd = [sys.executable, '-X', 'importtime', '-c', 'import theano']
+    p = subprocess.Popen(cmd, env=_env(True), stderr=subprocess.PIPE,
+                         universal_newlines=True)
+    _, err = p.communicate()
+    modules = []
+    for line in err.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        modules.append((int(fields[1]) / 1e6, fields[2].rstrip()))
+    return sorted(modules, reverse=True)[:n_modules]
+
+
+if __name__ == "__main__":
+    options, arguments = parser.parse_args(sys.argv)
+    results = {}
+    for lazy_import in (False, True):
+        times = sorted(time_import(lazy_import, options.n_runs))
+        results[lazy_import] = times
+        print('lazy_import=%s: min %.3f sec, median %.3f sec' % (
+            lazy_import, times[0], times[len(times) // 2]))
+    if options.n_modules:
+        print()
+        print('Slowest imports with lazy_import=True (cumulative time):')
+        for t, name in slowest_modules(options.n_modules):
+            print('  %.3f sec %s' % (t, name))
+    if (options.max_time is not None and
+            results[True][0] > options.max_time):
+        print('import theano took %.3f sec, more than %.3f sec' % (
+            results[True][0], options.max_time))
+        sys.exit(1)
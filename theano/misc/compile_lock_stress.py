@@ -0,0 +1,103 @@
+"""
+Stress test of the compilation lock.
+
+Launch several processes that compile disjoint graphs in the same
+compilation directory, and report the wall time for each value of the
+Theano flag compile.lock_granularity.
+
+"""
+from __future__ import absolute_import, print_function, division
+from optparse import OptionParser
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import theano
+import theano.tensor as T
+from six.moves import xrange
+
+parser = OptionParser(usage='%prog <options>\n Time concurrent compilations'
+                      ' of disjoint graphs in the same compiledir')
+parser.add_option('-n', '--n_procs', action='store', dest='n_procs',
+                  default=8, type="int",
+                  help="Number of processes compiling at the same time")
+parser.add_option('-m', '--n_modules', action='store', dest='n_modules',
+                  default=10, type="int",
+                  help="Number of new modules compiled by each process")
+parser.add_option('--worker', action='store_true', dest='worker',
+                  default=False,
+                  help="Compile the graph (used by the parent process)")
+
+
+class StressCopy(theano.Op):
+    """
+    Copy its input, with a C code that is different for each tag.
+
+    """
+    __props__ = ('tag',)
+
+    def __init__(self, tag):
+        self.tag = tag
+
+    def make_node(self, x):
+        x = T.as_tensor_variable(x)
+        return theano.Apply(self, [x], [x.type()])
+
+    def perform(self, node, inputs, outputs):
+        outputs[0][0] = inputs[0].copy()
+
+    def c_code_cache_version(self):
+        return (1,)
+
+    def c_code(self, node, name, inames, onames, sub):
+        x, = inames
+        z, = onames
+        fail = sub['fail']
+        tag = self.tag
+        return """
+        /* %(tag)s */
+        Py_XDECREF(%(z)s);
+        %(z)s = (PyArrayObject*)PyArray_NewCopy(%(x)s, NPY_ANYORDER);
+        if (!%(z)s) {
+            %(fail)s
+        }
+        """ % locals()
+
+
+def compile_graph(n_modules):
+    x = T.vector('x')
+    out = x
+    prefix = uuid.uuid4().hex
+    for i in xrange(n_modules):
+        out = StressCopy('%s_%i' % (prefix, i))(out)
+    theano.function([x], out, mode=theano.Mode(optimizer=None))
+
+
+def time_processes(n_procs, n_modules, granularity):
+    env = dict(os.environ)
+    env['THEANO_FLAGS'] = ','.join(
+        [f for f in [env.get('THEANO_FLAGS', ''),
+                     'compile.lock_granularity=' + granularity] if f])
+    cmd = [sys.executable, __file__, '--worker', '-m', str(n_modules)]
+    t0 = time.time()
+    procs = [subprocess.Popen(cmd, env=env) for i in xrange(n_procs)]
+    status = [p.wait() for p in procs]
+    if any(status):
+        raise Exception('A worker process failed', status)
+    return time.time() - t0
+
+
+if __name__ == "__main__":
+    options, arguments = parser.parse_args(sys.argv)
+    if options.worker:
+        compile_graph(options.n_modules)
+    else:
+        print('%i processes compiling %i new modules each' % (
+            options.n_procs, options.n_modules))
+        for granularity in ('global', 'module'):
+            t = time_processes(options.n_procs, options.n_modules,
+                               granularity)
+            print(' compile.lock_granularity=%s: %.2f sec' % (
+                granularity, t))
@@ -0,0 +1,65 @@
+"""
+Optimization time of big generated graphs, with and without the worklist
+mode of the EquilibriumOptimizers (Theano flag optdb.worklist).
+
+The graph is an unrolled recurrence, with in each step expressions that
+canonicalize, stabilize and specialize simplify. The first pass of each
+EquilibriumOptimizer changes most nodes, the next ones very few, so the
+worklist mode should only keep the cost of the first pass.
+
+"""
+from __future__ import absolute_import, print_function, division
+from optparse import OptionParser
+import sys
+import time
+
+import theano
+import theano.tensor as T
+from six.moves import xrange
+
+parser = OptionParser(usage='%prog <options>\n Compute the optimization'
+                      ' time of big graphs')
+parser.add_option('-s', '--steps', action='store', dest='steps',
+                  default=1000, type="int",
+                  help="Number of unrolled steps (about 10 nodes each)")
+parser.add_option('-m', '--mode', action='store', dest='mode',
+                  default='FAST_RUN', type="string",
+                  help="Mode of the functions")
+
+
+def make_graph(n_steps):
+    x = T.matrix('x')
+    w = T.matrix('w')
+    h = x
+    for i in xrange(n_steps):
+        a = T.dot(h, w) * 1 + 0
+        h = T.tanh(T.exp(T.log(a)) - T.neg(-h)) * (i % 3 + 1)
+    return [x, w], h.sum()
+
+
+def optimize_time(inputs, output, mode, worklist):
+    """
+    Return the time to optimize the graph and the number of nodes of the
+    optimized graph.
+
+    """
+    with theano.change_flags(**{'optdb.worklist': worklist}):
+        maker = theano.compile.function_module.FunctionMaker
+        mode = theano.compile.get_mode(mode)
+        t0 = time.time()
+        fgraph = maker(inputs, [output], mode,
+                       on_unused_input='ignore').fgraph
+        return time.time() - t0, len(fgraph.apply_nodes)
+
+
+if __name__ == "__main__":
+    options, arguments = parser.parse_args(sys.argv)
+    inputs, output = make_graph(options.steps)
+    print('%i steps, %i nodes before optimization, mode %s' % (
+        options.steps, len(theano.gof.graph.ops(inputs, [output])),
+        options.mode))
+    base, base_nodes = optimize_time(inputs, output, options.mode, False)
+    print(' full passes: %8.2fs, %i nodes' % (base, base_nodes))
+    t, nodes = optimize_time(inputs, output, options.mode, True)
+    print(' worklist:    %8.2fs, %i nodes, speedup %.2fx' % (
+        t, nodes, base / t))
@@ -0,0 +1,69 @@
+"""
+Per-call overhead of a Theano function on a small graph.
+
+Compare the time of a call with the default `__call__`, with
+`trust_input` and with the fast path in C selected by
+`Function.set_fast_call`. The graph is small, so the time measured is
+mostly the Python overhead of the call and not the computation.
+
+"""
+from __future__ import absolute_import, print_function, division
+from optparse import OptionParser
+import sys
+import time
+
+import numpy as np
+
+import theano
+import theano.tensor as T
+from six.moves import xrange
+
+parser = OptionParser(usage='%prog <options>\n Compute the time of a call'
+                      ' of a small function')
+parser.add_option('-N', '--N', action='store', dest='N',
+                  default=10, type="int",
+                  help="Size of the vectors")
+parser.add_option('-c', '--n_calls', action='store', dest='n_calls',
+                  default=100000, type="int",
+                  help="Number of calls")
+
+
+def make_function(N):
+    x = T.vector('x')
+    y = T.vector('y')
+    s = theano.shared(np.zeros(N, dtype=theano.config.floatX), 's')
+    return theano.function([x, y], T.tanh(x * y + s),
+                           updates=[(s, s + x)], mode='FAST_RUN')
+
+
+def time_calls(f, x, y, n_calls):
+    """
+    Return the average time in seconds of a call of `f`.
+
+    """
+    f(x, y)
+    t0 = time.time()
+    for i in xrange(n_calls):
+        f(x, y)
+    return (time.time() - t0) / n_calls
+
+
+if __name__ == "__main__":
+    options, arguments = parser.parse_args(sys.argv)
+    x = np.random.rand(options.N).astype(theano.config.floatX)
+    y = np.random.rand(options.N).astype(theano.config.floatX)
+
+    print('Vectors of size %i, %i calls' % (options.N, options.n_calls))
+    f = make_function(options.N)
+    base = time_calls(f, x, y, options.n_calls)
+    print(' __call__:    %8.2f us per call' % (base * 1e6))
+    f.trust_input = True
+    t = time_calls(f, x, y, options.n_calls)
+    print(' trust_input: %8.2f us per call, speedup %.2fx' % (
+        t * 1e6, base / t))
+    if f.set_fast_call():
+        t = time_calls(f, x, y, options.n_calls)
+        print(' fast call:   %8.2f us per call, speedup %.2fx' % (
+            t * 1e6, base / t))
+    else:
+        print(' fast call:   not available (it needs the CVM linker)')
@@ -0,0 +1,84 @@
+"""
+Throughput of a Theano function called from several Python threads.
+
+Each thread calls its own copy of a function computing a matrix product,
+the way a server handles its requests. The C code of Dot22 and Gemm
+releases the GIL while BLAS runs, so the throughput should scale with the
+number of threads up to the number of cores.
+
+Run it with a single threaded BLAS (e.g. OMP_NUM_THREADS=1) to measure
+the scaling due to the threads of Python and not the ones of BLAS.
+
+"""
+from __future__ import absolute_import, print_function, division
+from optparse import OptionParser
+import sys
+import threading
+import time
+
+import numpy as np
+
+import theano
+import theano.tensor as T
+from six.moves import xrange
+
+parser = OptionParser(usage='%prog <options>\n Compute the throughput of'
+                      ' a function called from several threads')
+parser.add_option('-N', '--N', action='store', dest='N',
+                  default=256, type="int",
+                  help="Size of the matrices")
+parser.add_option('-t', '--max_threads', action='store', dest='max_threads',
+                  default=4, type="int",
+                  help="Largest number of threads")
+parser.add_option('-c', '--n_calls', action='store', dest='n_calls',
+                  default=200, type="int",
+                  help="Number of calls done by each thread")
+
+
+def make_function(N):
+    x = T.matrix('x')
+    y = theano.shared(np.random.rand(N, N).astype(theano.config.floatX),
+                      'y')
+    return theano.function([x], T.dot(x, y), mode='FAST_RUN')
+
+
+def throughput(fns, x, n_calls):
+    """
+    Return the number of calls per second of the functions `fns`, each
+    one called `n_calls` times in its own thread.
+
+    """
+    def serve(fn):
+        for i in xrange(n_calls):
+            fn(x)
+
+    threads = [threading.Thread(target=serve, args=(fn,)) for fn in fns]
+    t0 = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return len(fns) * n_calls / (time.time() - t0)
+
+
+if __name__ == "__main__":
+    options, arguments = parser.parse_args(sys.argv)
+    f = make_function(options.N)
+    # A function cannot be called by two threads at the same time, so
+    # each thread has its own copy, that reuses the compiled C modules.
+    fns = [f.copy() for i in xrange(options.max_threads)]
+    x = np.random.rand(options.N, options.N).astype(theano.config.floatX)
+    for fn in fns:
+        fn(x)
+
+    print('Matrix product of size %i, %i calls per thread' % (
+        options.N, options.n_calls))
+    base = None
+    n_threads = 1
+    while n_threads <= options.max_threads:
+        calls = throughput(fns[:n_threads], x, options.n_calls)
+        if base is None:
+            base = calls
+        print(' %2i threads: %8.1f calls/sec, speedup %.2fx' % (
+            n_threads, calls, calls / base))
+        n_threads *= 2
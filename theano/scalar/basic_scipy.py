@@ -5,6 +5,8 @@ from __future__ import absolute_import, print_function, division
 import numpy as np
 
 import theano
+from theano import config
+from theano.compat import module_exists
 from theano.gradient import grad_not_implemented
 from theano.scalar.basic import (UnaryScalarOp, BinaryScalarOp,
                                  exp, upgrade_to_float,
@@ -14,22 +16,64 @@ from theano.scalar.basic import (upgrade_to_float_no_complex,
                                  complex_types, discrete_types,
                                  upcast)
 
+
+class _LazyScipy(object):
+    """
+    Stand-in for the scipy module, that imports scipy.special and
+    scipy.stats when one of its attributes is first accessed.
+
+    """
+
+    def __getattr__(self, name):
+        if not _scipy_special_available():
+            raise ImportError('scipy.special can not be imported')
+        return getattr(scipy, name)
+
+
+def _scipy_special_available():
+    """
+    Return True if scipy.special can be used by the Python implementations.
+
+    With the Theano flag lazy_import, scipy.special and scipy.stats are
+    imported the first time this is called. As with the import done when
+    this file is imported, a ValueError raised by it means that scipy.special
+    is unavailable, and the ops fall back on their generic implementation.
+
+    """
+    global scipy, imported_scipy_special
+    if imported_scipy_special and isinstance(scipy, _LazyScipy):
+        try:
+            import scipy.special
+            import scipy.stats
+        # Importing scipy.special may raise ValueError.
+        # See http://projects.scipy.org/scipy/ticket/1739
+        except (ImportError, ValueError):
+            imported_scipy_special = False
+    return imported_scipy_special
+
+
 imported_scipy_special = False
-try:
-    import scipy.special
-    import scipy.stats
-    imported_scipy_special = True
-# Importing scipy.special may raise ValueError.
-# See http://projects.scipy.org/scipy/ticket/1739
-except (ImportError, ValueError):
-    pass
+if config.lazy_import:
+    # Importing scipy.stats is slow, do it when one of these ops is used.
+    # Until then, imported_scipy_special only tells that scipy is installed.
+    imported_scipy_special = module_exists('scipy')
+    scipy = _LazyScipy()
+else:
+    try:
+        import scipy.special
+        import scipy.stats
+        imported_scipy_special = True
+    # Importing scipy.special may raise ValueError.
+    # See http://projects.scipy.org/scipy/ticket/1739
+    except (ImportError, ValueError):
+        pass
 
 
 class Erf(UnaryScalarOp):
     nfunc_spec = ('scipy.special.erf', 1, 1)
 
     def impl(self, x):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return scipy.special.erf(x)
         else:
             super(Erf, self).impl(x)
@@ -63,7 +107,7 @@ class Erfc(UnaryScalarOp):
     nfunc_spec = ('scipy.special.erfc', 1, 1)
 
     def impl(self, x):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return scipy.special.erfc(x)
         else:
             super(Erfc, self).impl(x)
@@ -112,7 +156,7 @@ class Erfcx(UnaryScalarOp):
     nfunc_spec = ('scipy.special.erfcx', 1, 1)
 
     def impl(self, x):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return scipy.special.erfcx(x)
         else:
             super(Erfcx, self).impl(x)
@@ -149,7 +193,7 @@ class Erfinv(UnaryScalarOp):
     nfunc_spec = ('scipy.special.erfinv', 1, 1)
 
     def impl(self, x):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return scipy.special.erfinv(x)
         else:
             super(Erfinv, self).impl(x)
@@ -184,7 +228,7 @@ class Erfcinv(UnaryScalarOp):
     nfunc_spec = ('scipy.special.erfcinv', 1, 1)
 
     def impl(self, x):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return scipy.special.erfcinv(x)
         else:
             super(Erfcinv, self).impl(x)
@@ -223,7 +267,7 @@ class Gamma(UnaryScalarOp):
         return scipy.special.gamma(x)
 
     def impl(self, x):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return Gamma.st_impl(x)
         else:
             super(Gamma, self).impl(x)
@@ -262,7 +306,7 @@ class GammaLn(UnaryScalarOp):
         return scipy.special.gammaln(x)
 
     def impl(self, x):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return GammaLn.st_impl(x)
         else:
             super(GammaLn, self).impl(x)
@@ -308,7 +352,7 @@ class Psi(UnaryScalarOp):
         return scipy.special.psi(x)
 
     def impl(self, x):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return Psi.st_impl(x)
         else:
             super(Psi, self).impl(x)
@@ -401,7 +445,7 @@ class TriGamma(UnaryScalarOp):
         return scipy.special.polygamma(1, x)
 
     def impl(self, x):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return TriGamma.st_impl(x)
         else:
             super(TriGamma, self).impl(x)
@@ -495,7 +539,7 @@ class Chi2SF(BinaryScalarOp):
         return scipy.stats.chi2.sf(x, k)
 
     def impl(self, x, k):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return Chi2SF.st_impl(x, k)
         else:
             super(Chi2SF, self).impl(x, k)
@@ -513,7 +557,7 @@ class Jv(BinaryScalarOp):
         return scipy.special.jv(v, x)
 
     def impl(self, v, x):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return self.st_impl(v, x)
         else:
             super(Jv, self).impl(v, x)
@@ -538,7 +582,7 @@ class J1(UnaryScalarOp):
         return scipy.special.j1(x)
 
     def impl(self, x):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return self.st_impl(x)
         else:
             super(J1, self).impl(x)
@@ -570,7 +614,7 @@ class J0(UnaryScalarOp):
         return scipy.special.j0(x)
 
     def impl(self, x):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return self.st_impl(x)
         else:
             super(J0, self).impl(x)
@@ -602,7 +646,7 @@ class Iv(BinaryScalarOp):
         return scipy.special.iv(v, x)
 
     def impl(self, v, x):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return self.st_impl(v, x)
         else:
             super(Iv, self).impl(v, x)
@@ -627,7 +671,7 @@ class I1(UnaryScalarOp):
         return scipy.special.i1(x)
 
     def impl(self, x):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return self.st_impl(x)
         else:
             super(I1, self).impl(x)
@@ -651,7 +695,7 @@ class I0(UnaryScalarOp):
         return scipy.special.i0(x)
 
     def impl(self, x):
-        if imported_scipy_special:
+        if _scipy_special_available():
             return self.st_impl(x)
         else:
             super(I0, self).impl(x)
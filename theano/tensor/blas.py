@@ -653,6 +653,14 @@ class GemmRelated(Op):
         unit |= ((Sz[1] == type_size || Nz[1]==1) ? 0x0 : (Sz[0] == type_size || Nz[0]==1) ? 0x1 : 0x2) << 0;
         """
 
+    check_unit = """
+        if (unit & 0x222)
+        {
+            PyErr_SetString(PyExc_ValueError, "some matrix has no unit stride");
+            %(fail)s;
+        }
+        """
+
     compute_strides = """
         /* create appropriate strides for malformed matrices that are row or column
          * vectors, or empty matrices.
@@ -700,7 +708,7 @@ class GemmRelated(Op):
                     case 0x101: sgemm_(&N, &T, &Nz0, &Nz1, &Nx1, &a, x, &sx_1, y, &sy_0, &b, z, &sz_1); break;
                     case 0x011: sgemm_(&T, &N, &Nz0, &Nz1, &Nx1, &a, x, &sx_0, y, &sy_1, &b, z, &sz_1); break;
                     case 0x111: sgemm_(&N, &N, &Nz0, &Nz1, &Nx1, &a, x, &sx_1, y, &sy_1, &b, z, &sz_1); break;
-                    default: PyErr_SetString(PyExc_ValueError, "some matrix has no unit stride"); %(fail)s;
+                    default: break; // checked by check_unit
                 };
                 //fprintf(stderr, "Calling sgemm %%i %%i %%i %%i took %%f\\n", unit, Nz1, Nz0, Nx1, time_time() - t0);
         """
@@ -747,9 +755,7 @@ class GemmRelated(Op):
                                        &sx_0, y, &sy_1, &b, z, &sz_1); break;
                     case 0x111: dgemm_(&N, &N, &Nz0, &Nz1, &Nx1, &a, x,
                                        &sx_1, y, &sy_1, &b, z, &sz_1); break;
-                    default: PyErr_SetString(PyExc_ValueError,
-                                             "some matrix has no unit stride");
-                             %(fail)s;
+                    default: break; // checked by check_unit
                 };
                 //fprintf(stderr, "Calling dgemm %%i %%i %%i %%i took %%f\\n",
                 //        unit, Nz1, Nz0, Nx1, time_time()- t0);
@@ -768,7 +774,7 @@ class GemmRelated(Op):
         else:
             setup_z_Nz_Sz = self.setup_z_Nz_Sz
 
-        return reduce(str.__add__, (
+        code = reduce(str.__add__, (
             self.declare_NS,
             self.check_xyz_rank2,
             setup_z_Nz_Sz,
@@ -777,7 +783,22 @@ class GemmRelated(Op):
             self.check_dims,
             self.check_strides,
             self.encode_strides_in_unit,
-            self.compute_strides,
+            self.check_unit,
+            self.compute_strides), '')
+        if not self.gemm_releases_gil():
+            code += self.build_gemm_blas_call()
+        return code
+
+    def build_gemm_blas_call(self):
+        """
+        Return the code that calls BLAS once the checks of
+        `build_gemm_call` passed.
+
+        It does not use the Python C-API, so `c_code_nogil` runs it without
+        the GIL when `gemm_releases_gil` is True.
+
+        """
+        return reduce(str.__add__, (
             self.begin_switch_typenum,
             self.case_float,
             self.case_float_ab_constants,
@@ -787,8 +808,13 @@ class GemmRelated(Op):
             self.case_double_gemm,
             self.end_switch_typenum), '')
 
+    def gemm_releases_gil(self):
+        # Without blas.ldflags, [sd]gemm_ are implemented with the Python
+        # C-API of NumPy by blas_header_text().
+        return bool(config.blas.ldflags)
+
     def build_gemm_version(self):
-        return (13, blas_header_version())
+        return (14, blas_header_version())
 
 
 class Gemm(GemmRelated):
@@ -1043,6 +1069,15 @@ class Gemm(GemmRelated):
         full_code = self.build_gemm_call() % dict(locals(), **sub)
         return full_code
 
+    def c_code_nogil(self, node, name, inp, out, sub):
+        _z, _a, _x, _y, _b = inp
+        _zout, = out
+        if (node.inputs[0].type.dtype.startswith('complex') or
+                not self.gemm_releases_gil()):
+            raise utils.MethodNotDefined('%s.c_code_nogil'
+                                         % self.__class__.__name__)
+        return self.build_gemm_blas_call() % dict(locals(), **sub)
+
     def c_code_cache_version(self):
         gv = self.build_gemm_version()
         if gv:
@@ -1603,6 +1638,15 @@ class Dot22(GemmRelated):
         full_code = self.build_gemm_call() % dict(locals(), **sub)
         return full_code
 
+    def c_code_nogil(self, node, name, inp, out, sub):
+        _x, _y = inp
+        _zout, = out
+        if (node.inputs[0].type.dtype.startswith('complex') or
+                not self.gemm_releases_gil()):
+            raise utils.MethodNotDefined('%s.c_code_nogil'
+                                         % self.__class__.__name__)
+        return self.build_gemm_blas_call() % dict(locals(), **sub)
+
     def c_code_cache_version(self):
         gv = self.build_gemm_version()
         if gv:
@@ -1873,6 +1917,15 @@ class Dot22Scalar(GemmRelated):
         full_code = self.build_gemm_call() % dict(locals(), **sub)
         return full_code
 
+    def c_code_nogil(self, node, name, inp, out, sub):
+        _x, _y, _a = inp
+        _zout, = out
+        if (node.inputs[0].type.dtype.startswith('complex') or
+                not self.gemm_releases_gil()):
+            raise utils.MethodNotDefined('%s.c_code_nogil'
+                                         % self.__class__.__name__)
+        return self.build_gemm_blas_call() % dict(locals(), **sub)
+
     def c_code_cache_version(self):
         gv = self.build_gemm_version()
         if gv:
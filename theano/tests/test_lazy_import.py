@@ -0,0 +1,62 @@
+from __future__ import absolute_import, print_function, division
+import os
+import subprocess
+import sys
+
+from nose.plugins.skip import SkipTest
+
+import theano
+
+
+def test_lazy_import():
+    if sys.version_info < (3, 7):
+        raise SkipTest("Lazy import needs Python 3.7")
+    code = '\n'.join([
+        "import sys",
+        "import theano",
+        "assert 'theano.scan_module' not in sys.modules",
+        "assert 'theano.sparse' not in sys.modules",
+        "assert 'scipy.stats' not in sys.modules",
+        "assert theano.scan is theano.scan_module.scan",
+        "assert 'theano.scan_module' in sys.modules",
+        "x = theano.tensor.vector()",
+        "assert theano.sparse.SparseType",
+    ])
+    env = dict(os.environ)
+    env['THEANO_FLAGS'] = ','.join(
+        [f for f in [env.get('THEANO_FLAGS', ''), 'lazy_import=True'] if f])
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(theano.__file__))] +
+        [p for p in [env.get('PYTHONPATH')] if p])
+    subprocess.check_call([sys.executable, '-c', code], env=env)
+
+
+def test_lazy_scipy_import_error():
+    # As without lazy_import, a ValueError raised when importing
+    # scipy.special makes the ops fall back on their generic implementation.
+    if sys.version_info < (3, 7):
+        raise SkipTest("Lazy import needs Python 3.7")
+    code = '\n'.join([
+        "import sys",
+        "import theano",
+        "from theano.gof.utils import MethodNotDefined",
+        "from theano.scalar import basic_scipy",
+        "class Finder(object):",
+        "    def find_spec(self, name, path=None, target=None):",
+        "        if name == 'scipy.special':",
+        "            raise ValueError(name)",
+        "sys.modules.pop('scipy.special', None)",
+        "sys.meta_path.insert(0, Finder())",
+        "try:",
+        "    basic_scipy.erf.impl(0.5)",
+        "except MethodNotDefined:",
+        "    pass",
+        "assert not basic_scipy.imported_scipy_special",
+    ])
+    env = dict(os.environ)
+    env['THEANO_FLAGS'] = ','.join(
+        [f for f in [env.get('THEANO_FLAGS', ''), 'lazy_import=True'] if f])
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(theano.__file__))] +
+        [p for p in [env.get('PYTHONPATH')] if p])
+    subprocess.check_call([sys.executable, '-c', code], env=env)
@@ -16,8 +16,10 @@ This note is written by Li Yao.
 from collections import OrderedDict
 import numpy as np
 import six.moves.cPickle as pickle
+from nose.plugins.skip import SkipTest
 import theano
 import theano.tensor as T
+from theano.gof.cc import CLinker
 
 floatX = 'float32'
 
@@ -87,6 +89,34 @@ def test_pickle_unpickle_without_reoptimization():
         theano.config.reoptimize_unpickled_function = default
 
 
+def test_pickle_unpickle_reuses_cmodule_keys():
+    if not theano.config.cxx:
+        raise SkipTest("Need cxx for this test")
+    mode = theano.compile.get_mode("FAST_RUN")
+    x1 = T.fmatrix('x1')
+    x2 = T.fmatrix('x2')
+    f = theano.function([x1, x2], T.exp(x1) * x2 + T.dot(x1, x2), mode=mode)
+    string_pkl = pickle.dumps(f, -1)
+
+    # The keys saved in the pickle must be used instead of computing them.
+    cmodule_key = CLinker.cmodule_key
+
+    def fail(self):
+        raise AssertionError("cmodule_key should not be called")
+    CLinker.cmodule_key = fail
+    try:
+        f_ = pickle.loads(string_pkl)
+    finally:
+        CLinker.cmodule_key = cmodule_key
+
+    in1 = np.random.rand(10, 10).astype(floatX)
+    in2 = np.random.rand(10, 10).astype(floatX)
+    assert np.allclose(f(in1, in2), f_(in1, in2))
+    assert ([getattr(t, 'cmodule_key', None) for t in f.fn.thunks] ==
+            [getattr(t, 'cmodule_key', None) for t in f_.fn.thunks])
+
+
 if __name__ == '__main__':
     test_pickle_unpickle_with_reoptimization()
     test_pickle_unpickle_without_reoptimization()
+    test_pickle_unpickle_reuses_cmodule_keys()